@@ -7,22 +7,33 @@ from datetime import datetime, timezone
 
 admin_bp = Blueprint('admin', __name__)
 
-import sqlite3
-import os
-
-def get_db_connection():
-    db_path = os.path.join(os.getcwd(), "tradesense.db")
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+from backend.db import get_connection, get_read_connection, get_db_stats
+from backend.price_service import get_cache_stats
+from backend.market_poller import get_poller_status
+from backend.price_stream import hub as price_stream_hub
+from backend.price_stream_server import get_price_stream_server_stats
+from backend.tick_store import get_tick_store_stats
+from backend.circuit_breaker import get_breaker_status
+from backend.market_data_async import get_async_fetcher
+from backend.trade_persistence import get_trade_writer_stats
+from backend.lock_manager import get_lock_stats
+from backend.challenge_store import put_challenge, get_challenge_cache_stats
+from backend.idempotency import get_idempotency_stats
+from backend.risk_evaluator import evaluate_all, get_risk_evaluator_stats
+from backend.position_book import get_position_stats
+from backend.order_book import get_order_stats
+from backend.reload_challenge_service import get_warmup_stats, write_snapshot
+from backend.integrity_verifier import (DEFAULT_CHUNK, full_verify, get_integrity_stats, list_violations,
+                                        max_verify_workers)
+from backend.trading_day_service import get_trading_day_stats, roll_over, trading_date
+from backend.rate_limiter import get_rate_limit_stats
 
 @admin_bp.route('/api/admin/config', methods=['GET'])
 def get_config():
-    conn = get_db_connection()
+    conn = get_read_connection()
     cur = conn.cursor()
     cur.execute("SELECT key, value FROM payment_settings")
     rows = cur.fetchall()
-    conn.close()
     
     settings = {row['key']: row['value'] for row in rows}
     return jsonify({
@@ -39,7 +50,7 @@ def get_config():
 @admin_bp.route('/api/admin/config', methods=['POST'])
 def update_config():
     data = request.json
-    conn = get_db_connection()
+    conn = get_connection()
     cur = conn.cursor()
     
     try:
@@ -54,8 +65,6 @@ def update_config():
     except Exception as e:
         conn.rollback()
         return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        conn.close()
         
     return jsonify({"status": "SUCCESS", "message": "SETTINGS_UPDATED"})
 
@@ -90,23 +99,151 @@ def seed_challenge():
         "maxTotalLossLimit": round(balance * (total_pct / 100.0), 2),
         "createdAt": now_utc.isoformat(),
         "updatedAt": now_utc.isoformat(),
-        "dailyDate": now_utc.date().isoformat()
+        "dailyDate": trading_date("STARTER", now_utc)
     }
-    store = getattr(current_app, "challenges_db", {})
-    store[challenge_id] = challenge
-    current_app.challenges_db = store
+    put_challenge(challenge, persist=True)
     return jsonify({"status": "SUCCESS", "challenge": challenge})
 
+@admin_bp.route('/api/admin/price-cache', methods=['GET'])
+def price_cache_stats():
+    """
+    Compteurs du cache de cotations partagé (hits, misses, coalesced)
+    et état du poller de fond (cadence, échecs, backoff).
+    """
+    stats = get_cache_stats()
+    stats["pollers"] = get_poller_status()
+    stats["stream"] = price_stream_hub.get_stats()
+    stats["streamServer"] = get_price_stream_server_stats()
+    stats["tickStore"] = get_tick_store_stats()
+    fetcher = get_async_fetcher()
+    stats["asyncFetch"] = dict(fetcher.stats) if fetcher else None
+    return jsonify(stats)
+
+@admin_bp.route('/api/admin/circuit-breakers', methods=['GET'])
+def circuit_breaker_status():
+    """
+    État des disjoncteurs par source upstream (closed / open / half_open),
+    taux d'erreur sur la fenêtre courante et nombre de transitions.
+    """
+    cache = get_cache_stats()
+    return jsonify({
+        "breakers": get_breaker_status(),
+        "staleServed": cache["stale"],
+        "simulatedServed": cache["simulated"],
+    })
+
+@admin_bp.route('/api/admin/db', methods=['GET'])
+def db_pool_stats():
+    """Connexions SQLite ouvertes, réutilisées et inactives dans le pool."""
+    return jsonify(get_db_stats())
+
+@admin_bp.route('/api/admin/trade-writer', methods=['GET'])
+def trade_writer_stats():
+    """File d'écriture des trades : profondeur, taille des lots, rejets."""
+    return jsonify(get_trade_writer_stats())
+
+@admin_bp.route('/api/admin/locks', methods=['GET'])
+def lock_stats():
+    """
+    Verrous par challenge : histogramme des temps d'attente, timeouts et
+    challenges les plus contendus. Query: ?top=10
+    """
+    return jsonify(get_lock_stats(request.args.get('top', 10, type=int)))
+
+@admin_bp.route('/api/admin/challenge-cache', methods=['GET'])
+def challenge_cache_stats():
+    """Cache des challenges : taux de hit, évictions, taille résidente."""
+    return jsonify(get_challenge_cache_stats())
+
+@admin_bp.route('/api/admin/idempotency', methods=['GET'])
+def idempotency_stats():
+    """Clés d'idempotence : rejeux (mémoire / base), doublons attendus, conflits."""
+    return jsonify(get_idempotency_stats())
+
+@admin_bp.route('/api/admin/risk/evaluate', methods=['POST'])
+def risk_evaluate():
+    """Réévalue tout de suite les règles de risque de tous les challenges ACTIVE."""
+    return jsonify(evaluate_all())
+
+@admin_bp.route('/api/admin/risk', methods=['GET'])
+def risk_stats():
+    """Cumul des réévaluations en masse et résultat du dernier passage."""
+    return jsonify(get_risk_evaluator_stats())
+
+@admin_bp.route('/api/admin/positions', methods=['GET'])
+def position_stats():
+    """Index des positions ouvertes et coût du marquage par lot de ticks."""
+    return jsonify(get_position_stats())
+
+@admin_bp.route('/api/admin/orders', methods=['GET'])
+def order_stats():
+    """Ordres en attente indexés (tas par symbole) et déclenchements."""
+    return jsonify(get_order_stats())
+
+@admin_bp.route('/api/admin/integrity/verify', methods=['POST'])
+def integrity_verify():
+    """
+    Re-vérification complète : points de contrôle reconstruits depuis tous
+    les trades, par tranches de rowid en parallèle. Body optionnel :
+    {"workers": 8, "chunk": 500000} ; workers est plafonné au nombre de CPU.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        workers = data.get('workers')
+        if workers is None:
+            workers = current_app.config.get('INTEGRITY_VERIFY_WORKERS') or max_verify_workers()
+        workers = int(workers)
+        chunk = int(data['chunk'] if data.get('chunk') is not None else DEFAULT_CHUNK)
+    except (TypeError, ValueError):
+        return jsonify({"error": "INVALID_VERIFY_PARAMS"}), 400
+    if workers <= 0:
+        return jsonify({"error": "INVALID_WORKERS", "max": max_verify_workers()}), 400
+    if chunk <= 0:
+        return jsonify({"error": "INVALID_CHUNK"}), 400
+    return jsonify(full_verify(workers=min(workers, max_verify_workers()), chunk=chunk))
+
+@admin_bp.route('/api/admin/integrity', methods=['GET'])
+def integrity_stats():
+    """Passes de vérification et DATA_INTEGRITY_VIOLATION en cours."""
+    return jsonify(dict(get_integrity_stats(), violationList=list_violations()))
+
+@admin_bp.route('/api/admin/warmup', methods=['GET'])
+def warmup_stats():
+    """Préchargement du cache des challenges (source, temps jusqu'à /ready) et snapshots."""
+    return jsonify(get_warmup_stats())
+
+@admin_bp.route('/api/admin/snapshot', methods=['POST'])
+def challenge_snapshot():
+    """Réécrit tout de suite le snapshot des challenges ACTIVE."""
+    result = write_snapshot()
+    if result is None:
+        return jsonify({"error": "SNAPSHOT_DISABLED"}), 400
+    return jsonify(result)
+
+@admin_bp.route('/api/admin/trading-day/rollover', methods=['POST'])
+def trading_day_rollover():
+    """Bascule journalière immédiate (idempotente) des challenges ACTIVE."""
+    return jsonify(roll_over())
+
+@admin_bp.route('/api/admin/trading-day', methods=['GET'])
+def trading_day_stats():
+    """Jour de trading par fuseau, prochaine bascule et résultat de la dernière."""
+    return jsonify(get_trading_day_stats())
+
+@admin_bp.route('/api/admin/rate-limits', methods=['GET'])
+def rate_limit_stats():
+    """Règles de limitation, compteurs autorisés / limités et état du backend."""
+    return jsonify(get_rate_limit_stats())
+
 @admin_bp.route('/api/payments/paypal/create-order', methods=['POST'])
 def paypal_create_order():
     """
     Crée une commande PayPal simulée si activé par l'admin.
     """
-    conn = get_db_connection()
+    conn = get_read_connection()
     cur = conn.cursor()
     cur.execute("SELECT key, value FROM payment_settings")
     rows = cur.fetchall()
-    conn.close()
     settings = {row['key']: row['value'] for row in rows}
 
     if settings.get("paypal_enabled") != "1":
@@ -120,11 +257,10 @@ def paypal_capture():
     """
     Capture de commande PayPal simulée. Fallback si non configuré.
     """
-    conn = get_db_connection()
+    conn = get_read_connection()
     cur = conn.cursor()
     cur.execute("SELECT key, value FROM payment_settings")
     rows = cur.fetchall()
-    conn.close()
     settings = {row['key']: row['value'] for row in rows}
 
     if settings.get("paypal_enabled") != "1":
@@ -1,74 +1,154 @@
 
-from flask import Flask, request, make_response
-import sqlite3
+from flask import Flask, request, make_response, jsonify
 import os
+import atexit
+import zlib
 from backend.config import Config, ProductionConfig
+from backend.db import configure_db, ensure_column, get_connection, get_db_path, release_thread_connections, close_all as close_db_connections
 from backend.error_handlers import register_error_handlers
 from backend.trade_routes import trade_bp
+from backend.order_routes import order_bp
 from backend.admin_routes import admin_bp
 from backend.leaderboard_routes import leaderboard_bp
 from backend.challenge_routes import challenge_routes_bp
 from backend.news_routes import news_bp
 from backend.ai_routes import ai_bp
+from backend.market_routes import market_bp
+from backend.market_poller import start_market_poller, stop_market_poller
+from backend.tick_store import configure_tick_store
+from backend.bar_archive import configure_bar_archive
+from backend.circuit_breaker import configure_breakers
+from backend.market_data_async import configure_async_fetcher, close_async_fetcher
+from backend.price_stream_server import start_price_stream_server, stop_price_stream_server
+from backend.trade_persistence import start_trade_writer, stop_trade_writer
+from backend.lock_manager import configure_lock_manager
+from backend.challenge_store import configure_challenge_store
+from backend.reload_challenge_service import start_challenge_warmup, stop_challenge_warmup, get_warmup_stats, is_ready
+from backend.idempotency import configure_idempotency
+from backend.rate_limiter import register_rate_limiter
+from backend.risk_evaluator import start_risk_evaluator, stop_risk_evaluator
+from backend.integrity_verifier import start_integrity_verifier, stop_integrity_verifier
+from backend.position_book import start_position_engine, stop_position_engine
+from backend.order_book import start_order_engine, stop_order_engine
+from backend.trading_day_service import configure_trading_day, start_rollover_scheduler, stop_rollover_scheduler
 
-challenges_db = {}
-challenge_locks = {}
+def schema_version(schema_sql):
+    """Empreinte (31 bits) de schema.sql, stockée dans PRAGMA user_version."""
+    return zlib.crc32(schema_sql.encode('utf-8')) & 0x7FFFFFFF
 
 def init_db():
-    """Initialise la base de données en exécutant schema.sql"""
-    db_path = os.path.join(os.getcwd(), "tradesense.db")
+    """
+    Initialise la base de données en exécutant schema.sql, sauf si la base
+    porte déjà l'empreinte de ce schéma (démarrage à froid plus rapide).
+    """
+    db_path = get_db_path()
     schema_path = os.path.join(os.getcwd(), "schema.sql")
     
-    print(f"🚀 Initialisation de la base de données : {db_path}")
-    
     if not os.path.exists(schema_path):
         print("⚠️ schema.sql non trouvé, passage de l'initialisation.")
         return
 
     try:
-        conn = sqlite3.connect(db_path)
         with open(schema_path, 'r', encoding='utf-8') as f:
-            conn.executescript(f.read())
+            schema_sql = f.read()
+        version = schema_version(schema_sql)
+        conn = get_connection()
+        if conn.execute("PRAGMA user_version").fetchone()[0] == version:
+            return
+        print(f"🚀 Initialisation de la base de données : {db_path}")
+        conn.executescript(schema_sql)
+        # Colonnes ajoutées depuis (CREATE TABLE IF NOT EXISTS ne les crée pas)
+        ensure_column(conn, "user_challenges", "version", "INTEGER NOT NULL DEFAULT 0")
+        ensure_column(conn, "user_challenges", "daily_date", "TEXT")
+        conn.execute(f"PRAGMA user_version = {version}")
         conn.commit()
-        conn.close()
         print("✅ Base de données initialisée avec succès.")
     except Exception as e:
         print(f"❌ Erreur lors de l'initialisation de la DB : {e}")
+    finally:
+        release_thread_connections()
 
 def create_app():
-    # Initialiser la DB avant de créer l'app
-    init_db()
-    
     app = Flask(__name__)
     
     # 1. Configuration Globale
     app.config.from_object(ProductionConfig)
     
+    # Connexions SQLite partagées (WAL), puis schéma
+    configure_db(app.config)
+    configure_lock_manager(app.config)
+    configure_challenge_store(app.config)
+    configure_idempotency(app.config)
+    configure_trading_day(app.config)
+    init_db()
+    app.teardown_appcontext(release_thread_connections)
+    atexit.register(close_db_connections)
+    # Écrivain des trades : enregistré après, donc vidé avant la fermeture du pool
+    if start_trade_writer(app.config):
+        atexit.register(stop_trade_writer)
+    # Préchargement du cache des challenges en arrière-plan (GET /ready), snapshot à l'arrêt
+    start_challenge_warmup(app.config)
+    atexit.register(stop_challenge_warmup)
+    # Positions ouvertes : index rechargé, marquage sur chaque cotation publiée
+    if start_position_engine(app.config):
+        atexit.register(stop_position_engine)
+    # Ordres limites / stops : rechargés, déclenchés sur chaque cotation publiée
+    if start_order_engine(app.config):
+        atexit.register(stop_order_engine)
+    if start_risk_evaluator(app.config):
+        atexit.register(stop_risk_evaluator)
+    if start_integrity_verifier(app.config):
+        atexit.register(stop_integrity_verifier)
+    if start_rollover_scheduler(app.config):
+        atexit.register(stop_rollover_scheduler)
+    
     # 2. Blueprints (Modulaires)
     app.register_blueprint(trade_bp)
+    app.register_blueprint(order_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(leaderboard_bp)
     app.register_blueprint(challenge_routes_bp)
     app.register_blueprint(news_bp)
     app.register_blueprint(ai_bp)
+    app.register_blueprint(market_bp)
     
-    # 3. Gestion d'erreurs centralisée
+    # 3. Gestion d'erreurs centralisée, limitation de débit (trades, IA, prix)
     register_error_handlers(app)
+    register_rate_limiter(app)
     
-    app.challenges_db = challenges_db
-    app.challenge_locks = challenge_locks
+    # 4. Disjoncteurs, historique des ticks + poller de fond des cotations
+    configure_breakers(app.config)
+    if configure_async_fetcher(app.config):
+        atexit.register(close_async_fetcher)
+    configure_tick_store(app.config)
+    configure_bar_archive(app.config)
+    if app.config.get("MARKET_POLLER_ENABLED"):
+        start_market_poller(app.config)
+        atexit.register(stop_market_poller)
+    # Flux SSE multiplexés sur une boucle asyncio (PRICE_STREAM_PORT)
+    if start_price_stream_server(app.config):
+        atexit.register(stop_price_stream_server)
     
     @app.after_request
     def add_cors_headers(response):
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET,POST,PUT,PATCH,DELETE,OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Admin-Token'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Admin-Token, Idempotency-Key'
         return response
     
     @app.route("/health", methods=["GET"])
     def health():
         return "OK", 200
     
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        """Prêt : cache des challenges préchargé (le trafic est servi pendant le préchargement)."""
+        if not is_ready():
+            response = make_response(jsonify(get_warmup_stats()), 503)
+            response.headers['Retry-After'] = '1'
+            return response
+        return jsonify(get_warmup_stats())
+    
     return app
 
 if __name__ == "__main__":
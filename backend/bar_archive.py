@@ -0,0 +1,255 @@
+"""
+Archive disque des bougies historiques, en colonnes fixes et mappée en
+mémoire.
+
+Un fichier par (symbole, unité de temps), append-only, composé
+d'enregistrements de 48 octets : ts (int64, secondes UTC), open, high,
+low, close, volume (float64). Les timestamps sont strictement
+croissants, ce qui permet une recherche dichotomique directement sur le
+fichier mappé : une requête par plage ne lit que les pages touchées et
+retourne une vue NumPy sans copie.
+
+Backfill :
+    python -m backend.bar_archive backfill --symbols BTC-USD,ETH-USD --tf 1m --days 7
+    python -m backend.bar_archive backfill --symbols IAM --tf 1h --days 30 --offline
+"""
+
+import argparse
+import functools
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+# NumPy est importé au premier accès à l'archive, pas au démarrage de l'app
+BAR_FIELDS = [
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def bar_dtype():
+    import numpy as np
+
+    return np.dtype(BAR_FIELDS)
+
+ARCHIVE_TIMEFRAMES = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+
+# Profondeur max servie par Yahoo par unité de temps, et taille des lots
+YAHOO_MAX_DAYS = {"1m": 30, "5m": 60, "1h": 730, "1d": 36500}
+YAHOO_CHUNK_DAYS = {"1m": 7, "5m": 60, "1h": 365, "1d": 36500}
+
+
+def default_archive_dir():
+    return os.environ.get("BAR_ARCHIVE_DIR") or os.path.join(os.getcwd(), "data", "bars")
+
+
+class BarArchive:
+    """Ensemble de fichiers de bougies sous un répertoire racine."""
+
+    def __init__(self, root=None):
+        self.root = root or default_archive_dir()
+        self._locks = {}
+        self._maps = {}   # path -> (taille en octets, np.memmap)
+        self._lock = threading.Lock()
+
+    def path(self, symbol, tf):
+        if tf not in ARCHIVE_TIMEFRAMES:
+            raise ValueError(f"INVALID_TIMEFRAME: {tf}")
+        safe = symbol.upper().replace("/", "_")
+        return os.path.join(self.root, f"{safe}_{tf}.bars")
+
+    def _file_lock(self, path):
+        with self._lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _map(self, path):
+        """memmap du fichier, ré-ouvert seulement si le fichier a grandi."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        import numpy as np
+
+        dtype = bar_dtype()
+        size -= size % dtype.itemsize   # écriture en cours : on ignore la fin partielle
+        if size == 0:
+            return None
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached and cached[0] == size:
+                return cached[1]
+            mm = np.memmap(path, dtype=dtype, mode="r", shape=(size // dtype.itemsize,))
+            self._maps[path] = (size, mm)
+            return mm
+
+    def count(self, symbol, tf):
+        mm = self._map(self.path(symbol, tf))
+        return 0 if mm is None else len(mm)
+
+    def last_ts(self, symbol, tf):
+        mm = self._map(self.path(symbol, tf))
+        return None if mm is None else int(mm["ts"][-1])
+
+    def first_ts(self, symbol, tf):
+        mm = self._map(self.path(symbol, tf))
+        return None if mm is None else int(mm["ts"][0])
+
+    def append(self, symbol, tf, bars):
+        """
+        Ajoute des bougies (tableau bar_dtype() ou liste de tuples) en fin de
+        fichier. Les bougies non postérieures à la dernière archivée sont
+        ignorées pour garder l'ordre strict. Retourne le nombre ajouté.
+        """
+        import numpy as np
+
+        dtype = bar_dtype()
+        bars = np.asarray(bars, dtype=dtype) if not isinstance(bars, np.ndarray) else bars.astype(dtype, copy=False)
+        if not len(bars):
+            return 0
+        bars = np.sort(bars, order="ts")
+        # Doublons internes : on garde la première occurrence de chaque ts
+        keep = np.concatenate(([True], np.diff(bars["ts"]) > 0))
+        bars = bars[keep]
+
+        path = self.path(symbol, tf)
+        with self._file_lock(path):
+            last = self.last_ts(symbol, tf)
+            if last is not None:
+                bars = bars[bars["ts"] > last]
+            if not len(bars):
+                return 0
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                f.write(bars.tobytes())
+        return len(bars)
+
+    def read_range(self, symbol, tf, start=None, end=None, limit=None):
+        """
+        Bougies avec start <= ts <= end (secondes UTC), vue NumPy sans copie
+        sur le fichier mappé. `limit` garde les plus récentes.
+        """
+        import numpy as np
+
+        mm = self._map(self.path(symbol, tf))
+        if mm is None:
+            return np.empty(0, dtype=bar_dtype())
+        ts = mm["ts"]
+        i = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        j = len(mm) if end is None else int(np.searchsorted(ts, end, side="right"))
+        if limit is not None and j - i > limit:
+            i = j - limit
+        return mm[i:j]
+
+
+_archive = None
+
+
+def get_archive():
+    global _archive
+    if _archive is None:
+        _archive = BarArchive()
+    return _archive
+
+
+def configure_bar_archive(config):
+    global _archive
+    _archive = BarArchive(config.get("BAR_ARCHIVE_DIR") or None)
+    return _archive
+
+
+# ---------------------------------------------------------------------------
+# Sources de backfill
+# ---------------------------------------------------------------------------
+
+def yahoo_source(symbol, tf, start, end):
+    from backend.market_data_yahoo import get_yahoo_history
+    return get_yahoo_history(symbol, tf, start, end)
+
+
+def stub_source(symbol, tf, start, end, seed=None):
+    """Marche aléatoire déterministe (hors-ligne), ancrée sur les prix simulés."""
+    import numpy as np
+    from backend.market_data_yahoo import _mock_prices
+    from backend.market_data_maroc import SIMULATION_BASES
+
+    step = ARCHIVE_TIMEFRAMES[tf]
+    t0 = int(start.timestamp()) // step * step
+    t1 = int(end.timestamp())
+    n = max(0, (t1 - t0) // step)
+    if n == 0:
+        return np.empty(0, dtype=bar_dtype())
+
+    if seed is None:
+        seed = zlib.crc32(f"{symbol.upper()}:{tf}:{t0}".encode())
+    rng = np.random.default_rng(seed)
+    base = _mock_prices.get(symbol.upper(), SIMULATION_BASES.get(symbol.upper(), 100.0))
+    vol = 0.0005 * np.sqrt(step / 60)
+    close = base * np.exp(np.cumsum(rng.normal(0, vol, n)))
+    open_ = np.concatenate(([base], close[:-1]))
+    spread = np.abs(rng.normal(0, vol / 2, n)) * close
+
+    bars = np.empty(n, dtype=bar_dtype())
+    bars["ts"] = t0 + step * np.arange(n, dtype=np.int64)
+    bars["open"] = open_
+    bars["close"] = close
+    bars["high"] = np.maximum(open_, close) + spread
+    bars["low"] = np.minimum(open_, close) - spread
+    bars["volume"] = rng.integers(1, 1000, n)
+    return bars
+
+
+def backfill(archive, symbol, tf, days, offline=False, now=None):
+    """
+    Remplit l'archive de `symbol` sur les `days` derniers jours, en reprenant
+    après la dernière bougie archivée. Retourne le nombre de bougies ajoutées.
+    """
+    now = now or datetime.now(timezone.utc)
+    if not offline:
+        days = min(days, YAHOO_MAX_DAYS[tf])
+    start = now - timedelta(days=days)
+    last = archive.last_ts(symbol, tf)
+    if last is not None:
+        start = max(start, datetime.fromtimestamp(last + ARCHIVE_TIMEFRAMES[tf], timezone.utc))
+
+    added = 0
+    chunk = timedelta(days=YAHOO_CHUNK_DAYS[tf]) if not offline else (now - start)
+    cursor = start
+    while cursor < now:
+        chunk_end = min(cursor + chunk, now)
+        if offline:
+            bars = stub_source(symbol, tf, cursor, chunk_end)
+        else:
+            bars = yahoo_source(symbol, tf, cursor, chunk_end)
+        added += archive.append(symbol, tf, bars)
+        cursor = chunk_end
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.bar_archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bf = sub.add_parser("backfill", help="Remplit l'archive depuis Yahoo (ou le stub hors-ligne)")
+    bf.add_argument("--symbols", required=True, help="Liste séparée par des virgules")
+    bf.add_argument("--tf", default="1m", choices=sorted(ARCHIVE_TIMEFRAMES))
+    bf.add_argument("--days", type=int, default=7)
+    bf.add_argument("--offline", action="store_true", help="Source stub (marche aléatoire), sans réseau")
+    bf.add_argument("--dir", default=None, help="Répertoire de l'archive (défaut: data/bars)")
+    args = parser.parse_args(argv)
+
+    archive = BarArchive(args.dir)
+    for symbol in [s.strip().upper() for s in args.symbols.split(",") if s.strip()]:
+        started = time.perf_counter()
+        added = backfill(archive, symbol, args.tf, args.days, offline=args.offline)
+        print(f"[BACKFILL] {symbol} {args.tf}: +{added} bougies "
+              f"({archive.count(symbol, args.tf)} au total) en {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
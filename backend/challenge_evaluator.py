@@ -31,3 +31,24 @@ def evaluate_after_trade(challenge):
         
     challenge['status'] = new_status
     return challenge
+
+# Codes de statut du calcul vectorisé (evaluate_arrays)
+STATUS_KEEP, STATUS_FAILED, STATUS_PASSED = 0, 1, 2
+
+
+def evaluate_arrays(equity, initial, daily_start, max_daily_loss, max_total_loss, profit_target):
+    """
+    Mêmes règles et même priorité que evaluate_after_trade, sur des
+    colonnes NumPy (un élément par challenge ACTIVE).
+
+    Returns:
+        ndarray int8 : STATUS_KEEP, STATUS_FAILED ou STATUS_PASSED
+    """
+    import numpy as np
+
+    failed = ((initial - equity) >= max_total_loss) | ((daily_start - equity) >= max_daily_loss)
+    passed = ~failed & ((equity - initial) >= profit_target)
+    codes = np.zeros(len(equity), dtype=np.int8)
+    codes[failed] = STATUS_FAILED
+    codes[passed] = STATUS_PASSED
+    return codes
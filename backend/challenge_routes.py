@@ -1,7 +1,8 @@
 
 from flask import Blueprint, request, jsonify, current_app
-import sqlite3
-import os
+from backend.db import transaction
+from backend.challenge_store import put_challenge
+from backend.trading_day_service import trading_date
 import uuid
 from datetime import datetime
 
@@ -68,57 +69,48 @@ def create_challenge():
             "maxDailyLossLimit": float(config['max_daily_loss']),
             "maxTotalLossLimit": float(config['max_total_loss']),
             "createdAt": now,
-            "updatedAt": now
+            "updatedAt": now,
+            "dailyDate": trading_date(plan)
         }
 
-        # 1. Mise à jour de la DB en mémoire (challenges_db)
-        store = getattr(current_app, "challenges_db", {})
-        store[cid] = challenge_data
-        current_app.challenges_db = store
+        # 1. Mise à jour du cache des challenges (persisté ci-dessous avec le paiement)
+        put_challenge(challenge_data)
 
         # 2. Persistance dans SQLite
-        db_path = os.path.join(os.getcwd(), "tradesense.db")
-        conn = None
         try:
-            conn = sqlite3.connect(db_path)
-            cur = conn.cursor()
+            with transaction() as conn:
+                cur = conn.cursor()
             
-            # Vérifier si l'utilisateur existe, sinon le créer (simplifié pour la démo)
-            cur.execute("SELECT id FROM users WHERE id = ?", (user_id,))
-            if not cur.fetchone():
-                cur.execute("INSERT INTO users (id, name, email) VALUES (?, ?, ?)", 
-                           (user_id, user_id.split('_')[0], f"{user_id}@tradesense.local"))
+                # Vérifier si l'utilisateur existe, sinon le créer (simplifié pour la démo)
+                cur.execute("SELECT id FROM users WHERE id = ?", (user_id,))
+                if not cur.fetchone():
+                    cur.execute("INSERT INTO users (id, name, email) VALUES (?, ?, ?)", 
+                               (user_id, user_id.split('_')[0], f"{user_id}@tradesense.local"))
 
-            cur.execute(
-                """INSERT INTO user_challenges 
-                (id, user_id, type, status, initial_balance, current_balance, equity, max_equity, 
-                daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, created_at, updated_at) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    cid, user_id, plan, "ACTIVE", 
-                    config['initial_balance'], config['initial_balance'], 
-                    config['initial_balance'], config['initial_balance'],
-                    config['initial_balance'], config['profit_target'],
-                    config['max_daily_loss'], config['max_total_loss'],
-                    now, now
+                cur.execute(
+                    """INSERT INTO user_challenges 
+                    (id, user_id, type, status, initial_balance, current_balance, equity, max_equity, 
+                    daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, created_at, updated_at, daily_date) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        cid, user_id, plan, "ACTIVE", 
+                        config['initial_balance'], config['initial_balance'], 
+                        config['initial_balance'], config['initial_balance'],
+                        config['initial_balance'], config['profit_target'],
+                        config['max_daily_loss'], config['max_total_loss'],
+                        now, now, challenge_data['dailyDate']
+                    )
                 )
-            )
 
-            # Insérer le paiement
-            payment_id = str(uuid.uuid4())
-            cur.execute(
-                "INSERT INTO payments (id, user_id, challenge_id, method, amount, currency, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (payment_id, user_id, cid, payment_method, amount or 0, "MAD", "SUCCESS")
-            )
+                # Insérer le paiement
+                payment_id = str(uuid.uuid4())
+                cur.execute(
+                    "INSERT INTO payments (id, user_id, challenge_id, method, amount, currency, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (payment_id, user_id, cid, payment_method, amount or 0, "MAD", "SUCCESS")
+                )
             
-            conn.commit()
         except Exception as e:
-            if conn:
-                conn.rollback()
             return jsonify({"success": False, "message": f"Erreur DB: {str(e)}"}), 500
-        finally:
-            if conn:
-                conn.close()
 
         return jsonify({
             "success": True, 
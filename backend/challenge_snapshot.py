@@ -0,0 +1,125 @@
+"""
+Snapshot binaire compact de l'état des challenges ACTIVE.
+
+Format (little-endian) :
+  - en-tête : magic, version du format, nombre de challenges, empreinte
+    de la table au moment de l'écriture (COUNT, TOTAL(version), MAX(rowid)
+    des ACTIVE) et CRC32 du corps ;
+  - corps compressé (zlib), une section par colonne : array('d') pour les
+    montants (NaN = NULL), array('q') pour version, chaînes UTF-8 séparées
+    par \\x1e pour les textes (\\x00 = NULL).
+Le décodage reconstruit les dicts d'état (clés de challenge_store) sans
+passer par un curseur SQLite ligne à ligne.
+
+Toute modification d'une ligne de user_challenges incrémente sa version :
+si l'empreinte n'a pas changé, le snapshot est à jour.
+"""
+
+import math
+import os
+import struct
+import zlib
+from array import array
+
+from backend.challenge_store import CHALLENGE_COLUMNS
+
+MAGIC = b"TSCHSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHIqdqI")    # magic, format, count, empreinte (3), crc32
+SECTION = struct.Struct("<I")
+SEPARATOR = "\x1e"
+NULL = "\x00"
+
+FLOAT_COLUMNS = ("initial_balance", "current_balance", "equity", "max_equity", "daily_starting_balance",
+                 "profit_target", "max_daily_loss_limit", "max_total_loss_limit")
+INT_COLUMNS = ("version",)
+TEXT_COLUMNS = tuple(c for c in CHALLENGE_COLUMNS if c not in FLOAT_COLUMNS and c not in INT_COLUMNS)
+SNAPSHOT_COLUMNS = TEXT_COLUMNS + FLOAT_COLUMNS + INT_COLUMNS
+
+FINGERPRINT_SQL = "SELECT COUNT(*), TOTAL(version), COALESCE(MAX(rowid), 0) FROM user_challenges WHERE status = 'ACTIVE'"
+SELECT_ACTIVE_SQL = (
+    f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM user_challenges WHERE status = 'ACTIVE' "
+    "ORDER BY updated_at DESC LIMIT ?"
+)
+
+
+class SnapshotError(Exception):
+    """Fichier absent, tronqué, corrompu ou d'un autre format."""
+
+
+def encode_snapshot(rows, fingerprint):
+    """Lignes (tuples dans l'ordre SNAPSHOT_COLUMNS) -> octets du snapshot."""
+    columns = list(zip(*rows)) if rows else [()] * len(SNAPSHOT_COLUMNS)
+    sections = []
+    for name, values in zip(SNAPSHOT_COLUMNS, columns):
+        if name in FLOAT_COLUMNS:
+            data = array('d', (math.nan if v is None else v for v in values)).tobytes()
+        elif name in INT_COLUMNS:
+            data = array('q', (v or 0 for v in values)).tobytes()
+        else:
+            data = SEPARATOR.join(NULL if v is None else str(v) for v in values).encode("utf-8")
+        sections.append(SECTION.pack(len(data)) + data)
+    body = zlib.compress(b"".join(sections), 1)
+    count, version_total, max_rowid = fingerprint
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(rows), count, version_total, max_rowid, zlib.crc32(body))
+    return header + body
+
+
+def decode_snapshot(data):
+    """Octets -> (challenges (dicts d'état), empreinte). SnapshotError si invalide."""
+    if len(data) < HEADER.size:
+        raise SnapshotError("snapshot tronqué")
+    magic, fmt, count, fp_count, fp_versions, fp_rowid, crc = HEADER.unpack_from(data)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise SnapshotError("format de snapshot inconnu")
+    body = data[HEADER.size:]
+    if zlib.crc32(body) != crc:
+        raise SnapshotError("CRC du snapshot invalide")
+    raw = zlib.decompress(body)
+
+    columns, offset = [], 0
+    for name in SNAPSHOT_COLUMNS:
+        (size,) = SECTION.unpack_from(raw, offset)
+        offset += SECTION.size
+        chunk = raw[offset:offset + size]
+        offset += size
+        if name in FLOAT_COLUMNS:
+            values = array('d')
+            values.frombytes(chunk)
+            column = [None if v != v else v for v in values]
+        elif name in INT_COLUMNS:
+            values = array('q')
+            values.frombytes(chunk)
+            column = values.tolist()
+        else:
+            column = [None if v == NULL else v for v in chunk.decode("utf-8").split(SEPARATOR)] if count else []
+        if len(column) != count:
+            raise SnapshotError(f"colonne {name} : {len(column)} valeurs pour {count} challenges")
+        columns.append(column)
+
+    keys = [CHALLENGE_COLUMNS[name] for name in SNAPSHOT_COLUMNS]
+    challenges = [dict(zip(keys, values)) for values in zip(*columns)]
+    return challenges, (fp_count, fp_versions, fp_rowid)
+
+
+def read_fingerprint(conn):
+    count, version_total, max_rowid = conn.execute(FINGERPRINT_SQL).fetchone()
+    return count, float(version_total), max_rowid
+
+
+def write_snapshot_file(path, data):
+    """Écriture atomique (fichier temporaire puis rename)."""
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_snapshot_file(path):
+    try:
+        with open(path, "rb") as f:
+            return decode_snapshot(f.read())
+    except (OSError, zlib.error, struct.error, UnicodeDecodeError) as e:
+        raise SnapshotError(str(e)) from e
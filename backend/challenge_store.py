@@ -0,0 +1,238 @@
+"""
+Cache borné (LRU) de l'état des challenges, partagé par toutes les routes.
+
+Remplace le dict app.challenges_db, qui gardait en RAM chaque challenge
+touché depuis le démarrage :
+  - au plus CHALLENGE_CACHE_SIZE entrées, la moins récemment utilisée
+    est évincée ;
+  - écriture immédiate dans SQLite (write-through) pour les challenges
+    créés hors du chemin de trade (seed admin, register) ;
+  - sur un miss, rechargement depuis user_challenges par nom de colonne.
+
+En CHALLENGE_STATE_MODE=shared l'entrée n'est qu'une copie : sa colonne
+version permet de détecter à l'écriture qu'un autre worker l'a modifiée.
+
+Une entrée dont l'écriture en base est encore en file (écrivain des
+trades, durabilité "enqueue") n'est pas évincée tant qu'elle n'est pas
+commitée : un rechargement relirait sinon un état antérieur.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+from backend.db import get_read_connection, transaction
+from backend.trade_persistence import INSERT_USER_SQL, UPSERT_CHALLENGE_SQL, TradeRecord
+
+DEFAULT_CAPACITY = 10000
+WARM_CHUNK = 5000
+
+# Colonne SQL -> clé de l'état en mémoire
+CHALLENGE_COLUMNS = {
+    "id": "id",
+    "user_id": "userId",
+    "type": "type",
+    "status": "status",
+    "initial_balance": "initialBalance",
+    "current_balance": "currentBalance",
+    "equity": "equity",
+    "max_equity": "maxEquity",
+    "daily_starting_balance": "dailyStartingBalance",
+    "profit_target": "profitTarget",
+    "max_daily_loss_limit": "maxDailyLossLimit",
+    "max_total_loss_limit": "maxTotalLossLimit",
+    "created_at": "createdAt",
+    "updated_at": "updatedAt",
+    "version": "version",
+    "daily_date": "dailyDate",
+}
+SELECT_CHALLENGE_SQL = f"SELECT {', '.join(CHALLENGE_COLUMNS)} FROM user_challenges WHERE id = ?"
+
+
+def challenge_from_row(row):
+    """sqlite3.Row de user_challenges -> dict d'état (clés camelCase)."""
+    return {key: row[column] for column, key in CHALLENGE_COLUMNS.items()}
+
+
+class ChallengeStore:
+    """LRU thread-safe des challenges, rechargés depuis SQLite sur un miss."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = int(capacity)
+        self._entries = OrderedDict()   # cid -> challenge
+        self._pending = {}              # cid -> TradeRecord non encore commité
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "notFound": 0, "evictions": 0, "loadErrors": 0,
+                       "warmed": 0}
+
+    def get(self, cid):
+        """Challenge en cache ou rechargé depuis la base ; None s'il n'existe pas."""
+        if not cid:
+            return None
+        with self._lock:
+            challenge = self._entries.get(cid)
+            if challenge is not None:
+                self._entries.move_to_end(cid)
+                self._stats["hits"] += 1
+                return challenge
+            self._stats["misses"] += 1
+        challenge = self._load(cid)
+        if challenge is None:
+            return None
+        with self._lock:
+            # Un put() concurrent a priorité sur l'état relu
+            current = self._entries.setdefault(cid, challenge)
+            self._entries.move_to_end(cid)
+            self._evict()
+            return current
+
+    def _load(self, cid):
+        try:
+            row = get_read_connection().execute(SELECT_CHALLENGE_SQL, (cid,)).fetchone()
+        except Exception as e:
+            print(f"[CHALLENGE_STORE] DB_RECOVERY_FAILED {cid}: {e}")
+            with self._lock:
+                self._stats["loadErrors"] += 1
+            return None
+        with self._lock:
+            self._stats["loads" if row else "notFound"] += 1
+        return challenge_from_row(row) if row else None
+
+    def put(self, challenge, persist=False, pending=None):
+        """
+        Met à jour le cache. `persist` écrit aussi le challenge en base
+        (write-through) ; `pending` est l'écriture en file qui le
+        persistera (l'entrée reste alors en cache jusqu'au commit).
+        """
+        if persist:
+            write_challenge(challenge)
+        cid = challenge["id"]
+        with self._lock:
+            self._entries[cid] = challenge
+            self._entries.move_to_end(cid)
+            if pending is not None and not pending.done.is_set():
+                self._pending[cid] = pending
+            self._evict()
+        return challenge
+
+    def _evict(self):
+        # Appelé sous self._lock
+        for cid in [c for c, record in self._pending.items() if record.done.is_set()]:
+            del self._pending[cid]
+        overflow = len(self._entries) - self.capacity
+        if overflow <= 0:
+            return
+        # Parcours depuis le plus ancien, arrêté dès assez d'entrées non
+        # épinglées trouvées : O(épinglées + dépassement), pas O(capacité)
+        victims = []
+        for cid in self._entries:
+            if cid not in self._pending:
+                victims.append(cid)
+                if len(victims) == overflow:
+                    break
+        for cid in victims:
+            del self._entries[cid]
+        self._stats["evictions"] += len(victims)
+
+    def warm(self, challenges, chunk=WARM_CHUNK):
+        """
+        Préchargement en masse (démarrage). N'écrase jamais une entrée
+        déjà présente (plus récente, chargée par une requête) ; `challenges`
+        va du moins au plus récent. Retourne le nombre d'entrées ajoutées.
+        """
+        added = 0
+        for start in range(0, len(challenges), chunk):
+            # Verrou relâché entre deux tranches : les requêtes continuent
+            with self._lock:
+                for challenge in challenges[start:start + chunk]:
+                    if challenge["id"] not in self._entries:
+                        self._entries[challenge["id"]] = challenge
+                        added += 1
+                self._evict()
+        with self._lock:
+            self._stats["warmed"] += added
+        return added
+
+    def peek(self, cid):
+        """Entrée en cache sans rechargement ni mise à jour LRU (None si absente)."""
+        with self._lock:
+            return self._entries.get(cid)
+
+    def ids(self):
+        """Identifiants des challenges en cache (copie)."""
+        with self._lock:
+            return list(self._entries)
+
+    def discard(self, cid):
+        with self._lock:
+            self._pending.pop(cid, None)
+            return self._entries.pop(cid, None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            entries = list(self._entries.values())
+            pinned = len(self._pending)
+        lookups = stats["hits"] + stats["misses"]
+        # Taille résidente approximative (dicts et valeurs, hors partage)
+        resident = sum(sys.getsizeof(c) + sum(sys.getsizeof(v) for v in c.values()) for c in entries)
+        return dict(
+            stats,
+            size=len(entries),
+            capacity=self.capacity,
+            pinned=pinned,
+            hitRatio=round(stats["hits"] / lookups, 4) if lookups else 0,
+            residentBytes=resident,
+        )
+
+
+def write_challenge(challenge):
+    """UPSERT du challenge (et de son utilisateur) dans une transaction."""
+    record = TradeRecord(challenge, trade=None)
+    with transaction() as conn:
+        if record.user_id:
+            conn.execute(INSERT_USER_SQL, (record.user_id, record.user_id, f"{record.user_id}@local"))
+        conn.execute(UPSERT_CHALLENGE_SQL, record.challenge_row())
+
+
+_store = ChallengeStore()
+
+
+def configure_challenge_store(config):
+    """Recrée le cache avec CHALLENGE_CACHE_SIZE (au démarrage)."""
+    global _store
+    _store = ChallengeStore(config.get("CHALLENGE_CACHE_SIZE", DEFAULT_CAPACITY))
+    return _store
+
+
+def get_challenge(cid):
+    return _store.get(cid)
+
+
+def put_challenge(challenge, persist=False, pending=None):
+    return _store.put(challenge, persist=persist, pending=pending)
+
+
+def warm_challenges(challenges):
+    return _store.warm(challenges)
+
+
+def get_challenge_capacity():
+    return _store.capacity
+
+
+def peek_challenge(cid):
+    return _store.peek(cid)
+
+
+def cached_challenge_ids():
+    return _store.ids()
+
+
+def discard_challenge(cid):
+    """Oublie l'entrée (relue depuis la base au prochain get_challenge)."""
+    return _store.discard(cid)
+
+
+def get_challenge_cache_stats():
+    return _store.get_stats()
@@ -0,0 +1,183 @@
+"""
+Disjoncteurs par source upstream (Yahoo, LeBoursier).
+
+Chaque appel upstream passe par le disjoncteur de sa source :
+
+- closed    : les appels passent ; les N derniers résultats sont
+              conservés et un appel plus lent que `slow_call_seconds`
+              compte comme un échec.
+- open      : taux d'échec >= `error_rate` sur au moins `min_calls`
+              appels. Les appels sont refusés immédiatement
+              (CircuitOpenError) pendant `open_seconds`.
+- half_open : délai écoulé, un seul appel de sonde est autorisé. S'il
+              réussit le disjoncteur se referme, sinon il se rouvre.
+"""
+
+import threading
+import time
+from collections import deque
+
+DEFAULT_ERROR_RATE = 0.5
+DEFAULT_MIN_CALLS = 5
+DEFAULT_WINDOW = 20
+DEFAULT_OPEN_SECONDS = 15.0
+DEFAULT_SLOW_CALL_SECONDS = 3.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé : la source est considérée indisponible."""
+
+
+class CircuitBreaker:
+    """Disjoncteur d'une source, partagé par tous les threads du process."""
+
+    def __init__(self, name, error_rate=DEFAULT_ERROR_RATE, min_calls=DEFAULT_MIN_CALLS,
+                 window=DEFAULT_WINDOW, open_seconds=DEFAULT_OPEN_SECONDS,
+                 slow_call_seconds=DEFAULT_SLOW_CALL_SECONDS):
+        self.name = name
+        self.error_rate = float(error_rate)
+        self.min_calls = int(min_calls)
+        self.open_seconds = float(open_seconds)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.state = CLOSED
+        self.opened_at = None
+        self._outcomes = deque(maxlen=int(window))   # True = succès
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0, "failures": 0, "slowCalls": 0, "rejected": 0, "probes": 0,
+            "transitions": {CLOSED: 0, OPEN: 0, HALF_OPEN: 0},
+        }
+
+    def _transition(self, state):
+        # Appelé sous self._lock
+        if state == self.state:
+            return
+        self.state = state
+        self.stats["transitions"][state] += 1
+        if state == OPEN:
+            self.opened_at = time.time()
+        elif state == CLOSED:
+            self.opened_at = None
+            self._outcomes.clear()
+        print(f"[CIRCUIT_BREAKER] {self.name} -> {state}")
+
+    def acquire_probe(self):
+        """
+        True (une seule fois) quand le disjoncteur est ouvert depuis plus de
+        `open_seconds` : l'appelant doit alors lancer la sonde via probe().
+        """
+        with self._lock:
+            if self.state != OPEN or time.time() - self.opened_at < self.open_seconds:
+                return False
+            self._transition(HALF_OPEN)
+            self.stats["probes"] += 1
+            return True
+
+    def allow(self):
+        """True si un appel peut partir (disjoncteur fermé), sinon compte un rejet."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record(self, ok, elapsed, probe=False):
+        """Enregistre le résultat d'un appel fait hors de call() (ex: asyncio)."""
+        with self._lock:
+            self.stats["calls"] += 1
+            if elapsed > self.slow_call_seconds:
+                self.stats["slowCalls"] += 1
+                ok = False
+            if not ok:
+                self.stats["failures"] += 1
+            if probe:
+                self._transition(CLOSED if ok else OPEN)
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append(ok)
+            calls = len(self._outcomes)
+            failures = calls - sum(self._outcomes)
+            if calls >= self.min_calls and failures / calls >= self.error_rate:
+                self._transition(OPEN)
+
+    def _run(self, fn, args, probe):
+        started = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            self.record(False, time.perf_counter() - started, probe)
+            raise
+        self.record(True, time.perf_counter() - started, probe)
+        return result
+
+    def call(self, fn, *args):
+        """Exécute fn(*args) si le disjoncteur est fermé, sinon CircuitOpenError."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit {self.state}")
+        return self._run(fn, args, probe=False)
+
+    def probe(self, fn, *args):
+        """Appel de sonde en half-open : son résultat décide de l'état suivant."""
+        return self._run(fn, args, probe=True)
+
+    @property
+    def is_closed(self):
+        return self.state == CLOSED
+
+    def status(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "openedAt": self.opened_at,
+                "windowCalls": calls,
+                "windowErrorRate": round((calls - sum(self._outcomes)) / calls, 4) if calls else 0.0,
+                "errorRate": self.error_rate,
+                "slowCallSeconds": self.slow_call_seconds,
+                "openSeconds": self.open_seconds,
+                "calls": self.stats["calls"],
+                "failures": self.stats["failures"],
+                "slowCalls": self.stats["slowCalls"],
+                "rejected": self.stats["rejected"],
+                "probes": self.stats["probes"],
+                "transitions": dict(self.stats["transitions"]),
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_settings = {}
+
+
+def configure_breakers(config):
+    """Seuils lus depuis la config Flask ; les disjoncteurs existants sont recréés."""
+    _settings.update(
+        error_rate=float(config.get("BREAKER_ERROR_RATE", DEFAULT_ERROR_RATE)),
+        min_calls=int(config.get("BREAKER_MIN_CALLS", DEFAULT_MIN_CALLS)),
+        window=int(config.get("BREAKER_WINDOW", DEFAULT_WINDOW)),
+        open_seconds=float(config.get("BREAKER_OPEN_SECONDS", DEFAULT_OPEN_SECONDS)),
+        slow_call_seconds=float(config.get("BREAKER_SLOW_CALL_SECONDS", DEFAULT_SLOW_CALL_SECONDS)),
+    )
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **_settings)
+            _breakers[name] = breaker
+        return breaker
+
+
+def get_breaker_status():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [b.status() for b in breakers]
@@ -9,6 +9,110 @@ class Config:
     PAYPAL_SECRET = os.environ.get('PAYPAL_SECRET')
     DEBUG = False
 
+    # SQLite : connexions partagées par thread, journal WAL
+    SQLITE_PATH = os.environ.get('SQLITE_PATH')   # défaut: ./tradesense.db
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_STATEMENT_CACHE = int(os.environ.get('SQLITE_STATEMENT_CACHE', 256))
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+
+    # 'process' : un seul worker (écriture différée des trades)
+    # 'shared'  : plusieurs workers sur la même base (contrôle de version, écriture synchrone)
+    CHALLENGE_STATE_MODE = os.environ.get('CHALLENGE_STATE_MODE', 'process')
+
+    # 'positions' : un trade ouvre une position valorisée à chaque tick (mark-to-market)
+    # 'instant'   : clôture immédiate avec slippage simulé
+    # Défaut : positions, instant en CHALLENGE_STATE_MODE=shared (positions y est refusé)
+    TRADE_EXECUTION_MODE = os.environ.get('TRADE_EXECUTION_MODE', '')
+
+    # Ordres limites / stops / stop-loss / take-profit déclenchés sur les cotations
+    ORDER_BOOK_ENABLED = os.environ.get('ORDER_BOOK_ENABLED', '1') == '1'
+    MAX_PENDING_ORDERS = int(os.environ.get('MAX_PENDING_ORDERS', 50))   # par challenge
+
+    # Bascule journalière planifiée du daily_starting_balance
+    # Fuseau de la journée de trading par plan (défaut UTC), ex: "ELITE=Africa/Casablanca"
+    DAILY_ROLLOVER_ENABLED = os.environ.get('DAILY_ROLLOVER_ENABLED', '1') == '1'
+    TRADING_DAY_TIMEZONES = os.environ.get('TRADING_DAY_TIMEZONES', '')
+
+    # Réévaluation en masse des règles de risque (secondes, 0 = désactivée)
+    RISK_EVAL_INTERVAL = float(os.environ.get('RISK_EVAL_INTERVAL', 60))
+
+    # Vérification incrémentale solde = initial + somme des PnL (secondes, 0 = désactivée)
+    INTEGRITY_VERIFY_INTERVAL = float(os.environ.get('INTEGRITY_VERIFY_INTERVAL', 30))
+    INTEGRITY_VERIFY_BATCH = int(os.environ.get('INTEGRITY_VERIFY_BATCH', 50000))     # trades par passe
+    INTEGRITY_VERIFY_WORKERS = int(os.environ.get('INTEGRITY_VERIFY_WORKERS', 0))     # re-vérification complète, 0 = nb CPU
+    INTEGRITY_VERIFY_NICE = int(os.environ.get('INTEGRITY_VERIFY_NICE', 10))          # priorité basse du thread
+    INTEGRITY_TOLERANCE = float(os.environ.get('INTEGRITY_TOLERANCE', 0.01))
+
+    # Cache LRU de l'état des challenges (nombre d'entrées)
+    CHALLENGE_CACHE_SIZE = int(os.environ.get('CHALLENGE_CACHE_SIZE', 10000))
+
+    # Redémarrage à chaud : préchargement des challenges ACTIVE en arrière-plan (GET /ready)
+    # Snapshot binaire réécrit toutes les N secondes (0 = à l'arrêt seulement) ; défaut <base>.challenges.snap
+    CHALLENGE_WARMUP_ENABLED = os.environ.get('CHALLENGE_WARMUP_ENABLED', '1') == '1'
+    CHALLENGE_SNAPSHOT_ENABLED = os.environ.get('CHALLENGE_SNAPSHOT_ENABLED', '1') == '1'
+    CHALLENGE_SNAPSHOT_PATH = os.environ.get('CHALLENGE_SNAPSHOT_PATH', '')
+    CHALLENGE_SNAPSHOT_INTERVAL = float(os.environ.get('CHALLENGE_SNAPSHOT_INTERVAL', 300))
+
+    # Limitation de débit (token bucket "N/secondes" par règle, vide = désactivée)
+    # Backend : 'memory' (process) ou 'sqlite' (partagé) ; défaut selon CHALLENGE_STATE_MODE
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', '')
+    RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', '0') == '1'   # IP client via X-Forwarded-For
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+    RATE_LIMIT_TRADE_USER = os.environ.get('RATE_LIMIT_TRADE_USER', '20/60')
+    RATE_LIMIT_TRADE_IP = os.environ.get('RATE_LIMIT_TRADE_IP', '120/60')
+    RATE_LIMIT_AI_IP = os.environ.get('RATE_LIMIT_AI_IP', '20/60')
+    RATE_LIMIT_PRICE_IP = os.environ.get('RATE_LIMIT_PRICE_IP', '300/60')
+
+    # Idempotency-Key des soumissions de trades (TTL en secondes)
+    IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+
+    # Verrous par challenge (stripes fixes, attente max en secondes)
+    LOCK_STRIPES = int(os.environ.get('LOCK_STRIPES', 1024))
+    LOCK_TIMEOUT = float(os.environ.get('LOCK_TIMEOUT', 5))
+
+    # Écriture différée des trades (group commit par un thread dédié)
+    TRADE_WRITE_BEHIND = os.environ.get('TRADE_WRITE_BEHIND', '1') == '1'
+    TRADE_WRITE_DURABILITY = os.environ.get('TRADE_WRITE_DURABILITY', 'commit')   # ou 'enqueue'
+    TRADE_WRITE_BATCH_MS = float(os.environ.get('TRADE_WRITE_BATCH_MS', 5))
+    TRADE_WRITE_BATCH_SIZE = int(os.environ.get('TRADE_WRITE_BATCH_SIZE', 256))
+    TRADE_WRITE_QUEUE_SIZE = int(os.environ.get('TRADE_WRITE_QUEUE_SIZE', 10000))
+    TRADE_WRITE_ENQUEUE_TIMEOUT = float(os.environ.get('TRADE_WRITE_ENQUEUE_TIMEOUT', 0.5))
+
+    # Poller de fond des cotations (cadence en secondes par source)
+    MARKET_POLLER_ENABLED = os.environ.get('MARKET_POLLER_ENABLED', '1') == '1'
+    POLL_INTERVAL_CRYPTO = float(os.environ.get('POLL_INTERVAL_CRYPTO', 1))
+    POLL_INTERVAL_US_EQUITY = float(os.environ.get('POLL_INTERVAL_US_EQUITY', 2))
+    POLL_INTERVAL_CASABLANCA = float(os.environ.get('POLL_INTERVAL_CASABLANCA', 15))
+    POLL_MAX_BACKOFF = float(os.environ.get('POLL_MAX_BACKOFF', 60))
+
+    # Historique en mémoire par symbole (taille fixe des ring buffers)
+    TICK_STORE_CAPACITY = int(os.environ.get('TICK_STORE_CAPACITY', 4096))
+    CANDLE_STORE_CAPACITY = int(os.environ.get('CANDLE_STORE_CAPACITY', 1000))
+
+    # Récupération concurrente (asyncio) des cotations
+    MARKET_ASYNC_FETCH = os.environ.get('MARKET_ASYNC_FETCH', '1') == '1'
+    MARKET_FETCH_DEADLINE = float(os.environ.get('MARKET_FETCH_DEADLINE', 2.5))
+    MARKET_FETCH_POOL_SIZE = int(os.environ.get('MARKET_FETCH_POOL_SIZE', 20))
+
+    # Serveur SSE asyncio des cotations (0 : flux servis par Flask, un thread par client)
+    PRICE_STREAM_PORT = int(os.environ.get('PRICE_STREAM_PORT', 0))
+    PRICE_STREAM_HOST = os.environ.get('PRICE_STREAM_HOST', '0.0.0.0')
+    PRICE_STREAM_URL = os.environ.get('PRICE_STREAM_URL', '')
+    PRICE_STREAM_MAX_CLIENTS = int(os.environ.get('PRICE_STREAM_MAX_CLIENTS', 10000))
+
+    # Disjoncteurs des sources upstream (Yahoo, LeBoursier)
+    BREAKER_ERROR_RATE = float(os.environ.get('BREAKER_ERROR_RATE', 0.5))
+    BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 5))
+    BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', 20))
+    BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 15))
+    BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', 3))
+
+    # Archive disque des bougies (défaut: ./data/bars)
+    BAR_ARCHIVE_DIR = os.environ.get('BAR_ARCHIVE_DIR')
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
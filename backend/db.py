@@ -0,0 +1,196 @@
+"""
+Connexions SQLite partagées par tous les blueprints.
+
+- Une connexion d'écriture et une connexion de lecture (read-only) par
+  thread, réutilisées pendant toute la requête ; à la fin du contexte
+  Flask elles retournent dans un petit pool et sont reprises par la
+  requête suivante (le serveur de dev crée un thread par requête).
+- Journal WAL : les lecteurs ne sont jamais bloqués par l'écrivain (le
+  leaderboard et l'historique lisent via get_read_connection()).
+- synchronous=NORMAL (sûr en WAL), busy_timeout, cache de requêtes
+  préparées (cached_statements) et row_factory sqlite3.Row.
+
+Les connexions ne doivent pas être fermées par l'appelant.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_FILENAME = "tradesense.db"
+
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_SYNCHRONOUS = "NORMAL"
+DEFAULT_STATEMENT_CACHE = 256
+DEFAULT_POOL_SIZE = 8          # connexions inactives conservées par type
+DEFAULT_CACHE_SIZE_KIB = 8192  # cache de pages par connexion
+
+_settings = {
+    "path": None,
+    "busy_timeout_ms": DEFAULT_BUSY_TIMEOUT_MS,
+    "synchronous": DEFAULT_SYNCHRONOUS,
+    "statement_cache": DEFAULT_STATEMENT_CACHE,
+    "pool_size": DEFAULT_POOL_SIZE,
+}
+_local = threading.local()
+_idle = {}        # (kind, path) -> [sqlite3.Connection]
+_idle_lock = threading.Lock()
+_wal_ready = set()
+_stats = {"opened": 0, "reused": 0, "released": 0, "discarded": 0}
+
+
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def configure_db(config):
+    """Réglages lus depuis la config Flask (avant la première connexion)."""
+    synchronous = str(config.get("SQLITE_SYNCHRONOUS", DEFAULT_SYNCHRONOUS)).upper()
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"SQLITE_SYNCHRONOUS invalide : {synchronous}")
+    _settings.update(
+        path=config.get("SQLITE_PATH") or None,
+        busy_timeout_ms=int(config.get("SQLITE_BUSY_TIMEOUT_MS", DEFAULT_BUSY_TIMEOUT_MS)),
+        synchronous=synchronous,
+        statement_cache=int(config.get("SQLITE_STATEMENT_CACHE", DEFAULT_STATEMENT_CACHE)),
+        pool_size=int(config.get("SQLITE_POOL_SIZE", DEFAULT_POOL_SIZE)),
+    )
+
+
+def get_db_path():
+    return _settings["path"] or os.path.join(os.getcwd(), DB_FILENAME)
+
+
+def _open(path, readonly):
+    if readonly:
+        conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True,
+            check_same_thread=False, cached_statements=_settings["statement_cache"],
+        )
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn = sqlite3.connect(
+            path, check_same_thread=False, cached_statements=_settings["statement_cache"],
+        )
+        if path not in _wal_ready:
+            # Persistant dans le fichier : une fois suffit
+            conn.execute("PRAGMA journal_mode = WAL")
+            _wal_ready.add(path)
+        conn.execute(f"PRAGMA synchronous = {_settings['synchronous']}")
+    conn.execute(f"PRAGMA busy_timeout = {_settings['busy_timeout_ms']}")
+    conn.execute(f"PRAGMA cache_size = -{DEFAULT_CACHE_SIZE_KIB}")
+    conn.row_factory = sqlite3.Row
+    with _idle_lock:
+        _stats["opened"] += 1
+    return conn
+
+
+def _acquire(kind):
+    path = get_db_path()
+    held = getattr(_local, kind, None)
+    if held is not None and held[0] == path:
+        return held[1]
+    if held is not None:
+        _release(kind, held)
+    with _idle_lock:
+        pool = _idle.get((kind, path))
+        conn = pool.pop() if pool else None
+        if conn is not None:
+            _stats["reused"] += 1
+    if conn is None:
+        if kind == "ro" and path not in _wal_ready:
+            # Le lecteur read-only a besoin d'un fichier déjà passé en WAL
+            _acquire("rw")
+        conn = _open(path, readonly=(kind == "ro"))
+    setattr(_local, kind, (path, conn))
+    return conn
+
+
+def _release(kind, held):
+    path, conn = held
+    setattr(_local, kind, None)
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.close()
+        return
+    with _idle_lock:
+        pool = _idle.setdefault((kind, path), [])
+        if len(pool) < _settings["pool_size"]:
+            pool.append(conn)
+            _stats["released"] += 1
+            return
+        _stats["discarded"] += 1
+    conn.close()
+
+
+def get_connection():
+    """Connexion d'écriture du thread courant (ne pas fermer)."""
+    return _acquire("rw")
+
+
+def get_read_connection():
+    """Connexion lecture seule du thread courant : n'attend jamais l'écrivain."""
+    return _acquire("ro")
+
+
+@contextmanager
+def transaction(foreign_keys=False, immediate=False):
+    """
+    Transaction sur la connexion d'écriture : commit en sortie normale,
+    rollback sur exception. `foreign_keys` active le contrôle des clés
+    étrangères pour cette transaction uniquement ; `immediate` prend le
+    verrou d'écriture dès le BEGIN (sérialise les écrivains de tous les
+    process, attente bornée par busy_timeout).
+    """
+    conn = get_connection()
+    if foreign_keys:
+        conn.execute("PRAGMA foreign_keys = ON")
+    try:
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if foreign_keys:
+            conn.execute("PRAGMA foreign_keys = OFF")
+
+
+def ensure_column(conn, table, column, definition):
+    """Ajoute une colonne absente d'une base créée avec un schéma antérieur."""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    return False
+
+
+def release_thread_connections(exc=None):
+    """Rend les connexions du thread au pool (teardown du contexte Flask)."""
+    for kind in ("rw", "ro"):
+        held = getattr(_local, kind, None)
+        if held is not None:
+            _release(kind, held)
+
+
+def close_all():
+    """Ferme les connexions inactives du pool (arrêt du process)."""
+    with _idle_lock:
+        pools = list(_idle.values())
+        _idle.clear()
+    for pool in pools:
+        for conn in pool:
+            conn.close()
+
+
+def get_db_stats():
+    with _idle_lock:
+        stats = dict(_stats)
+        idle = {}
+        for (kind, _), pool in _idle.items():
+            idle[kind] = idle.get(kind, 0) + len(pool)
+    return dict(stats, idle=idle, path=get_db_path(), synchronous=_settings["synchronous"])
@@ -0,0 +1,231 @@
+"""
+Clés d'idempotence (header Idempotency-Key) pour les soumissions de trades.
+
+Un client mobile qui rejoue /api/trades/execute après un timeout ne doit
+pas créer un second trade (nouveau slippage, nouveau PnL). Avec le
+décorateur @idempotent :
+  - la première requête d'une clé s'exécute et sa réponse est conservée
+    (cache LRU borné en mémoire + table idempotency_keys, TTL
+    IDEMPOTENCY_TTL) ;
+  - une répétition renvoie la réponse d'origine sans relire de prix ni
+    prendre de verrou (header Idempotent-Replayed: true) ;
+  - un doublon qui arrive pendant l'exécution attend la première requête
+    au lieu de s'exécuter une seconde fois ;
+  - la même clé avec un autre corps de requête est refusée (422).
+
+Seules les issues définitives sont conservées : 2xx et 4xx non
+réessayables. Les 5xx (ex: 503 de backpressure), 409 (conflit de version,
+Retry-After) et 429 (limite de débit) ne le sont pas : le client peut
+réessayer avec la même clé.
+
+Une clé est propre au(x) challenge(s) visé(s) par la requête : deux
+clients qui envoient la même clé ne partagent jamais une réponse.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+from backend.db import get_read_connection, transaction
+
+DEFAULT_TTL = 24 * 3600         # secondes
+DEFAULT_CAPACITY = 10000
+INFLIGHT_WAIT_TIMEOUT = 10.0    # attente max d'un doublon en cours
+MAX_KEY_LENGTH = 255
+PRUNE_EVERY = 1000              # purge des clés expirées toutes les N écritures
+
+HEADER = 'Idempotency-Key'
+RETRYABLE_STATUSES = frozenset({409, 429})   # "réessayez" : jamais conservés
+
+
+class _Flight:
+    """Requête en cours pour une clé, attendue par les doublons concurrents."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+
+
+class IdempotencyStore:
+    """Réponses conservées par clé : LRU en mémoire devant SQLite."""
+
+    def __init__(self, ttl=DEFAULT_TTL, capacity=DEFAULT_CAPACITY):
+        self.ttl = float(ttl)
+        self.capacity = int(capacity)
+        self._entries = OrderedDict()   # key -> {"fingerprint", "status", "body", "mimetype", "createdAt"}
+        self._inflight = {}             # key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "dbHits": 0, "misses": 0, "coalesced": 0, "conflicts": 0,
+                       "stored": 0, "errors": 0}
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry["createdAt"] < self.ttl
+
+    def begin(self, key):
+        """
+        Retourne (entry, flight, leader) : la réponse conservée si elle
+        existe, sinon le vol en cours ; leader=True si l'appelant doit
+        exécuter la requête puis appeler finish().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._fresh(entry):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry, None, False
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                return None, flight, False
+            flight = self._inflight[key] = _Flight()
+        # Leader : la clé a peut-être été conservée avant un redémarrage
+        entry = self._load(key)
+        if entry is not None:
+            self.finish(key, flight, entry, persist=False)
+            with self._lock:
+                self._stats["dbHits"] += 1
+            return entry, None, False
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, flight, True
+
+    def _load(self, key):
+        try:
+            row = get_read_connection().execute(
+                "SELECT fingerprint, status, body, mimetype, created_at FROM idempotency_keys WHERE key = ?",
+                (key,),
+            ).fetchone()
+        except Exception as e:
+            print(f"[IDEMPOTENCY] lecture {key}: {e}")
+            return None
+        if row is None:
+            return None
+        entry = {"fingerprint": row["fingerprint"], "status": row["status"], "body": row["body"],
+                 "mimetype": row["mimetype"], "createdAt": row["created_at"]}
+        return entry if self._fresh(entry) else None
+
+    def finish(self, key, flight, entry=None, persist=True):
+        """Termine le vol ; conserve `entry` (mémoire + base) s'il est fourni."""
+        if entry is not None and persist:
+            try:
+                self._persist(key, entry)
+            except Exception as e:
+                print(f"[IDEMPOTENCY] écriture {key}: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+        with self._lock:
+            if entry is not None:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        flight.entry = entry
+        flight.done.set()
+
+    def _persist(self, key, entry):
+        with self._lock:
+            self._stats["stored"] += 1
+            prune = self._stats["stored"] % PRUNE_EVERY == 0
+        with transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, status, body, mimetype, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry["fingerprint"], entry["status"], entry["body"], entry["mimetype"], entry["createdAt"]),
+            )
+            if prune:
+                conn.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (time.time() - self.ttl,))
+
+    def record_conflict(self):
+        with self._lock:
+            self._stats["conflicts"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), inflight=len(self._inflight),
+                        capacity=self.capacity, ttl=self.ttl)
+
+
+_store = IdempotencyStore()
+
+
+def configure_idempotency(config):
+    """Recrée le store avec IDEMPOTENCY_TTL / IDEMPOTENCY_CACHE_SIZE (au démarrage)."""
+    global _store
+    _store = IdempotencyStore(
+        ttl=config.get("IDEMPOTENCY_TTL", DEFAULT_TTL),
+        capacity=config.get("IDEMPOTENCY_CACHE_SIZE", DEFAULT_CAPACITY),
+    )
+    return _store
+
+
+def get_idempotency_stats():
+    return _store.get_stats()
+
+
+def _replay(entry, fingerprint):
+    if entry["fingerprint"] != fingerprint:
+        _store.record_conflict()
+        return jsonify({"error": "IDEMPOTENCY_KEY_REUSED",
+                        "message": "Idempotency-Key already used with a different request"}), 422
+    response = make_response(entry["body"], entry["status"])
+    response.mimetype = entry["mimetype"]
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _is_final(status):
+    return status < 500 and status not in RETRYABLE_STATUSES
+
+
+def _scope():
+    """Challenge(s) visé(s) par le corps de la requête, pour la portée de la clé."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return ""
+    orders = data.get('orders')
+    if isinstance(orders, list):
+        cids = {str(o.get('challengeId') or o.get('challenge_id') or '') for o in orders if isinstance(o, dict)}
+        return ",".join(sorted(cids))
+    return str(data.get('challengeId') or data.get('challenge_id') or '')
+
+
+def idempotent(f):
+    """Rejoue la réponse d'origine pour un Idempotency-Key déjà vu (voir module)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        raw_key = request.headers.get(HEADER)
+        if request.method == 'OPTIONS' or not raw_key:
+            return f(*args, **kwargs)
+        if len(raw_key) > MAX_KEY_LENGTH:
+            return jsonify({"error": "INVALID_IDEMPOTENCY_KEY", "max": MAX_KEY_LENGTH}), 400
+
+        key = f"{request.path}|{_scope()}|{raw_key}"
+        fingerprint = hashlib.blake2b(request.get_data(), digest_size=16).hexdigest()
+        entry, flight, leader = _store.begin(key)
+        if entry is not None:
+            return _replay(entry, fingerprint)
+        if not leader:
+            flight.done.wait(INFLIGHT_WAIT_TIMEOUT)
+            if flight.entry is not None:
+                return _replay(flight.entry, fingerprint)
+            # Première requête encore en cours ou terminée sans réponse conservée
+            response = jsonify({"error": "IDEMPOTENCY_KEY_IN_PROGRESS", "message": "Retry with the same key"})
+            response.headers['Retry-After'] = '1'
+            return response, 409
+
+        entry = None
+        try:
+            response = make_response(f(*args, **kwargs))
+            if _is_final(response.status_code):
+                entry = {"fingerprint": fingerprint, "status": response.status_code,
+                         "body": response.get_data(as_text=True), "mimetype": response.mimetype,
+                         "createdAt": time.time()}
+            return response
+        finally:
+            _store.finish(key, flight, entry)
+    return decorated_function
@@ -0,0 +1,363 @@
+"""
+Vérification incrémentale de l'intégrité des soldes des challenges.
+
+Invariant : current_balance = initial_balance + somme des PnL des trades
+CLOSED ; sans position ouverte, l'equity est aussi égale au solde. Au
+lieu de re-sommer toute la table trades, chaque challenge a un point de
+contrôle (integrity_checkpoints : dernier rowid plié, somme et nombre des
+PnL clôturés), et integrity_state garde le rowid jusqu'où tous les
+trades ont été pliés. Une passe :
+  1. lit, dans un seul snapshot WAL (jamais bloquant pour l'écrivain),
+     les trades au-delà du rowid, les trades encore ouverts lors d'une
+     passe précédente et désormais CLOSED (integrity_open_trades), et
+     les soldes de tous les challenges ;
+  2. compare chaque solde au point de contrôle augmenté des nouveaux PnL ;
+  3. écrit les points de contrôle et les DATA_INTEGRITY_VIOLATION (statut
+     du point de contrôle) en une courte transaction, conditionnée à la
+     génération lue (un autre worker qui a fait la passe entre-temps
+     l'emporte, la passe est abandonnée).
+Un trade n'est plié qu'une fois : les lignes passent d'OPEN à CLOSED,
+jamais l'inverse, et le PnL d'un trade CLOSED est définitif.
+
+Un thread de fond à priorité basse (nice) enchaîne les passes par lots de
+INTEGRITY_VERIFY_BATCH trades, puis toutes les INTEGRITY_VERIFY_INTERVAL
+secondes (0 = désactivé). full_verify reconstruit tous les points de
+contrôle en sommant la table trades par tranches de rowid, en parallèle
+(INTEGRITY_VERIFY_WORKERS threads, au plus un par CPU : SQLite relâche le
+GIL pendant l'agrégation), puis termine par une passe incrémentale.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from backend.db import get_read_connection, release_thread_connections, transaction
+
+DEFAULT_BATCH = 50000
+DEFAULT_CHUNK = 500000      # rowids par tranche de full_verify
+DEFAULT_TOLERANCE = 0.01
+BACKLOG_PAUSE = 0.05        # secondes entre deux lots tant qu'il reste du retard
+VIOLATIONS_LIMIT = 100
+
+NEW_TRADES_SQL = (
+    "SELECT rowid, challenge_id, pnl, status FROM trades WHERE rowid > ? ORDER BY rowid LIMIT ?"
+)
+# CROSS JOIN : parcours des trades ouverts (peu nombreux), jamais de la table trades
+CLOSED_SINCE_SQL = """
+    SELECT o.trade_rowid, o.challenge_id, t.pnl
+    FROM integrity_open_trades o CROSS JOIN trades t ON t.rowid = o.trade_rowid
+    WHERE t.status = 'CLOSED'
+"""
+OPEN_COUNTS_SQL = "SELECT challenge_id, COUNT(*) FROM integrity_open_trades GROUP BY challenge_id"
+CHALLENGE_CHECK_SQL = """
+    SELECT c.id, c.initial_balance, c.current_balance, c.equity,
+           COALESCE(k.closed_pnl, 0), COALESCE(k.status, 'OK')
+    FROM user_challenges c LEFT JOIN integrity_checkpoints k ON k.challenge_id = c.id
+"""
+FOLD_CHECKPOINT_SQL = """
+    INSERT INTO integrity_checkpoints (challenge_id, last_rowid, closed_pnl, closed_trades, verified_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(challenge_id) DO UPDATE SET
+        last_rowid = MAX(last_rowid, excluded.last_rowid),
+        closed_pnl = closed_pnl + excluded.closed_pnl,
+        closed_trades = closed_trades + excluded.closed_trades,
+        verified_at = excluded.verified_at
+"""
+FLAG_SQL = """
+    INSERT INTO integrity_checkpoints (challenge_id, status, expected_balance, actual_balance,
+                                       actual_equity, detail, verified_at)
+    VALUES (?, 'VIOLATION', ?, ?, ?, ?, ?)
+    ON CONFLICT(challenge_id) DO UPDATE SET
+        status = 'VIOLATION', expected_balance = excluded.expected_balance,
+        actual_balance = excluded.actual_balance, actual_equity = excluded.actual_equity,
+        detail = excluded.detail, verified_at = excluded.verified_at
+"""
+CLEAR_SQL = (
+    "UPDATE integrity_checkpoints SET status = 'OK', expected_balance = NULL, actual_balance = NULL, "
+    "actual_equity = NULL, detail = NULL, verified_at = ? WHERE challenge_id = ?"
+)
+ADVANCE_SQL = (
+    "UPDATE integrity_state SET watermark = ?, generation = generation + 1 "
+    "WHERE id = 1 AND generation = ?"
+)
+CHUNK_CLOSED_SQL = """
+    SELECT challenge_id, SUM(pnl), COUNT(*), MAX(rowid) FROM trades
+    WHERE rowid BETWEEN ? AND ? AND status = 'CLOSED' GROUP BY challenge_id
+"""
+CHUNK_OPEN_SQL = "SELECT rowid, challenge_id FROM trades WHERE rowid BETWEEN ? AND ? AND status = 'OPEN'"
+VIOLATIONS_SQL = """
+    SELECT challenge_id, expected_balance, actual_balance, actual_equity, detail, verified_at
+    FROM integrity_checkpoints WHERE status = 'VIOLATION' ORDER BY verified_at DESC LIMIT ?
+"""
+
+_pass_lock = threading.Lock()     # une passe à la fois dans le process
+_tolerance = DEFAULT_TOLERANCE
+_stats = {"passes": 0, "folded": 0, "aborted": 0, "violations": 0, "lastPass": None, "lastFull": None}
+_stats_lock = threading.Lock()
+
+
+def _read_snapshot(batch):
+    """Étape 1 : tout est lu dans la même transaction de lecture."""
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    conn.execute("BEGIN")
+    try:
+        state = cursor.execute("SELECT watermark, generation FROM integrity_state WHERE id = 1").fetchone()
+        watermark, generation = state or (0, 0)
+        new_rows = cursor.execute(NEW_TRADES_SQL, (watermark, batch)).fetchall()
+        closed = cursor.execute(CLOSED_SINCE_SQL).fetchall()
+        open_counts = dict(cursor.execute(OPEN_COUNTS_SQL).fetchall())
+        challenges = cursor.execute(CHALLENGE_CHECK_SQL).fetchall() if len(new_rows) < batch else None
+    finally:
+        conn.rollback()
+    return watermark, generation, new_rows, closed, open_counts, challenges
+
+
+def _check(challenges, deltas, open_counts):
+    """Étape 2 : (violations {cid: (attendu, solde, equity, détail)}, cids revenus à OK)."""
+    violations, cleared = {}, []
+    for cid, initial, balance, equity, closed_pnl, status in challenges:
+        expected = initial + closed_pnl + deltas.get(cid, (0.0,))[0]
+        if abs(balance - expected) > _tolerance:
+            violations[cid] = (expected, balance, equity, "BALANCE_MISMATCH")
+        elif not open_counts.get(cid) and abs(equity - balance) > _tolerance:
+            violations[cid] = (expected, balance, equity, "EQUITY_MISMATCH")
+        elif status == "VIOLATION":
+            cleared.append(cid)
+    return violations, cleared
+
+
+def verify_incremental(batch=DEFAULT_BATCH):
+    """
+    Une passe (voir module). Retourne ses compteurs, `caughtUp` False s'il
+    reste des trades au-delà du lot ; None si un autre worker l'a devancée.
+    """
+    with _pass_lock:
+        started = time.perf_counter()
+        watermark, generation, new_rows, closed, open_counts, challenges = _read_snapshot(batch)
+
+        deltas = {}     # cid -> [somme PnL, nombre, dernier rowid]
+        opened = []
+        for rowid, cid, pnl, status in new_rows:
+            if status == "CLOSED":
+                delta = deltas.setdefault(cid, [0.0, 0, 0])
+                delta[0] += pnl or 0.0
+                delta[1] += 1
+                delta[2] = rowid
+            else:
+                opened.append((rowid, cid))
+                open_counts[cid] = open_counts.get(cid, 0) + 1
+        for rowid, cid, pnl in closed:
+            delta = deltas.setdefault(cid, [0.0, 0, 0])
+            delta[0] += pnl or 0.0
+            delta[1] += 1
+            delta[2] = max(delta[2], rowid)
+            open_counts[cid] -= 1
+        new_watermark = new_rows[-1][0] if new_rows else watermark
+        violations, cleared = _check(challenges, deltas, open_counts) if challenges is not None else ({}, [])
+        read = time.perf_counter()
+
+        now = datetime.now(timezone.utc).isoformat()
+        with transaction(immediate=True) as conn:
+            conn.execute("INSERT OR IGNORE INTO integrity_state (id) VALUES (1)")
+            if conn.execute(ADVANCE_SQL, (new_watermark, generation)).rowcount == 0:
+                conn.rollback()
+                with _stats_lock:
+                    _stats["aborted"] += 1
+                return None
+            conn.executemany(FOLD_CHECKPOINT_SQL, [(cid, d[2], d[0], d[1], now) for cid, d in deltas.items()])
+            conn.executemany("INSERT OR IGNORE INTO integrity_open_trades (trade_rowid, challenge_id) VALUES (?, ?)",
+                             opened)
+            conn.executemany("DELETE FROM integrity_open_trades WHERE trade_rowid = ?", [(r[0],) for r in closed])
+            conn.executemany(FLAG_SQL, [(cid, *v, now) for cid, v in violations.items()])
+            conn.executemany(CLEAR_SQL, [(now, cid) for cid in cleared])
+        finished = time.perf_counter()
+
+    for cid, (expected, balance, equity, detail) in violations.items():
+        print(f"[INTEGRITY] DATA_INTEGRITY_VIOLATION {cid}: {detail} "
+              f"(attendu {expected:.2f}, solde {balance:.2f}, equity {equity:.2f})")
+    result = {
+        "folded": len(new_rows) - len(opened) + len(closed),
+        "opened": len(opened),
+        "watermark": new_watermark,
+        "checked": len(challenges) if challenges is not None else 0,
+        "violations": len(violations),
+        "cleared": len(cleared),
+        "caughtUp": challenges is not None,
+        "readMs": round((read - started) * 1000, 2),
+        "writeMs": round((finished - read) * 1000, 2),
+    }
+    with _stats_lock:
+        _stats["passes"] += 1
+        _stats["folded"] += result["folded"]
+        if challenges is not None:
+            _stats["violations"] = len(violations)
+        _stats["lastPass"] = dict(result, at=now)
+    return result
+
+
+def catch_up(batch=DEFAULT_BATCH, pause=0.0, stop_event=None):
+    """Enchaîne les passes jusqu'à la comparaison de tous les soldes ; dernière passe."""
+    while True:
+        result = verify_incremental(batch)
+        if result is not None and result["caughtUp"]:
+            return result
+        if stop_event is not None and stop_event.wait(pause):
+            return result
+        if stop_event is None and pause:
+            time.sleep(pause)
+
+
+def _sum_chunk(bounds):
+    low, high = bounds
+    try:
+        cursor = get_read_connection().cursor()
+        cursor.row_factory = None
+        closed = cursor.execute(CHUNK_CLOSED_SQL, (low, high)).fetchall()
+        opened = cursor.execute(CHUNK_OPEN_SQL, (low, high)).fetchall()
+        return closed, opened
+    finally:
+        release_thread_connections()
+
+
+def max_verify_workers():
+    """Plafond des threads d'une re-vérification complète : un par CPU."""
+    return os.cpu_count() or 1
+
+
+def full_verify(workers=None, chunk=DEFAULT_CHUNK, batch=DEFAULT_BATCH):
+    """
+    Reconstruit tous les points de contrôle depuis la table trades, par
+    tranches de `chunk` rowids sommées en parallèle, puis compare tous les
+    soldes (passe incrémentale, qui plie aussi ce qui a changé pendant le
+    calcul). Retourne durées et résultat de la dernière passe.
+    """
+    workers = max(1, min(int(workers or max_verify_workers()), max_verify_workers()))
+    chunk = max(1, int(chunk))
+    with _pass_lock:
+        started = time.perf_counter()
+        row = get_read_connection().execute("SELECT MAX(rowid) FROM trades").fetchone()
+        max_rowid = row[0] or 0
+        chunks = [(low, min(low + chunk - 1, max_rowid)) for low in range(1, max_rowid + 1, chunk)]
+
+        sums = {}       # cid -> [somme PnL, nombre, dernier rowid]
+        opened = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="integrity-full") as pool:
+            for closed, open_rows in pool.map(_sum_chunk, chunks):
+                for cid, pnl, count, last in closed:
+                    total = sums.setdefault(cid, [0.0, 0, 0])
+                    total[0] += pnl or 0.0
+                    total[1] += count
+                    total[2] = max(total[2], last)
+                opened.extend(open_rows)
+        summed = time.perf_counter()
+
+        now = datetime.now(timezone.utc).isoformat()
+        with transaction(immediate=True) as conn:
+            conn.execute("DELETE FROM integrity_checkpoints")
+            conn.execute("DELETE FROM integrity_open_trades")
+            conn.executemany(
+                "INSERT INTO integrity_checkpoints (challenge_id, last_rowid, closed_pnl, closed_trades, verified_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(cid, s[2], s[0], s[1], now) for cid, s in sums.items()],
+            )
+            conn.executemany("INSERT INTO integrity_open_trades (trade_rowid, challenge_id) VALUES (?, ?)", opened)
+            conn.execute("INSERT OR IGNORE INTO integrity_state (id) VALUES (1)")
+            conn.execute("UPDATE integrity_state SET watermark = ?, generation = generation + 1 WHERE id = 1",
+                         (max_rowid,))
+        rebuilt = time.perf_counter()
+
+    last = catch_up(batch)
+    result = {
+        "trades": max_rowid,
+        "chunks": len(chunks),
+        "workers": workers,
+        "challenges": len(sums),
+        "sumMs": round((summed - started) * 1000, 2),
+        "writeMs": round((rebuilt - summed) * 1000, 2),
+        "totalMs": round((time.perf_counter() - started) * 1000, 2),
+        "lastPass": last,
+    }
+    with _stats_lock:
+        _stats["lastFull"] = dict(result, at=now)
+    return result
+
+
+def list_violations(limit=VIOLATIONS_LIMIT):
+    rows = get_read_connection().execute(VIOLATIONS_SQL, (limit,)).fetchall()
+    return [
+        {"challengeId": r["challenge_id"], "error": "DATA_INTEGRITY_VIOLATION", "detail": r["detail"],
+         "expectedBalance": r["expected_balance"], "actualBalance": r["actual_balance"],
+         "actualEquity": r["actual_equity"], "verifiedAt": r["verified_at"]}
+        for r in rows
+    ]
+
+
+def _lower_thread_priority(niceness):
+    """Linux : nice propre au thread (setpriority sur son id natif)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+class IntegrityVerifierThread(threading.Thread):
+    """Rattrape le retard par lots, puis une passe toutes les `interval` secondes."""
+
+    def __init__(self, interval, batch, niceness):
+        super().__init__(name="integrity-verifier", daemon=True)
+        self.interval = float(interval)
+        self.batch = int(batch)
+        self.niceness = int(niceness)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        _lower_thread_priority(self.niceness)
+        try:
+            while True:
+                try:
+                    catch_up(self.batch, BACKLOG_PAUSE, self._stop_event)
+                except Exception as e:
+                    print(f"[INTEGRITY_ERROR] {e}")
+                if self._stop_event.wait(self.interval):
+                    return
+        finally:
+            release_thread_connections()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_thread = None
+
+
+def start_integrity_verifier(config):
+    """Démarre la vérification continue si INTEGRITY_VERIFY_INTERVAL > 0 (idempotent)."""
+    global _thread, _tolerance
+    _tolerance = float(config.get("INTEGRITY_TOLERANCE", DEFAULT_TOLERANCE))
+    interval = float(config.get("INTEGRITY_VERIFY_INTERVAL", 0) or 0)
+    if interval <= 0 or _thread is not None:
+        return _thread
+    _thread = IntegrityVerifierThread(interval, config.get("INTEGRITY_VERIFY_BATCH", DEFAULT_BATCH),
+                                      config.get("INTEGRITY_VERIFY_NICE", 10))
+    _thread.start()
+    return _thread
+
+
+def stop_integrity_verifier(timeout=2.0):
+    global _thread
+    thread, _thread = _thread, None
+    if thread is not None:
+        thread.stop()
+        thread.join(timeout)
+
+
+def get_integrity_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update(tolerance=_tolerance, interval=_thread.interval if _thread else 0,
+                 running=_thread is not None and _thread.is_alive())
+    return stats
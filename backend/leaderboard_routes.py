@@ -4,9 +4,8 @@ Combine les données réelles de la DB avec des traders de référence
 """
 
 from flask import Blueprint, jsonify
-import sqlite3
-import os
 from datetime import datetime
+from backend.db import get_read_connection
 from backend.leaderboard_service import generate_realistic_leaderboard
 
 leaderboard_bp = Blueprint('leaderboard', __name__)
@@ -28,9 +27,7 @@ def get_top_traders():
     
     # Tentative de récupération des traders réels
     try:
-        db_path = os.path.join(os.getcwd(), "tradesense.db")
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = get_read_connection()
         cur = conn.cursor()
         
         # Requête SQL pour les traders du mois en cours
@@ -54,7 +51,6 @@ def get_top_traders():
         """)
         
         rows = cur.fetchall()
-        conn.close()
         
         # Conversion en format standard
         for idx, r in enumerate(rows, start=1):
@@ -111,8 +107,7 @@ def get_leaderboard_stats():
     Retourne des statistiques globales sur le leaderboard
     """
     try:
-        db_path = os.path.join(os.getcwd(), "tradesense.db")
-        conn = sqlite3.connect(db_path)
+        conn = get_read_connection()
         cur = conn.cursor()
         
         # Nombre total de traders actifs ce mois
@@ -125,7 +120,6 @@ def get_leaderboard_stats():
         """)
         
         total_traders = cur.fetchone()[0] or 0
-        conn.close()
         
         return jsonify({
             "total_traders": total_traders,
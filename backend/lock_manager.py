@@ -0,0 +1,161 @@
+"""
+Verrous par challenge : nombre fixe de verrous (stripes) choisis par hash.
+
+Remplace le dict app.challenge_locks, qui gagnait un Lock par challenge
+pour toujours et était rempli avec un check-then-set non atomique. Ici
+la mémoire est bornée (LOCK_STRIPES verrous créés au démarrage) et deux
+challenges ne partagent un verrou que s'ils tombent sur la même stripe
+(rare avec 1024 stripes, et sans effet sur la correction).
+
+    with challenge_lock(cid, timeout=2.0):
+        ...
+
+L'attente de chaque acquisition alimente un histogramme global ; les
+challenges dont l'attente dépasse CONTENDED_MS sont suivis
+individuellement (au plus TRACKED_KEYS, les moins récents sortent).
+"""
+
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_STRIPES = 1024
+DEFAULT_TIMEOUT = 5.0        # secondes
+CONTENDED_MS = 1.0           # attente à partir de laquelle un challenge est suivi
+TRACKED_KEYS = 128
+
+# Bornes supérieures des buckets d'attente (ms) ; le dernier est +inf
+WAIT_BUCKETS_MS = (0.1, 1, 5, 10, 50, 100, 500, 1000)
+
+
+class LockTimeout(Exception):
+    """Le verrou n'a pas pu être obtenu avant l'échéance."""
+
+
+class StripedLockManager:
+    """Verrous partagés par hash de clé, avec mesure des attentes."""
+
+    def __init__(self, stripes=DEFAULT_STRIPES, timeout=DEFAULT_TIMEOUT):
+        self.stripes = [threading.Lock() for _ in range(int(stripes))]
+        self.timeout = float(timeout)
+        self._stats_lock = threading.Lock()
+        self._histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._contended = OrderedDict()   # key -> {"waits", "totalMs", "maxMs"}
+        self._stats = {"acquired": 0, "timeouts": 0, "waitMs": 0.0}
+
+    def stripe_index(self, key):
+        return zlib.crc32(str(key).encode('utf-8')) % len(self.stripes)
+
+    @contextmanager
+    def lock(self, key, timeout=None):
+        """Tient le verrou de `key` ; LockTimeout si l'attente dépasse `timeout`."""
+        stripe = self.stripes[self.stripe_index(key)]
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        acquired = stripe.acquire(timeout=timeout)
+        waited_ms = (time.perf_counter() - started) * 1000
+        self._record(key, waited_ms, acquired)
+        if not acquired:
+            raise LockTimeout(f"lock for {key} not acquired within {timeout}s")
+        try:
+            yield
+        finally:
+            stripe.release()
+
+    @contextmanager
+    def lock_many(self, keys, timeout=None):
+        """
+        Tient les verrous de plusieurs clés, pris dans l'ordre des stripes
+        (pas d'interblocage entre deux appels concurrents) ; une stripe
+        partagée par deux clés n'est prise qu'une fois.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.perf_counter() + timeout
+        by_stripe = {}
+        for key in keys:
+            by_stripe.setdefault(self.stripe_index(key), key)
+        held = []
+        try:
+            for index in sorted(by_stripe):
+                stripe = self.stripes[index]
+                started = time.perf_counter()
+                acquired = stripe.acquire(timeout=max(0.0, deadline - started))
+                self._record(by_stripe[index], (time.perf_counter() - started) * 1000, acquired)
+                if not acquired:
+                    raise LockTimeout(f"lock for {by_stripe[index]} not acquired within {timeout}s")
+                held.append(stripe)
+            yield
+        finally:
+            for stripe in reversed(held):
+                stripe.release()
+
+    def _record(self, key, waited_ms, acquired):
+        bucket = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                bucket = i
+                break
+        with self._stats_lock:
+            self._histogram[bucket] += 1
+            self._stats["acquired" if acquired else "timeouts"] += 1
+            self._stats["waitMs"] += waited_ms
+            if waited_ms < CONTENDED_MS:
+                return
+            entry = self._contended.pop(key, None) or {"waits": 0, "totalMs": 0.0, "maxMs": 0.0}
+            entry["waits"] += 1
+            entry["totalMs"] += waited_ms
+            entry["maxMs"] = max(entry["maxMs"], waited_ms)
+            self._contended[key] = entry
+            if len(self._contended) > TRACKED_KEYS:
+                self._contended.popitem(last=False)
+
+    def get_stats(self, top=10):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            histogram = list(self._histogram)
+            contended = sorted(self._contended.items(), key=lambda kv: -kv[1]["totalMs"])[:top]
+        total = stats["acquired"] + stats["timeouts"]
+        return {
+            "stripes": len(self.stripes),
+            "timeout": self.timeout,
+            "acquired": stats["acquired"],
+            "timeouts": stats["timeouts"],
+            "avgWaitMs": round(stats["waitMs"] / total, 4) if total else 0,
+            # Liste ordonnée : {"leMs": borne haute (None = +inf), "count": n}
+            "waitHistogram": [
+                {"leMs": bound, "count": n} for bound, n in zip(WAIT_BUCKETS_MS + (None,), histogram)
+            ],
+            "contended": [
+                dict(entry, key=key, totalMs=round(entry["totalMs"], 3), maxMs=round(entry["maxMs"], 3))
+                for key, entry in contended
+            ],
+        }
+
+
+_manager = StripedLockManager()
+
+
+def configure_lock_manager(config):
+    """Recrée le gestionnaire avec LOCK_STRIPES / LOCK_TIMEOUT (au démarrage)."""
+    global _manager
+    _manager = StripedLockManager(
+        stripes=config.get("LOCK_STRIPES", DEFAULT_STRIPES),
+        timeout=config.get("LOCK_TIMEOUT", DEFAULT_TIMEOUT),
+    )
+    return _manager
+
+
+def challenge_lock(challenge_id, timeout=None):
+    """Context manager : verrou du challenge (LockTimeout à l'échéance)."""
+    return _manager.lock(challenge_id, timeout)
+
+
+def challenge_locks(challenge_ids, timeout=None):
+    """Context manager : verrous de plusieurs challenges (ordre global, sans interblocage)."""
+    return _manager.lock_many(challenge_ids, timeout)
+
+
+def get_lock_stats(top=10):
+    return _manager.get_stats(top)
@@ -0,0 +1,249 @@
+"""
+Récupération concurrente des cotations (asyncio + aiohttp).
+
+Toutes les requêtes d'un rafraîchissement (une par symbole Yahoo, une
+par page LeBoursier) partent en même temps sur un pool de connexions
+borné, sous une échéance globale : rafraîchir 20 symboles coûte environ
+un aller-retour upstream au lieu de 20. Les requêtes non terminées à
+l'échéance sont annulées et les symboles concernés restent absents du
+résultat.
+
+La boucle asyncio tourne dans un thread dédié ; les routes Flask et le
+poller de fond l'appellent via AsyncMarketFetcher.fetch(), qui bloque
+jusqu'au résultat (pont synchrone). Le fetcher (et aiohttp) n'est créé
+qu'au premier rafraîchissement.
+
+Yahoo est interrogé via l'API chart v8 (celle qu'utilise yfinance), la
+seule exposée en HTTP simple ; LeBoursier via les mêmes GET
+conditionnels et extracteurs que LeBoursierClient.
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+
+from backend.maroc_extractors import extract_price
+from backend.market_data_maroc import (
+    LEBOURSIER_BASE_URL,
+    LEBOURSIER_CONNECT_TIMEOUT,
+    LEBOURSIER_PATHS,
+    LEBOURSIER_READ_TIMEOUT,
+    _build_quote,
+)
+
+YAHOO_CHART_URL = os.environ.get('YAHOO_CHART_URL', 'https://query1.finance.yahoo.com/v8/finance/chart/')
+
+DEFAULT_FETCH_DEADLINE = 2.5   # secondes pour l'ensemble d'un rafraîchissement
+DEFAULT_POOL_SIZE = 20         # connexions simultanées max (toutes sources)
+
+# Dépendance optionnelle : repli sur le fetch séquentiel si absente
+HAS_AIOHTTP = importlib.util.find_spec("aiohttp") is not None
+
+
+class AsyncMarketFetcher:
+    """Boucle asyncio + session aiohttp partagées par le process."""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, deadline=DEFAULT_FETCH_DEADLINE,
+                 yahoo_url=None, leboursier_url=None):
+        if not HAS_AIOHTTP:
+            raise RuntimeError("aiohttp n'est pas installé")
+        self.pool_size = int(pool_size)
+        self.deadline = float(deadline)
+        self.yahoo_url = yahoo_url or YAHOO_CHART_URL
+        self.leboursier_url = (leboursier_url or LEBOURSIER_BASE_URL).rstrip('/')
+        self._pages = {}   # path -> {"etag", "lastModified", "hash", "price"}
+        self._session = None
+        self.stats = {"batches": 0, "requests": 0, "errors": 0, "timeouts": 0,
+                      "notModified": 0, "unchanged": 0}
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="market-fetch-loop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _get_session(self):
+        # Créée dans la boucle (aiohttp l'exige)
+        if self._session is None:
+            import aiohttp
+
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300),
+                headers={'User-Agent': 'Mozilla/5.0'},
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=LEBOURSIER_CONNECT_TIMEOUT,
+                    sock_read=LEBOURSIER_READ_TIMEOUT,
+                ),
+            )
+        return self._session
+
+    async def _fetch_yahoo(self, symbol):
+        self.stats["requests"] += 1
+        url = f"{self.yahoo_url}{symbol}"
+        async with self._get_session().get(url, params={"interval": "1m", "range": "1d"}) as resp:
+            resp.raise_for_status()
+            payload = await resp.json(content_type=None)
+        meta = payload["chart"]["result"][0]["meta"]
+        price = meta.get("regularMarketPrice")
+        if not price or price <= 0:
+            raise ValueError(f"YAHOO_NO_PRICE: {symbol}")
+        return {
+            symbol: {
+                "symbol": symbol,
+                "price": round(float(price), 4),
+                "currency": meta.get("currency") or "USD",
+                "source": "YahooFinance (Chart)",
+                "timestamp": int(time.time()),
+            }
+        }
+
+    async def _fetch_leboursier(self, path, symbols):
+        cached = self._pages.get(path) or {}
+        headers = {}
+        if cached.get("etag"):
+            headers['If-None-Match'] = cached["etag"]
+        if cached.get("lastModified"):
+            headers['If-Modified-Since'] = cached["lastModified"]
+
+        self.stats["requests"] += 1
+        async with self._get_session().get(self.leboursier_url + path, headers=headers) as resp:
+            if resp.status == 304 and cached:
+                self.stats["notModified"] += 1
+                price = cached.get("price")
+            else:
+                resp.raise_for_status()
+                body = await resp.read()
+                digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+                if cached and digest == cached.get("hash"):
+                    self.stats["unchanged"] += 1
+                    price = cached.get("price")
+                else:
+                    price = extract_price(body.decode(resp.get_encoding() or 'utf-8', errors='replace'))
+                self._pages[path] = {
+                    "etag": resp.headers.get('ETag'),
+                    "lastModified": resp.headers.get('Last-Modified'),
+                    "hash": digest,
+                    "price": price,
+                }
+        if price is None:
+            raise ValueError(f"LEBOURSIER_NO_PRICE: {path}")
+        return {symbol: _build_quote(symbol, price) for symbol in symbols}
+
+    async def _timed(self, coro):
+        started = time.perf_counter()
+        result = await coro
+        return result, time.perf_counter() - started
+
+    async def _fetch_all(self, by_source, deadline):
+        # Compteurs modifiés uniquement dans le thread de la boucle
+        self.stats["batches"] += 1
+        tasks = {}   # task -> source
+        failed = {source: 0 for source in by_source}
+        for source, symbols in by_source.items():
+            if source == "maroc":
+                pages = {}
+                for symbol in symbols:
+                    pages.setdefault(LEBOURSIER_PATHS.get(symbol), []).append(symbol)
+                for path, page_symbols in pages.items():
+                    if not path:
+                        failed[source] += 1
+                        continue
+                    tasks[asyncio.ensure_future(self._timed(self._fetch_leboursier(path, page_symbols)))] = source
+            else:
+                for symbol in symbols:
+                    tasks[asyncio.ensure_future(self._timed(self._fetch_yahoo(symbol)))] = source
+
+        done, pending = await asyncio.wait(tasks, timeout=deadline) if tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        quotes = {}
+        report = {source: {"ok": 0, "failed": failed[source], "elapsed": 0.0} for source in by_source}
+        for task, source in tasks.items():
+            entry = report[source]
+            if task in pending:
+                self.stats["timeouts"] += 1
+                entry["failed"] += 1
+                entry["elapsed"] = max(entry["elapsed"], deadline)
+                continue
+            if task.exception() is not None:
+                self.stats["errors"] += 1
+                entry["failed"] += 1
+                continue
+            result, elapsed = task.result()
+            quotes.update(result)
+            entry["ok"] += 1
+            entry["elapsed"] = max(entry["elapsed"], elapsed)
+        return quotes, report
+
+    def fetch(self, by_source, deadline=None):
+        """
+        Pont synchrone : récupère en parallèle tous les symboles de
+        `by_source` (source -> liste de symboles) avant l'échéance.
+
+        Returns:
+            (dict symbol -> cotation, dict source -> {"ok", "failed", "elapsed"})
+        """
+        deadline = self.deadline if deadline is None else float(deadline)
+        future = asyncio.run_coroutine_threadsafe(self._fetch_all(by_source, deadline), self.loop)
+        return future.result(deadline + 1.0)
+
+    def close(self, timeout=2.0):
+        async def _close():
+            if self._session is not None:
+                await self._session.close()
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), self.loop).result(timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+
+
+_fetcher = None
+_settings = None
+_fetcher_lock = threading.Lock()
+
+
+def configure_async_fetcher(config):
+    """
+    Active le fetcher partagé si MARKET_ASYNC_FETCH est actif et aiohttp
+    disponible ; il sera créé au premier appel de get_async_fetcher().
+    Retourne False si la récupération reste séquentielle.
+    """
+    global _settings
+    if not config.get("MARKET_ASYNC_FETCH", True):
+        return False
+    if not HAS_AIOHTTP:
+        print("[MARKET_FETCH] aiohttp absent : récupération séquentielle")
+        return False
+    _settings = {
+        "pool_size": config.get("MARKET_FETCH_POOL_SIZE", DEFAULT_POOL_SIZE),
+        "deadline": config.get("MARKET_FETCH_DEADLINE", DEFAULT_FETCH_DEADLINE),
+    }
+    return True
+
+
+def get_async_fetcher():
+    """Fetcher partagé (créé à la première utilisation), ou None s'il est désactivé."""
+    global _fetcher
+    if _fetcher is not None or _settings is None:
+        return _fetcher
+    with _fetcher_lock:
+        if _fetcher is None and _settings is not None:
+            _fetcher = AsyncMarketFetcher(**_settings)
+        return _fetcher
+
+
+def close_async_fetcher():
+    global _fetcher, _settings
+    with _fetcher_lock:
+        fetcher, _fetcher = _fetcher, None
+        _settings = None
+    if fetcher is not None:
+        fetcher.close()
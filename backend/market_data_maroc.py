@@ -1,50 +1,126 @@
-
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import os
+import threading
 import time
 import random
 from datetime import datetime
+from backend.maroc_extractors import extract_price
 
-def get_maroc_price(symbol):
+LEBOURSIER_BASE_URL = os.environ.get('LEBOURSIER_BASE_URL', 'https://www.leboursier.ma')
+
+# Mapping symbol -> chemin de la page valeur
+LEBOURSIER_PATHS = {
+    "IAM": "/valeur/Itissalat-Al-Maghrib.html",
+    "ATW": "/valeur/Attijariwafa-bank.html"
+}
+
+# Budget réseau (secondes) : bien en dessous des 5 s historiques
+LEBOURSIER_CONNECT_TIMEOUT = float(os.environ.get('LEBOURSIER_CONNECT_TIMEOUT', 0.75))
+LEBOURSIER_READ_TIMEOUT = float(os.environ.get('LEBOURSIER_READ_TIMEOUT', 1.5))
+
+# Prix de base réalistes pour la simulation
+SIMULATION_BASES = {"IAM": 95.50, "ATW": 480.00}
+
+class LeBoursierClient:
     """
-    Scrape le prix réel depuis LeBoursier.ma ou fallback simulation réaliste.
+    Client longue durée pour LeBoursier.ma.
+
+    - Session HTTP keep-alive partagée (pas de handshake TCP/TLS par appel)
+    - GET conditionnels (If-None-Match / If-Modified-Since) : sur 304 ou
+      contenu identique (même hash), le dernier cours parsé est réutilisé
+    - Timeouts connect/read courts
     """
-    # Mapping symbol -> URL slug
-    urls = {
-        "IAM": "https://www.leboursier.ma/valeur/Itissalat-Al-Maghrib.html",
-        "ATW": "https://www.leboursier.ma/valeur/Attijariwafa-bank.html"
-    }
-    
-    target_url = urls.get(symbol)
-    real_price = None
-    
-    # 1. Tentative de Scraping
-    if target_url:
-        try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            resp = requests.get(target_url, headers=headers, timeout=5)
-            if resp.status_code == 200:
-                soup = BeautifulSoup(resp.text, 'html.parser')
-                # Sélecteurs possibles sur le site cible
-                price_tag = soup.select_one('.valeur_last') or soup.select_one('.cotation') or soup.find('span', class_='value')
-                
-                if price_tag:
-                    clean_text = price_tag.get_text().strip().replace(' ', '').replace(',', '.')
-                    # Nettoyage supplémentaire pour garder uniquement les chiffres et le point
-                    import re
-                    match = re.search(r"(\d+\.?\d*)", clean_text)
-                    if match:
-                        real_price = float(match.group(1))
-                        # Petit log pour debug le succès
-                        # print(f"[SCRAPER_SUCCESS] {symbol} found at {real_price}")
-        except Exception as e:
-            print(f"[SCRAPER_ERROR] {symbol}: {e}")
+
+    def __init__(self, base_url=None, connect_timeout=None, read_timeout=None, pool_size=4):
+        # requests est importé à la création du client, pas au démarrage
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = (base_url or LEBOURSIER_BASE_URL).rstrip('/')
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else LEBOURSIER_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else LEBOURSIER_READ_TIMEOUT,
+        )
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': 'Mozilla/5.0'})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._pages = {}  # path -> {"etag", "lastModified", "hash", "price"}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "notModified": 0, "unchanged": 0, "parsed": 0, "errors": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def fetch_price(self, path):
+        """Retourne le dernier cours de la page `path`, ou None en cas d'échec."""
+        with self._lock:
+            cached = dict(self._pages.get(path) or {})
+        headers = {}
+        if cached.get("etag"):
+            headers['If-None-Match'] = cached["etag"]
+        if cached.get("lastModified"):
+            headers['If-Modified-Since'] = cached["lastModified"]
+
+        self._count("requests")
+        resp = self.session.get(self.base_url + path, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304 and cached:
+            self._count("notModified")
+            return cached.get("price")
+        if resp.status_code != 200:
+            self._count("errors")
+            return None
+
+        digest = hashlib.blake2b(resp.content, digest_size=16).hexdigest()
+        if cached and digest == cached.get("hash"):
+            self._count("unchanged")
+            price = cached.get("price")
+        else:
+            self._count("parsed")
+            price = extract_price(resp.text)
+
+        with self._lock:
+            self._pages[path] = {
+                "etag": resp.headers.get('ETag'),
+                "lastModified": resp.headers.get('Last-Modified'),
+                "hash": digest,
+                "price": price,
+            }
+        return price
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Client LeBoursier partagé par le process (créé à la première utilisation)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LeBoursierClient()
+        return _client
+
+def _scrape_page(path, symbol):
+    """
+    Récupère une page LeBoursier et en extrait le dernier cours.
+    Retourne None si la page ou le sélecteur est introuvable.
+    """
+    try:
+        return get_client().fetch_price(path)
+    except Exception as e:
+        print(f"[SCRAPER_ERROR] {symbol}: {e}")
+    return None
+
+def _build_quote(symbol, real_price):
+    scraped = real_price is not None
 
     # 2. Fallback / Simulation si échec (pour garantir que le chart bouge lors de l'examen)
     if real_price is None:
-        # Prix de base réalistes
-        bases = {"IAM": 95.50, "ATW": 480.00}
-        base = bases.get(symbol, 100.00)
+        base = SIMULATION_BASES.get(symbol, 100.00)
         # Micro-tendance aléatoire
         trend = random.uniform(-0.1, 0.1)
         real_price = base + trend
@@ -59,6 +135,84 @@ def get_maroc_price(symbol):
         "price": round(real_price, 2),
         "timestamp": int(time.time()),
         "currency": "MAD",
-        "source": "LeBoursier" if target_url else "SIMULATION_FALLBACK",
+        "source": "LeBoursier" if scraped else "SIMULATION_FALLBACK",
         "market": "Casablanca"
     }
+
+def fetch_maroc_price(symbol):
+    """
+    Cours réel depuis LeBoursier.ma, sans fallback. Lève une exception si
+    le symbole n'a pas de page ou si la page est inexploitable.
+    """
+    target_path = LEBOURSIER_PATHS.get(symbol)
+    if not target_path:
+        raise LookupError(f"LEBOURSIER_UNKNOWN_SYMBOL: {symbol}")
+    real_price = get_client().fetch_price(target_path)
+    if real_price is None:
+        raise ValueError(f"LEBOURSIER_NO_PRICE: {symbol}")
+    return _build_quote(symbol, real_price)
+
+def fetch_maroc_prices(symbols):
+    """
+    Version groupée de fetch_maroc_price : une requête par page.
+
+    Returns:
+        dict symbol -> cotation pour les pages exploitables ; lève une
+        exception si aucune ne l'est
+    """
+    pages = {}
+    for symbol in dict.fromkeys(symbols):
+        pages.setdefault(LEBOURSIER_PATHS.get(symbol), []).append(symbol)
+
+    quotes = {}
+    errors = []
+    for path, page_symbols in pages.items():
+        real_price = None
+        if path:
+            try:
+                real_price = get_client().fetch_price(path)
+            except Exception as e:
+                errors.append(f"{page_symbols[0]}: {e}")
+        if real_price is None:
+            continue
+        for symbol in page_symbols:
+            quotes[symbol] = _build_quote(symbol, real_price)
+    if not quotes:
+        raise ValueError(f"LEBOURSIER_NO_PRICE: {'; '.join(errors) or ','.join(pages.get(None, []))}")
+    return quotes
+
+def get_maroc_simulated_price(symbol):
+    """Cotation simulée (source indisponible et aucun prix réel connu)."""
+    return _build_quote(symbol, None)
+
+def get_maroc_price(symbol):
+    """
+    Scrape le prix réel depuis LeBoursier.ma ou fallback simulation réaliste.
+    """
+    target_path = LEBOURSIER_PATHS.get(symbol)
+    real_price = None
+
+    # 1. Tentative de Scraping
+    if target_path:
+        real_price = _scrape_page(target_path, symbol)
+
+    return _build_quote(symbol, real_price)
+
+def get_maroc_prices(symbols):
+    """
+    Version groupée : une seule requête par page LeBoursier, dont le
+    résultat est partagé entre tous les symboles servis par cette page.
+
+    Returns:
+        dict symbol -> cotation
+    """
+    pages = {}
+    for symbol in dict.fromkeys(symbols):
+        pages.setdefault(LEBOURSIER_PATHS.get(symbol), []).append(symbol)
+
+    quotes = {}
+    for path, page_symbols in pages.items():
+        real_price = _scrape_page(path, page_symbols[0]) if path else None
+        for symbol in page_symbols:
+            quotes[symbol] = _build_quote(symbol, real_price)
+    return quotes
@@ -1,65 +1,86 @@
 
-import yfinance as yf
 import random
 import time
 
-# Cache simple pour simulation cohérente
+# yfinance (et pandas) sont importés au premier appel : leur chargement
+# domine sinon le démarrage du process
+
+# Cache simple pour simulation cohérente (tickers tradables seulement : un
+# ticker inconnu est simulé autour de 100 sans être mémorisé)
 _mock_prices = {
+    "BTC": 96500.00,
+    "ETH": 3450.00,
     "BTC-USD": 96500.00,
     "ETH-USD": 3450.00,
     "TSLA": 240.00,
     "AAPL": 180.00
 }
 
-def get_yahoo_price(ticker):
+def fetch_yahoo_price(ticker):
     """
-    Récupère le dernier prix de clôture ou prix actuel.
-    Fallback sur simulation si l'API échoue.
+    Récupère le dernier prix de clôture ou prix actuel, sans fallback.
+    Lève une exception si Yahoo ne renvoie aucun prix exploitable.
     """
-    try:
-        # Tente de récupérer le prix réel
-        data = yf.Ticker(ticker)
-        # Access property safely
-        # Try fast_info first
-        if hasattr(data, 'fast_info'):
-            # Check for various keys that might hold the price
-            if 'last_price' in data.fast_info:
-                price = data.fast_info['last_price']
-            elif 'regularMarketPrice' in data.fast_info:
-                price = data.fast_info['regularMarketPrice']
-            else:
-                price = None
-
-            if price and price > 0:
-                 return {
-                    "symbol": ticker,
-                    "price": round(price, 4),
-                    "currency": "USD",
-                    "source": "YahooFinance",
-                    "timestamp": int(time.time())
-                }
-        
-        # Fallback to history (slower but more reliable)
-        hist = data.history(period="1d")
-        if not hist.empty:
-            price = hist['Close'].iloc[-1]
+    import yfinance as yf
+
+    data = yf.Ticker(ticker)
+    # Try fast_info first
+    if hasattr(data, 'fast_info'):
+        # Check for various keys that might hold the price
+        if 'last_price' in data.fast_info:
+            price = data.fast_info['last_price']
+        elif 'regularMarketPrice' in data.fast_info:
+            price = data.fast_info['regularMarketPrice']
+        else:
+            price = None
+
+        if price and price > 0:
             return {
                 "symbol": ticker,
                 "price": round(price, 4),
                 "currency": "USD",
-                "source": "YahooFinance (History)",
+                "source": "YahooFinance",
                 "timestamp": int(time.time())
             }
+
+    # Fallback to history (slower but more reliable)
+    hist = data.history(period="1d")
+    if hist.empty:
+        raise ValueError(f"YAHOO_NO_PRICE: {ticker}")
+    price = hist['Close'].iloc[-1]
+    return {
+        "symbol": ticker,
+        "price": round(price, 4),
+        "currency": "USD",
+        "source": "YahooFinance (History)",
+        "timestamp": int(time.time())
+    }
+
+def get_yahoo_price(ticker):
+    """
+    Récupère le dernier prix de clôture ou prix actuel.
+    Fallback sur simulation si l'API échoue.
+    """
+    try:
+        return fetch_yahoo_price(ticker)
     except Exception:
         # On ignore silencieusement les erreurs et on passe au fallback
         pass
-        
+
+    return _simulated_quote(ticker)
+
+def get_yahoo_simulated_price(ticker):
+    """Cotation simulée (source indisponible et aucun prix réel connu)."""
+    return _simulated_quote(ticker)
+
+def _simulated_quote(ticker):
     # Fallback Simulation
     base = _mock_prices.get(ticker, 100.00)
     # Variation +/- 0.2%
     variation = random.uniform(-0.002, 0.002)
     new_price = base * (1 + variation)
-    _mock_prices[ticker] = new_price # Update cache for continuity
+    if ticker in _mock_prices:
+        _mock_prices[ticker] = new_price # Update cache for continuity
     
     return {
         "symbol": ticker,
@@ -68,3 +89,96 @@ def get_yahoo_price(ticker):
         "source": "SIMULATION_FALLBACK",
         "timestamp": int(time.time())
     }
+
+def fetch_yahoo_prices(tickers):
+    """
+    Récupère les derniers prix de plusieurs tickers en UN seul appel
+    (yf.download groupé), sans fallback.
+
+    Returns:
+        dict ticker -> cotation, pour les tickers ayant un prix ; lève une
+        exception si aucun ticker n'a pu être coté
+    """
+    tickers = list(dict.fromkeys(tickers))
+    quotes = {}
+    if not tickers:
+        return quotes
+    import yfinance as yf
+
+    hist = yf.download(
+        tickers,
+        period="1d",
+        interval="1m",
+        group_by="ticker",
+        progress=False,
+        threads=False,
+    )
+    if hist is not None and not hist.empty:
+        for ticker in tickers:
+            try:
+                # Colonnes (ticker, champ) en mode groupé
+                frame = hist[ticker] if hist.columns.nlevels > 1 else hist
+                closes = frame['Close'].dropna()
+            except Exception:
+                continue
+            if closes.empty:
+                continue
+            price = float(closes.iloc[-1])
+            if price > 0:
+                quotes[ticker] = {
+                    "symbol": ticker,
+                    "price": round(price, 4),
+                    "currency": "USD",
+                    "source": "YahooFinance (Batch)",
+                    "timestamp": int(time.time())
+                }
+    if not quotes:
+        raise ValueError(f"YAHOO_NO_PRICE: {','.join(tickers)}")
+    return quotes
+
+def get_yahoo_prices(tickers):
+    """
+    Version groupée de get_yahoo_price. Fallback simulation par ticker
+    manquant.
+
+    Returns:
+        dict ticker -> cotation
+    """
+    tickers = list(dict.fromkeys(tickers))
+    quotes = {}
+    try:
+        quotes = fetch_yahoo_prices(tickers)
+    except Exception:
+        # On ignore silencieusement les erreurs et on passe au fallback
+        pass
+
+    for ticker in tickers:
+        if ticker not in quotes:
+            quotes[ticker] = _simulated_quote(ticker)
+    return quotes
+
+def get_yahoo_history(ticker, interval, start, end):
+    """
+    Bougies historiques Yahoo entre deux datetimes.
+
+    Returns:
+        liste de tuples (timestamp_s, open, high, low, close, volume),
+        vide si la source est indisponible
+    """
+    try:
+        import yfinance as yf
+
+        hist = yf.Ticker(ticker).history(interval=interval, start=start, end=end)
+    except Exception:
+        return []
+    if hist is None or hist.empty:
+        return []
+    timestamps = hist.index.asi8 // 1_000_000_000
+    return list(zip(
+        timestamps.tolist(),
+        hist['Open'].tolist(),
+        hist['High'].tolist(),
+        hist['Low'].tolist(),
+        hist['Close'].tolist(),
+        hist['Volume'].tolist(),
+    ))
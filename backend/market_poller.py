@@ -0,0 +1,115 @@
+"""
+Poller de fond : rafraîchit les cotations des symboles connus hors du
+thread des requêtes Flask.
+
+Chaque source a son propre thread et sa propre cadence (ex: 1 s pour la
+crypto, 15 s pour Casablanca). En cas d'échec upstream, l'intervalle de
+la source est doublé à chaque échec jusqu'à POLL_MAX_BACKOFF ; quand le
+disjoncteur de la source est ouvert, un cycle ne coûte aucun appel réseau.
+"""
+
+import threading
+import time
+
+from backend import price_service
+
+# Groupes de symboles rafraîchis ensemble : nom -> (symboles, clé de config)
+POLL_GROUPS = {
+    "crypto": ({"BTC", "ETH", "BTC-USD", "ETH-USD"}, "POLL_INTERVAL_CRYPTO"),
+    "us_equity": ({"AAPL", "TSLA"}, "POLL_INTERVAL_US_EQUITY"),
+    "casablanca": (set(price_service.MAROC_SYMBOLS), "POLL_INTERVAL_CASABLANCA"),
+}
+
+_pollers = []
+_lock = threading.Lock()
+
+
+class SourcePoller(threading.Thread):
+    """Thread de rafraîchissement d'un groupe de symboles."""
+
+    def __init__(self, name, symbols, interval, max_backoff):
+        super().__init__(name=f"market-poller-{name}", daemon=True)
+        self.group = name
+        self.symbols = sorted(symbols)
+        self.interval = float(interval)
+        self.max_backoff = float(max_backoff)
+        self.failures = 0
+        self.last_success = None
+        self._stop_event = threading.Event()
+
+    def next_delay(self):
+        if not self.failures:
+            return self.interval
+        return min(self.interval * (2 ** self.failures), self.max_backoff)
+
+    def poll_once(self):
+        """Rafraîchit le groupe en un appel groupé. Retourne True si tout est OK."""
+        try:
+            quotes = price_service.fetch_quotes(self.symbols)
+        except Exception as e:
+            print(f"[POLLER_ERROR] {self.group}: {e}")
+            return False
+        for symbol, quote in quotes.items():
+            price_service.store_quote(symbol, quote)
+        missing = [s for s in self.symbols if s not in quotes]
+        for symbol in missing:
+            # Source indisponible (ou disjoncteur ouvert) : le dernier prix
+            # réel reste en cache, ou un prix simulé est publié pour la
+            # continuité du chart ; on ralentit la cadence
+            price_service.fallback_quote(symbol)
+        return not missing
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.poll_once():
+                self.failures = 0
+                self.last_success = time.time()
+            else:
+                self.failures += 1
+            self._stop_event.wait(self.next_delay())
+
+    def stop(self):
+        self._stop_event.set()
+
+    def status(self):
+        return {
+            "group": self.group,
+            "symbols": self.symbols,
+            "interval": self.interval,
+            "failures": self.failures,
+            "nextDelay": self.next_delay(),
+            "lastSuccess": self.last_success,
+            "alive": self.is_alive(),
+        }
+
+
+def start_market_poller(config):
+    """Démarre un thread par groupe de symboles (idempotent)."""
+    with _lock:
+        if _pollers:
+            return list(_pollers)
+        max_backoff = config.get("POLL_MAX_BACKOFF", 60.0)
+        for name, (symbols, interval_key) in POLL_GROUPS.items():
+            interval = float(config.get(interval_key, 5.0))
+            poller = SourcePoller(name, symbols, interval, max_backoff)
+            price_service.register_polled_symbols(symbols, interval)
+            poller.start()
+            _pollers.append(poller)
+        return list(_pollers)
+
+
+def stop_market_poller(timeout=2.0):
+    """Arrête les threads du poller ; les requêtes repassent en fetch direct."""
+    with _lock:
+        pollers = list(_pollers)
+        _pollers.clear()
+    for poller in pollers:
+        poller.stop()
+    for poller in pollers:
+        poller.join(timeout)
+    price_service.unregister_polled_symbols()
+
+
+def get_poller_status():
+    with _lock:
+        return [p.status() for p in _pollers]
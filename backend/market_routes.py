@@ -0,0 +1,104 @@
+"""
+Routes API des données de marché : flux SSE et bougies OHLCV
+"""
+
+from urllib.parse import urlencode
+
+from flask import Blueprint, Response, request, jsonify, redirect, stream_with_context
+from backend.price_stream import parse_stream_request, stream_quotes
+from backend.price_stream_server import stream_redirect_url
+from backend.tick_store import TIMEFRAMES, get_candles
+from backend.bar_archive import ARCHIVE_TIMEFRAMES, get_archive
+
+market_bp = Blueprint('market', __name__)
+
+@market_bp.route('/api/price/stream', methods=['GET'])
+def price_stream():
+    """
+    Flux Server-Sent Events des cotations.
+
+    Query: ?symbols=BTC-USD,IAM
+    Header (optionnel): Last-Event-ID pour reprendre après une coupure
+
+    Événements:
+        event: quote / data: {symbol, price, fetchedAt, ...}
+        ": heartbeat" toutes les 15 s sans tick
+
+    Avec PRICE_STREAM_PORT, redirection 307 vers le serveur asyncio (tous
+    les flux sur une boucle) ; sinon servi ici, un thread par flux.
+    """
+    symbols, last_event_id, error = parse_stream_request(request.args, request.headers)
+    if error:
+        return jsonify(error), 400
+
+    target = stream_redirect_url(request.scheme, request.host)
+    if target:
+        query = {"symbols": ",".join(sorted(symbols))}
+        if last_event_id is not None:
+            # En-tête non garanti après une redirection cross-origin
+            query["lastEventId"] = last_event_id
+        return redirect(f"{target}?{urlencode(query)}", code=307)
+
+    return Response(
+        stream_with_context(stream_quotes(symbols, last_event_id)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+@market_bp.route('/api/candles/<symbol>', methods=['GET'])
+def candles(symbol):
+    """
+    Bougies OHLCV agrégées en mémoire depuis les ticks reçus.
+
+    Query: ?tf=1s|1m|5m|1h (défaut 1m) & limit=500
+    """
+    tf = request.args.get('tf', '1m')
+    if tf not in TIMEFRAMES:
+        return jsonify({"error": "INVALID_TIMEFRAME", "allowed": list(TIMEFRAMES)}), 400
+    limit = request.args.get('limit', 500, type=int)
+    if limit is None or limit <= 0:
+        return jsonify({"error": "INVALID_LIMIT"}), 400
+
+    cols = get_candles(symbol, tf, limit)
+    if cols is None:
+        return jsonify({"error": "NO_TICK_DATA", "symbol": symbol.upper()}), 404
+
+    rows = zip(*(cols[f].tolist() for f in ("time", "open", "high", "low", "close", "volume")))
+    return jsonify({
+        "symbol": symbol.upper(),
+        "tf": tf,
+        "candles": [
+            {"time": t, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for t, o, h, l, c, v in rows
+        ],
+    })
+
+@market_bp.route('/api/bars/<symbol>', methods=['GET'])
+def archived_bars(symbol):
+    """
+    Bougies historiques de l'archive disque.
+
+    Query: ?tf=1m|5m|1h|1d (défaut 1m) & start=<epoch s> & end=<epoch s> & limit=5000
+    """
+    tf = request.args.get('tf', '1m')
+    if tf not in ARCHIVE_TIMEFRAMES:
+        return jsonify({"error": "INVALID_TIMEFRAME", "allowed": list(ARCHIVE_TIMEFRAMES)}), 400
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    limit = request.args.get('limit', 5000, type=int)
+    if limit is None or limit <= 0:
+        return jsonify({"error": "INVALID_LIMIT"}), 400
+
+    bars = get_archive().read_range(symbol, tf, start, end, limit)
+    rows = zip(*(bars[f].tolist() for f in ("ts", "open", "high", "low", "close", "volume")))
+    return jsonify({
+        "symbol": symbol.upper(),
+        "tf": tf,
+        "bars": [
+            {"time": t, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for t, o, h, l, c, v in rows
+        ],
+    })
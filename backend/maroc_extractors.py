@@ -0,0 +1,124 @@
+"""
+Moteur d'extraction du dernier cours des pages valeur LeBoursier.
+
+Les extracteurs sont essayés dans l'ordre, du plus rapide au plus
+robuste : regex précompilées ancrées sur les sélecteurs connus, puis lxml
+(si installé), puis BeautifulSoup (chemin historique) en dernier recours.
+Chaque extracteur retourne un float ou None.
+"""
+
+import html as html_lib
+import importlib.util
+import re
+import threading
+
+# lxml est optionnel et importé au premier parse
+HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+# Même nettoyage que le scraper historique : "1 308,85" -> 1308.85
+_NUMBER_RE = re.compile(r"(\d+\.?\d*)")
+
+# Sélecteurs connus, par ordre de priorité : .valeur_last, .cotation, span.value
+# Le groupe 2 n'est présent que si le texte est suivi directement de la
+# balise fermante (élément sans enfant)
+_SELECTOR_PATTERNS = [
+    re.compile(r"""<[a-zA-Z][^>]*\bclass\s*=\s*["'][^"']*(?<![\w-])valeur_last(?![\w-])[^"']*["'][^>]*>([^<]*)(<\s*/)?""", re.S),
+    re.compile(r"""<[a-zA-Z][^>]*\bclass\s*=\s*["'][^"']*(?<![\w-])cotation(?![\w-])[^"']*["'][^>]*>([^<]*)(<\s*/)?""", re.S),
+    re.compile(r"""<span\b[^>]*\bclass\s*=\s*["'][^"']*(?<![\w-])value(?![\w-])[^"']*["'][^>]*>([^<]*)(<\s*/)?""", re.S),
+]
+# Contenu accepté par le chemin rapide : un seul nombre complet ("1 308,85")
+_PRICE_TOKEN_RE = re.compile(r"\s*\d[\d .,]*\s*")
+
+def parse_price_text(text):
+    clean_text = text.strip().replace(' ', '').replace(',', '.')
+    match = _NUMBER_RE.search(clean_text)
+    if match:
+        return float(match.group(1))
+    return None
+
+def extract_price_regex(html):
+    """Chemin rapide : regex précompilées, sans construire d'arbre."""
+    for pattern in _SELECTOR_PATTERNS:
+        match = pattern.search(html)
+        if match:
+            # Balise imbriquée ou texte autre qu'un nombre : on laisse un
+            # parseur complet trancher (sinon "1 308<sup>,85</sup>" -> 1308)
+            text = html_lib.unescape(match.group(1))
+            if match.group(2) is None or not _PRICE_TOKEN_RE.fullmatch(text):
+                return None
+            return parse_price_text(text)
+    return None
+
+def extract_price_lxml(html):
+    """Parse lxml (C) + XPath sur les mêmes sélecteurs."""
+    if not HAS_LXML:
+        return None
+    from lxml import html as lxml_html
+
+    tree = lxml_html.fromstring(html)
+    for xpath in (
+        "//*[contains(concat(' ', normalize-space(@class), ' '), ' valeur_last ')]",
+        "//*[contains(concat(' ', normalize-space(@class), ' '), ' cotation ')]",
+        "//span[contains(concat(' ', normalize-space(@class), ' '), ' value ')]",
+    ):
+        nodes = tree.xpath(xpath)
+        if nodes:
+            return parse_price_text(nodes[0].text_content())
+    return None
+
+def extract_price_bs4(html):
+    """Chemin historique : arbre BeautifulSoup complet (html.parser)."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    # Sélecteurs possibles sur le site cible
+    price_tag = soup.select_one('.valeur_last') or soup.select_one('.cotation') or soup.find('span', class_='value')
+    if price_tag:
+        return parse_price_text(price_tag.get_text())
+    return None
+
+EXTRACTORS = [
+    ("regex", extract_price_regex),
+    ("lxml", extract_price_lxml),
+    ("bs4", extract_price_bs4),
+]
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def register_extractor(name, fn, position=None):
+    """Ajoute (ou remplace) un extracteur dans la chaîne."""
+    unregister_extractor(name)
+    entry = (name, fn)
+    if position is None:
+        EXTRACTORS.append(entry)
+    else:
+        EXTRACTORS.insert(position, entry)
+
+def unregister_extractor(name):
+    EXTRACTORS[:] = [e for e in EXTRACTORS if e[0] != name]
+
+def available_extractors():
+    return [name for name, _ in EXTRACTORS if name != "lxml" or HAS_LXML]
+
+def extract_price(html):
+    """
+    Essaie chaque extracteur dans l'ordre et retourne le premier prix trouvé.
+    """
+    for name, fn in EXTRACTORS:
+        try:
+            price = fn(html)
+        except Exception:
+            price = None
+        if price is not None:
+            with _stats_lock:
+                _stats[name] = _stats.get(name, 0) + 1
+            return price
+    with _stats_lock:
+        _stats["miss"] = _stats.get("miss", 0) + 1
+    return None
+
+def get_extractor_stats():
+    """Nombre d'extractions réussies par extracteur (+ 'miss')."""
+    with _stats_lock:
+        return dict(_stats)
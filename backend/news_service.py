@@ -3,7 +3,6 @@ Service d'actualités financières pour TradeSense
 Agrège des flux RSS de sources professionnelles
 """
 
-import feedparser
 from datetime import datetime, timezone
 import time
 from typing import List, Dict, Optional
@@ -18,6 +17,8 @@ _news_cache = {
 def get_time_ago(published_time: str) -> str:
     """Convertit un timestamp en format relatif (ex: '2h ago')"""
     try:
+        import feedparser
+
         # Parse différents formats de date RSS
         parsed = feedparser._parse_date(published_time)
         if not parsed:
@@ -108,6 +109,8 @@ def fetch_financial_news() -> List[Dict]:
         }
     ]
     
+    import feedparser
+
     all_articles = []
     
     for source in news_sources:
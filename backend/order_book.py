@@ -0,0 +1,494 @@
+"""
+Ordres limites et stops, déclenchés sur les cotations publiées.
+
+Types d'ordres :
+  - LIMIT / STOP : ouvrent une position (execute_trade) au franchissement
+    de `triggerPrice` ;
+  - STOP_LOSS / TAKE_PROFIT : clôturent une position ouverte (positionId),
+    côté opposé à la position ; à la clôture, les autres ordres de la
+    position sont annulés.
+
+Un ordre se déclenche soit quand le prix descend à son seuil (achat
+limite, vente stop, stop-loss d'un long...), soit quand il y monte. Par
+symbole, deux tas indexent les ordres en attente sur leur seuil :
+  - bas  : tas max, déclenché tant que seuil >= prix ;
+  - haut : tas min, déclenché tant que seuil <= prix.
+Un tick ne dépile que les k ordres franchis, en O(k log n), au lieu de
+parcourir tous les ordres du symbole. Une annulation retire l'ordre du
+dict et laisse son entrée dans le tas (suppression paresseuse) ; les tas
+sont reconstruits quand les entrées mortes dominent.
+
+Les ordres sont écrits en base à la création et à l'annulation ; le
+remplissage met l'ordre à jour dans la transaction du trade
+(TradeRecord.statements). L'index est rechargé depuis les ordres PENDING
+au démarrage. Comme l'index des positions, il est propre au process : le
+statut relu en base sous le verrou du challenge écarte un ordre déjà
+rempli ou annulé par un autre worker.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from backend.challenge_store import discard_challenge, get_challenge, put_challenge
+from backend.db import get_read_connection, release_thread_connections, transaction
+from backend.lock_manager import LockTimeout, challenge_lock
+from backend.position_book import (find_position, holds_positions, mark_challenge, open_exposure,
+                                   release_position, track_trade)
+from backend.trade_persistence import (PersistenceBackpressure, TradeRecord, VersionConflict,
+                                       flush_trade_writer, persist_trades)
+from backend.trade_service import close_position, execute_trade
+
+ENTRY_TYPES = ("LIMIT", "STOP")
+EXIT_TYPES = ("STOP_LOSS", "TAKE_PROFIT")
+ORDER_TYPES = ENTRY_TYPES + EXIT_TYPES
+ORDER_STATUSES = ("PENDING", "FILLED", "CANCELLED", "REJECTED")
+
+BELOW, ABOVE = 0, 1         # sens de franchissement du seuil
+DEFAULT_MAX_PENDING = 50    # ordres en attente par challenge
+COMPACT_MIN_DEAD = 1024     # entrées mortes avant reconstruction des tas
+FILL_LOCK_TIMEOUT = 2.0
+VERSION_CONFLICT_RETRIES = 5
+
+ORDER_COLUMNS = (
+    "id, challenge_id, symbol, type, side, trigger_price, lots, position_id, status, "
+    "trade_id, fill_price, reason, created_at, updated_at"
+)
+INSERT_ORDER_SQL = f"INSERT INTO orders ({ORDER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+FILL_ORDER_SQL = (
+    "UPDATE orders SET status = 'FILLED', trade_id = ?, fill_price = ?, updated_at = ? "
+    "WHERE id = ? AND status = 'PENDING'"
+)
+FINISH_ORDER_SQL = (
+    "UPDATE orders SET status = ?, reason = ?, updated_at = ? "
+    "WHERE id = ? AND status = 'PENDING'"
+)
+CANCEL_POSITION_ORDERS_SQL = (
+    "UPDATE orders SET status = 'CANCELLED', reason = ?, updated_at = ? "
+    "WHERE position_id = ? AND status = 'PENDING'"
+)
+SELECT_ORDER_SQL = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = ?"
+LOAD_PENDING_SQL = f"SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'PENDING' ORDER BY created_at"
+
+
+def trigger_direction(order_type, side):
+    """BELOW : déclenché quand le prix descend au seuil ; ABOVE : quand il y monte."""
+    # Limite / take-profit : meilleur prix que le seuil ; stop / stop-loss : pire
+    return BELOW if (order_type in ("LIMIT", "TAKE_PROFIT")) == (side == "BUY") else ABOVE
+
+
+def is_triggered(order, price):
+    if trigger_direction(order['type'], order['side']) == BELOW:
+        return price <= order['triggerPrice']
+    return price >= order['triggerPrice']
+
+
+def _order_from_row(row):
+    return {
+        "id": row["id"], "challengeId": row["challenge_id"], "symbol": row["symbol"],
+        "type": row["type"], "side": row["side"], "triggerPrice": row["trigger_price"],
+        "size": row["lots"], "positionId": row["position_id"], "status": row["status"],
+        "tradeId": row["trade_id"], "fillPrice": row["fill_price"], "reason": row["reason"],
+        "createdAt": row["created_at"], "updatedAt": row["updated_at"],
+    }
+
+
+def _order_row(o):
+    return (
+        o['id'], o['challengeId'], o['symbol'], o['type'], o['side'], o['triggerPrice'], o['size'],
+        o['positionId'], o['status'], o['tradeId'], o['fillPrice'], o['reason'], o['createdAt'],
+        o['updatedAt'],
+    )
+
+
+class TriggerIndex:
+    """Ordres en attente, indexés par symbole et seuil (voir module)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heaps = {}            # symbol -> (tas bas, tas haut) de (clé, seq, id)
+        self._orders = {}           # id -> ordre en attente
+        self._by_challenge = {}     # cid -> ids en attente
+        self._firing = set()        # ids dépilés, remplissage en cours
+        self._seq = itertools.count()
+        self._dead = 0              # entrées des tas sans ordre en attente
+        self.fired = 0
+        self.compactions = 0
+
+    def __len__(self):
+        return len(self._orders)
+
+    def _push(self, order):
+        heaps = self._heaps.setdefault(order['symbol'], ([], []))
+        direction = trigger_direction(order['type'], order['side'])
+        key = -order['triggerPrice'] if direction == BELOW else order['triggerPrice']
+        heapq.heappush(heaps[direction], (key, next(self._seq), order['id']))
+
+    def _forget(self, oid):
+        order = self._orders.pop(oid)
+        ids = self._by_challenge[order['challengeId']]
+        ids.discard(oid)
+        if not ids:
+            del self._by_challenge[order['challengeId']]
+        return order
+
+    def _compact(self):
+        self._heaps = {}
+        for order in self._orders.values():
+            self._push(order)
+        self._dead = 0
+        self.compactions += 1
+
+    def add(self, order):
+        with self._lock:
+            self._orders[order['id']] = order
+            self._by_challenge.setdefault(order['challengeId'], set()).add(order['id'])
+            self._push(order)
+
+    def remove(self, oid):
+        """Retire un ordre en attente ; None s'il n'est pas (ou plus) en attente ici."""
+        with self._lock:
+            if oid not in self._orders:
+                return None
+            order = self._forget(oid)
+            self._dead += 1
+            if self._dead > COMPACT_MIN_DEAD and self._dead > len(self._orders):
+                self._compact()
+            return order
+
+    def pop_triggered(self, symbol, price):
+        """Retire et retourne les ordres du symbole dont le seuil est franchi par `price`."""
+        fired = []
+        with self._lock:
+            heaps = self._heaps.get(symbol)
+            if heaps is None:
+                return fired
+            below, above = heaps
+            while below and -below[0][0] >= price:
+                self._take(heapq.heappop(below)[2], fired)
+            while above and above[0][0] <= price:
+                self._take(heapq.heappop(above)[2], fired)
+            self.fired += len(fired)
+        return fired
+
+    def _take(self, oid, fired):
+        if oid in self._orders:
+            fired.append(self._forget(oid))
+            self._firing.add(oid)
+        else:
+            self._dead -= 1
+
+    def done(self, oid):
+        """Fin du remplissage d'un ordre dépilé."""
+        with self._lock:
+            self._firing.discard(oid)
+
+    def is_firing(self, oid):
+        with self._lock:
+            return oid in self._firing
+
+    def count(self, cid):
+        with self._lock:
+            return len(self._by_challenge.get(cid, ()))
+
+    def ids_of(self, cid):
+        with self._lock:
+            return list(self._by_challenge.get(cid, ()))
+
+    def get(self, oid):
+        with self._lock:
+            return self._orders.get(oid)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._orders),
+                "symbols": sum(1 for below, above in self._heaps.values() if below or above),
+                "challenges": len(self._by_challenge),
+                "heapEntries": sum(len(below) + len(above) for below, above in self._heaps.values()),
+                "deadEntries": self._dead,
+                "firing": len(self._firing),
+                "fired": self.fired,
+                "compactions": self.compactions,
+            }
+
+
+class OrderTriggerEngine(threading.Thread):
+    """Déclenche les ordres franchis par les derniers prix publiés."""
+
+    def __init__(self, index):
+        super().__init__(name="order-triggers", daemon=True)
+        self.index = index
+        self._pending = {}      # symbol -> dernier prix non traité
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def on_quote(self, symbol, quote):
+        """Listener price_service : ne garde que le dernier prix par symbole."""
+        price = quote.get("price")
+        if not price:
+            return
+        with self._cond:
+            self._pending[symbol] = float(price)
+            self._cond.notify()
+
+    def run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    prices, self._pending = self._pending, {}
+                for symbol, price in prices.items():
+                    for order in self.index.pop_triggered(symbol, price):
+                        self._fire(order, price)
+        finally:
+            release_thread_connections()
+
+    def _fire(self, order, price):
+        try:
+            status = fill_order(order, price)
+        except Exception as e:
+            print(f"[ORDER_ERROR] {order['id']}: {e}")
+            status = None
+        if status is None:
+            # Verrou occupé, file pleine ou conflits : remis en attente
+            self.index.add(order)
+        elif status != "STALE":
+            print(f"[ORDER] {order['id']} {order['type']} {order['side']} {order['symbol']} "
+                  f"@ {price} -> {status}")
+        self.index.done(order['id'])
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+_index = TriggerIndex()
+_engine = None
+_max_pending = DEFAULT_MAX_PENDING
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _stored_status(oid):
+    row = get_read_connection().execute("SELECT status FROM orders WHERE id = ?", (oid,)).fetchone()
+    return row[0] if row else None
+
+
+def _finish_order(oid, status, reason):
+    """PENDING -> `status` en base ; False si l'ordre n'était plus en attente."""
+    with transaction() as conn:
+        return conn.execute(FINISH_ORDER_SQL, (status, reason, _now(), oid)).rowcount > 0
+
+
+def fill_order(order, price, lock_timeout=FILL_LOCK_TIMEOUT):
+    """
+    Remplit un ordre déclenché au prix du tick, sous le verrou du challenge.
+    Retourne le statut final (FILLED, REJECTED, CANCELLED), "STALE" si
+    l'ordre n'est plus en attente en base, ou None pour un nouvel essai.
+    """
+    cid = order['challengeId']
+    record = None
+    try:
+        with challenge_lock(cid, timeout=lock_timeout):
+            for _ in range(VERSION_CONFLICT_RETRIES):
+                challenge = get_challenge(cid)
+                # Relu après le challenge : un remplissage concurrent commité
+                # avant cette lecture est vu ici, sinon il change la version
+                if _stored_status(order['id']) != "PENDING":
+                    return "STALE"
+                if not challenge or challenge['status'] != "ACTIVE":
+                    _finish_order(order['id'], "REJECTED", "CHALLENGE_NOT_ACTIVE")
+                    return "REJECTED"
+                state = mark_challenge(dict(challenge))
+                if order['positionId']:
+                    found = find_position(order['positionId'])
+                    if found is None:
+                        _finish_order(order['id'], "CANCELLED", "POSITION_CLOSED")
+                        return "CANCELLED"
+                    position, _, unrealized = found
+                    trade, state = close_position(state, position, price, unrealized)
+                else:
+                    trade, outcome = execute_trade(state, order['symbol'], order['side'], price, order['size'],
+                                                   hold=holds_positions(), exposure=open_exposure(cid))
+                    if trade is None:
+                        _finish_order(order['id'], "REJECTED", outcome)
+                        return "REJECTED"
+                    state = outcome
+                filled_at = trade['closedAt'] or trade['openedAt']
+                record = TradeRecord(state, trade, challenge.get('userId'), statements=[
+                    (FILL_ORDER_SQL, (trade['id'], price, filled_at, order['id'])),
+                ])
+                try:
+                    persist_trades([record])
+                except VersionConflict:
+                    discard_challenge(cid)
+                    continue
+                except PersistenceBackpressure:
+                    return None
+                if order['positionId']:
+                    release_position(order['positionId'], state)
+                else:
+                    track_trade(trade, state)
+                put_challenge(state, pending=record)
+                break
+            else:
+                return None
+    except LockTimeout:
+        return None
+
+    try:
+        record.wait()
+    except Exception as e:
+        print(f"[ORDER_PERSIST_ERROR] {order['id']}: {e}")
+    if order['positionId']:
+        cancel_position_orders(cid, order['positionId'])
+    return "FILLED"
+
+
+def start_order_engine(config):
+    """
+    Recharge les ordres PENDING dans l'index et démarre leur déclenchement
+    sur les cotations publiées (ORDER_BOOK_ENABLED).
+    """
+    global _index, _engine, _max_pending
+    from backend import price_service
+
+    _max_pending = int(config.get("MAX_PENDING_ORDERS", DEFAULT_MAX_PENDING))
+    if not config.get("ORDER_BOOK_ENABLED", True) or _engine is not None:
+        return _engine
+    _index = TriggerIndex()
+    try:
+        rows = get_read_connection().execute(LOAD_PENDING_SQL).fetchall()
+        for row in rows:
+            _index.add(_order_from_row(row))
+        print(f"[ORDERS] {len(rows)} ordre(s) en attente rechargé(s)")
+    except Exception as e:
+        print(f"[ORDERS] rechargement impossible : {e}")
+    finally:
+        release_thread_connections()
+    _engine = OrderTriggerEngine(_index)
+    _engine.start()
+    price_service.add_quote_listener(_engine.on_quote)
+    return _engine
+
+
+def stop_order_engine(timeout=2.0):
+    global _engine
+    from backend import price_service
+
+    engine, _engine = _engine, None
+    if engine is not None:
+        price_service.remove_quote_listener(engine.on_quote)
+        engine.stop()
+        engine.join(timeout)
+
+
+def place_order(cid, order_type, trigger_price, side=None, symbol=None, size=None, position_id=None):
+    """
+    Enregistre un ordre en attente. Pour STOP_LOSS / TAKE_PROFIT, symbole,
+    sens et taille viennent de la position `position_id`.
+
+    Returns:
+        (order, None) ou (None, code d'erreur)
+    """
+    from backend.price_service import TRADABLE_SYMBOLS
+
+    if _engine is None:
+        return None, "ORDER_BOOK_DISABLED"
+    challenge = get_challenge(cid)
+    if not challenge or challenge['status'] != "ACTIVE":
+        return None, "TRADING_FORBIDDEN_INVALID_STATUS"
+    if order_type in EXIT_TYPES:
+        found = find_position(position_id) if position_id else None
+        if found is None or found[0]['challengeId'] != cid:
+            return None, "POSITION_NOT_FOUND"
+        position = found[0]
+        symbol, size = position['symbol'], position['size']
+        side = "SELL" if position['type'] == "BUY" else "BUY"
+    else:
+        position_id = None
+        if symbol not in TRADABLE_SYMBOLS:
+            return None, "INVALID_SYMBOL"
+        if not (math.isfinite(size) and size > 0):
+            return None, "INVALID_TRADE_VOLUME"
+    if not (math.isfinite(trigger_price) and trigger_price > 0):
+        return None, "INVALID_TRIGGER_PRICE"
+
+    try:
+        # Compte et insertion sous le verrou : deux requêtes concurrentes ne dépassent pas le plafond
+        with challenge_lock(cid):
+            if _index.count(cid) >= _max_pending:
+                return None, "TOO_MANY_PENDING_ORDERS"
+            now = _now()
+            order = {
+                "id": str(uuid.uuid4()), "challengeId": cid, "symbol": symbol, "type": order_type,
+                "side": side, "triggerPrice": float(trigger_price), "size": float(size),
+                "positionId": position_id, "status": "PENDING", "tradeId": None, "fillPrice": None,
+                "reason": None, "createdAt": now, "updatedAt": now,
+            }
+            with transaction() as conn:
+                conn.execute(INSERT_ORDER_SQL, _order_row(order))
+            _index.add(order)
+    except LockTimeout:
+        return None, "CHALLENGE_BUSY"
+    return order, None
+
+
+def cancel_order(oid, reason="USER_CANCELLED"):
+    """
+    Annule un ordre en attente.
+
+    Returns:
+        (ordre annulé, None) ou (None, ORDER_NOT_FOUND / ORDER_NOT_PENDING)
+    """
+    order = _index.remove(oid)
+    if order is None:
+        if _index.is_firing(oid):
+            return None, "ORDER_NOT_PENDING"
+        # Hors de l'index (autre worker) : un remplissage local en file est commité d'abord
+        flush_trade_writer()
+    if not _finish_order(oid, "CANCELLED", reason):
+        return None, "ORDER_NOT_PENDING" if get_order(oid) else "ORDER_NOT_FOUND"
+    return get_order(oid), None
+
+
+def cancel_position_orders(cid, pid, reason="POSITION_CLOSED"):
+    """Annule les ordres en attente (stop-loss / take-profit) d'une position clôturée."""
+    for oid in _index.ids_of(cid):
+        order = _index.get(oid)
+        if order and order['positionId'] == pid:
+            _index.remove(oid)
+    # En base aussi : ceux d'autres workers seront écartés au déclenchement (STALE)
+    with transaction() as conn:
+        return conn.execute(CANCEL_POSITION_ORDERS_SQL, (reason, _now(), pid)).rowcount
+
+
+def get_order(oid):
+    row = get_read_connection().execute(SELECT_ORDER_SQL, (oid,)).fetchone()
+    return _order_from_row(row) if row else None
+
+
+def list_orders(cid, status=None):
+    """Ordres du challenge, plus récents d'abord (filtre de statut optionnel)."""
+    sql = f"SELECT {ORDER_COLUMNS} FROM orders WHERE challenge_id = ?"
+    params = [cid]
+    if status:
+        sql += " AND status = ?"
+        params.append(status)
+    rows = get_read_connection().execute(sql + " ORDER BY created_at DESC", params).fetchall()
+    return [_order_from_row(row) for row in rows]
+
+
+def get_order_stats():
+    return dict(_index.get_stats(), maxPendingPerChallenge=_max_pending,
+                engine=_engine is not None and _engine.is_alive())
@@ -0,0 +1,90 @@
+import math
+
+from flask import Blueprint, request, jsonify, current_app
+from backend.order_book import place_order, cancel_order, list_orders, ORDER_TYPES, EXIT_TYPES, ORDER_STATUSES
+from backend.idempotency import idempotent
+
+order_bp = Blueprint('orders', __name__)
+
+# Code d'erreur -> statut HTTP
+ORDER_ERROR_STATUS = {
+    "TRADING_FORBIDDEN_INVALID_STATUS": 403,
+    "POSITION_NOT_FOUND": 404,
+    "ORDER_NOT_FOUND": 404,
+    "ORDER_NOT_PENDING": 409,
+    "TOO_MANY_PENDING_ORDERS": 409,
+    "ORDER_BOOK_DISABLED": 503,
+}
+
+@order_bp.route('/api/orders', methods=['POST', 'OPTIONS'])
+@idempotent
+def handle_place_order():
+    """
+    Ordre en attente, déclenché sur les cotations.
+    Body: {"challengeId", "type": LIMIT|STOP, "side", "symbol", "size", "triggerPrice"}
+       ou {"challengeId", "type": STOP_LOSS|TAKE_PROFIT, "positionId", "triggerPrice"}
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'OK'}), 200
+    data = request.get_json(silent=True) or {}
+    cid = data.get('challengeId') or data.get('challenge_id')
+    order_type = str(data.get('type') or '').upper()
+    if not cid:
+        return jsonify({"error": "MISSING_CHALLENGE_ID"}), 400
+    if order_type not in ORDER_TYPES:
+        return jsonify({"error": "INVALID_ORDER_TYPE", "allowed": list(ORDER_TYPES)}), 400
+    try:
+        trigger_price = float(data.get('triggerPrice') or data.get('price'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "INVALID_TRIGGER_PRICE"}), 400
+    if not (math.isfinite(trigger_price) and trigger_price > 0):
+        return jsonify({"error": "INVALID_TRIGGER_PRICE"}), 400
+
+    if order_type in EXIT_TYPES:
+        order, error = place_order(cid, order_type, trigger_price,
+                                   position_id=data.get('positionId') or data.get('position_id'))
+    else:
+        side = data.get('side')
+        if side not in {"BUY", "SELL"}:
+            return jsonify({"error": "INVALID_TRADE_TYPE"}), 400
+        try:
+            size = float(data.get('size') or data.get('volume'))
+        except (TypeError, ValueError):
+            return jsonify({"error": "INVALID_TRADE_VOLUME"}), 400
+        if not (math.isfinite(size) and size > 0):
+            return jsonify({"error": "INVALID_TRADE_VOLUME"}), 400
+        order, error = place_order(cid, order_type, trigger_price, side=side, symbol=data.get('symbol'), size=size)
+
+    if error == "CHALLENGE_BUSY":
+        response = jsonify({"error": error, "message": "Challenge is busy, retry shortly"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    if error:
+        return jsonify({"error": error}), ORDER_ERROR_STATUS.get(error, 400)
+    return jsonify({"order": order}), 201
+
+@order_bp.route('/api/orders/<oid>', methods=['DELETE', 'OPTIONS'])
+def handle_cancel_order(oid):
+    """Annule un ordre encore en attente."""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'OK'}), 200
+    try:
+        order, error = cancel_order(oid)
+    except Exception as e:
+        current_app.logger.error(f"ORDER_CANCEL_ERROR: {e}")
+        return jsonify({"error": "ORDER_CANCEL_FAILED"}), 500
+    if error:
+        return jsonify({"error": error}), ORDER_ERROR_STATUS.get(error, 400)
+    return jsonify({"order": order})
+
+@order_bp.route('/api/challenges/<cid>/orders', methods=['GET'])
+def get_orders(cid):
+    """Ordres du challenge. Query: ?status=PENDING|FILLED|CANCELLED|REJECTED"""
+    status = request.args.get('status', '').upper() or None
+    if status and status not in ORDER_STATUSES:
+        return jsonify({"error": "INVALID_ORDER_STATUS", "allowed": list(ORDER_STATUSES)}), 400
+    try:
+        return jsonify(list_orders(cid, status))
+    except Exception as e:
+        current_app.logger.error(f"ORDER_HISTORY_ERROR: {e}")
+        return jsonify([]), 200
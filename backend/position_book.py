@@ -0,0 +1,578 @@
+"""
+Positions ouvertes et mark-to-market incrémental.
+
+En TRADE_EXECUTION_MODE=positions, un trade ouvre une position (status
+OPEN, exit_price NULL) au lieu d'être clôturé aussitôt avec un slippage
+simulé ; elle reste ouverte jusqu'à POST /api/trades/<id>/close.
+
+Les positions sont indexées par symbole, en colonnes NumPy (prix
+d'entrée, quantité signée, slot du challenge, dernier PnL latent). Un
+tick ne re-valorise que les positions de son symbole :
+  - PnL latent de chaque ligne = (prix - entrée) * quantité signée ;
+  - l'écart avec le marquage précédent est cumulé par challenge
+    (np.bincount) dans la colonne `unrealized` ;
+  - equity = solde réalisé + PnL latent, passée à evaluate_arrays pour
+    les seuls challenges touchés.
+
+Les cotations publiées par price_service sont fusionnées (dernier prix
+par symbole) et appliquées par lots dans un thread dédié. Un challenge
+qui franchit une règle est repris sous son verrou : evaluate_after_trade
+sur l'état marqué, puis clôture de toutes ses positions au dernier prix.
+
+L'equity marquée vit en mémoire : mark_challenge() l'applique à un état
+de challenge, et elle n'est écrite en base qu'avec le trade, la clôture
+ou le changement de statut suivant. L'index est rechargé depuis les
+trades OPEN au démarrage ; chaque worker ne marque que les positions de
+son propre index.
+
+Exposition et PnL latent n'étant connus que de ce process, le contrôle
+de version de CHALLENGE_STATE_MODE=shared (colonnes de solde) ne peut pas
+les faire respecter entre workers : le mode positions y est refusé, et
+le défaut devient instant.
+"""
+
+import threading
+import time
+
+from backend.challenge_evaluator import STATUS_KEEP, evaluate_after_trade, evaluate_arrays
+from backend.challenge_store import discard_challenge, get_challenge, put_challenge
+from backend.db import get_read_connection, release_thread_connections
+from backend.lock_manager import LockTimeout, challenge_lock
+from backend.trade_persistence import PersistenceBackpressure, TradeRecord, VersionConflict, persist_trades
+from backend.trade_service import close_position
+
+EXECUTION_MODES = ("positions", "instant")
+DEFAULT_MODE = "positions"
+INITIAL_CAPACITY = 1024
+LIQUIDATION_LOCK_TIMEOUT = 2.0
+VERSION_CONFLICT_RETRIES = 5
+
+# Colonnes par challenge (slot) : solde réalisé, PnL latent, notionnel
+# ouvert et paramètres des règles
+CHALLENGE_COLUMNS = ("balance", "unrealized", "exposure", "maxEquity",
+                     "initial", "dailyStart", "maxDaily", "maxTotal", "target")
+
+LOAD_OPEN_SQL = """
+    SELECT t.id, t.challenge_id, t.symbol, t.side, t.entry_price, t.lots, t.opened_at,
+           c.current_balance, c.max_equity, c.initial_balance, c.daily_starting_balance,
+           c.max_daily_loss_limit, c.max_total_loss_limit, c.profit_target
+    FROM trades t JOIN user_challenges c ON c.id = t.challenge_id
+    WHERE t.status = 'OPEN' AND c.status = 'ACTIVE'
+"""
+SELECT_OPEN_SQL = (
+    "SELECT id, challenge_id, symbol, side, entry_price, lots, opened_at "
+    "FROM trades WHERE id = ? AND status = 'OPEN'"
+)
+
+
+def _grow(column, size):
+    import numpy as np
+
+    grown = np.zeros(size, dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
+
+
+class _SymbolPositions:
+    """Positions ouvertes d'un symbole, une ligne par position."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        import numpy as np
+
+        self.ids = []
+        self.rows = {}                              # position id -> ligne
+        self.entry = np.zeros(capacity)
+        self.qty = np.zeros(capacity)               # > 0 long, < 0 short
+        self.slot = np.zeros(capacity, dtype=np.int64)
+        self.upnl = np.zeros(capacity)              # PnL latent au dernier marquage
+        self.last_price = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, pid, slot, entry, qty):
+        n = len(self.ids)
+        if n == len(self.entry):
+            self.entry, self.qty, self.slot, self.upnl = (
+                _grow(c, 2 * n) for c in (self.entry, self.qty, self.slot, self.upnl))
+        self.entry[n], self.qty[n], self.slot[n], self.upnl[n] = entry, qty, slot, 0.0
+        self.ids.append(pid)
+        self.rows[pid] = n
+
+    def get(self, pid):
+        row = self.rows[pid]
+        return int(self.slot[row]), float(self.entry[row]), float(self.qty[row]), float(self.upnl[row])
+
+    def remove(self, pid):
+        """Retire la position (la dernière ligne prend sa place)."""
+        values = self.get(pid)
+        row = self.rows.pop(pid)
+        last = len(self.ids) - 1
+        if row != last:
+            for column in (self.entry, self.qty, self.slot, self.upnl):
+                column[row] = column[last]
+            self.ids[row] = self.ids[last]
+            self.rows[self.ids[row]] = row
+        self.ids.pop()
+        return values
+
+    def mark(self, price):
+        """Re-valorise toutes les lignes ; retourne (slots, écart de PnL latent)."""
+        n = len(self.ids)
+        upnl = (price - self.entry[:n]) * self.qty[:n]
+        delta = upnl - self.upnl[:n]
+        self.upnl[:n] = upnl
+        self.last_price = price
+        return self.slot[:n], delta
+
+
+class PositionBook:
+    """Index des positions ouvertes par symbole et PnL latent par challenge."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        import numpy as np
+
+        self._symbols = {}      # symbol -> _SymbolPositions
+        self._positions = {}    # position id -> trade OPEN
+        self._by_challenge = {} # challenge id -> set(position id)
+        self._slots = {}        # challenge id -> slot
+        self._cids = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._cols = {name: np.zeros(capacity) for name in CHALLENGE_COLUMNS}
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "closed": 0, "batches": 0, "ticks": 0, "marked": 0,
+                       "breaches": 0, "markMs": 0.0, "maxMarkMs": 0.0}
+
+    # -- slots par challenge (appelés sous self._lock) --
+
+    def _slot_for(self, cid):
+        slot = self._slots.get(cid)
+        if slot is not None:
+            return slot
+        if not self._free:
+            size = len(self._cids)
+            self._cols = {name: _grow(column, 2 * size) for name, column in self._cols.items()}
+            self._cids.extend([None] * size)
+            self._free = list(range(2 * size - 1, size - 1, -1))
+        slot = self._free.pop()
+        self._slots[cid] = slot
+        self._cids[slot] = cid
+        return slot
+
+    def _release(self, cid):
+        slot = self._slots.pop(cid)
+        self._cids[slot] = None
+        for column in self._cols.values():
+            column[slot] = 0.0
+        self._free.append(slot)
+
+    def _set_params(self, slot, challenge):
+        c = self._cols
+        c["balance"][slot] = challenge['currentBalance']
+        c["maxEquity"][slot] = max(c["maxEquity"][slot], challenge['maxEquity'])
+        c["initial"][slot] = challenge['initialBalance']
+        c["dailyStart"][slot] = challenge['dailyStartingBalance']
+        c["maxDaily"][slot] = challenge['maxDailyLossLimit']
+        c["maxTotal"][slot] = challenge['maxTotalLossLimit']
+        c["target"][slot] = challenge['profitTarget']
+
+    # -- positions --
+
+    def open(self, trade, challenge):
+        """Ajoute une position OPEN (après acceptation de son écriture)."""
+        cid = challenge['id']
+        qty = trade['size'] if trade['type'] == "BUY" else -trade['size']
+        with self._lock:
+            slot = self._slot_for(cid)
+            self._set_params(slot, challenge)
+            book = self._symbols.get(trade['symbol'])
+            if book is None:
+                book = self._symbols[trade['symbol']] = _SymbolPositions()
+            book.add(trade['id'], slot, trade['entryPrice'], qty)
+            self._cols["exposure"][slot] += trade['entryPrice'] * trade['size']
+            self._positions[trade['id']] = dict(trade)
+            self._by_challenge.setdefault(cid, set()).add(trade['id'])
+            self._stats["opened"] += 1
+
+    def close(self, pid):
+        """Retire une position (après acceptation de l'écriture de sa clôture)."""
+        with self._lock:
+            position = self._positions.pop(pid, None)
+            if position is None:
+                return None
+            slot, entry, qty, upnl = self._symbols[position['symbol']].remove(pid)
+            cid = position['challengeId']
+            pids = self._by_challenge[cid]
+            pids.discard(pid)
+            if pids:
+                self._cols["unrealized"][slot] -= upnl
+                self._cols["exposure"][slot] -= entry * abs(qty)
+            else:
+                # Dernière position : le slot repart de zéro (pas de dérive d'arrondi)
+                del self._by_challenge[cid]
+                self._release(cid)
+            self._stats["closed"] += 1
+            return position
+
+    def _quote(self, pid):
+        # Appelé sous self._lock : (position, dernier prix, PnL latent)
+        position = self._positions[pid]
+        book = self._symbols[position['symbol']]
+        _, entry, _, upnl = book.get(pid)
+        price = book.last_price if book.last_price is not None else entry
+        return dict(position), price, upnl
+
+    def get(self, pid):
+        """(position, dernier prix, PnL latent) ou None."""
+        with self._lock:
+            return self._quote(pid) if pid in self._positions else None
+
+    def positions_of(self, cid):
+        with self._lock:
+            return [self._quote(pid) for pid in sorted(self._by_challenge.get(cid, ()))]
+
+    def has_positions(self, cid):
+        with self._lock:
+            return cid in self._by_challenge
+
+    def challenge_ids(self):
+        with self._lock:
+            return list(self._by_challenge)
+
+    def sync(self, challenge):
+        """Reporte solde et paramètres d'un challenge qui a des positions."""
+        with self._lock:
+            slot = self._slots.get(challenge['id'])
+            if slot is not None:
+                self._set_params(slot, challenge)
+
+    def exposure(self, cid):
+        with self._lock:
+            slot = self._slots.get(cid)
+            return float(self._cols["exposure"][slot]) if slot is not None else 0.0
+
+    def apply(self, challenge):
+        """Equity marquée : solde réalisé + PnL latent (modifie `challenge`)."""
+        with self._lock:
+            slot = self._slots.get(challenge['id'])
+            if slot is None:
+                return challenge
+            unrealized = float(self._cols["unrealized"][slot])
+            max_equity = float(self._cols["maxEquity"][slot])
+        challenge['equity'] = challenge['currentBalance'] + unrealized
+        challenge['maxEquity'] = max(challenge['maxEquity'], max_equity, challenge['equity'])
+        return challenge
+
+    # -- marquage --
+
+    def mark(self, prices):
+        """
+        Re-valorise les positions des symboles de `prices` ; retourne les
+        challenges touchés dont l'equity franchit une règle.
+        """
+        import numpy as np
+
+        started = time.perf_counter()
+        with self._lock:
+            c = self._cols
+            touched = []
+            for symbol, price in prices.items():
+                book = self._symbols.get(symbol)
+                if book is None:
+                    continue
+                slots, delta = book.mark(price)
+                if len(slots):
+                    c["unrealized"] += np.bincount(slots, weights=delta, minlength=len(c["unrealized"]))
+                    touched.append(slots)
+            breached = []
+            marked = 0
+            if touched:
+                slots = np.unique(np.concatenate(touched))
+                marked = sum(len(t) for t in touched)
+                equity = c["balance"][slots] + c["unrealized"][slots]
+                c["maxEquity"][slots] = np.maximum(c["maxEquity"][slots], equity)
+                codes = evaluate_arrays(equity, c["initial"][slots], c["dailyStart"][slots],
+                                        c["maxDaily"][slots], c["maxTotal"][slots], c["target"][slots])
+                breached = [self._cids[s] for s in slots[codes != STATUS_KEEP]]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._stats["batches"] += 1
+            self._stats["ticks"] += len(prices)
+            self._stats["marked"] += marked
+            self._stats["breaches"] += len(breached)
+            self._stats["markMs"] += elapsed_ms
+            self._stats["maxMarkMs"] = max(self._stats["maxMarkMs"], elapsed_ms)
+        return breached
+
+    def load(self, rows):
+        """Recharge les positions OPEN (lignes de LOAD_OPEN_SQL) ; retourne leur nombre."""
+        count = 0
+        for row in rows:
+            trade = _position_from_row(row)
+            challenge = {
+                "id": row["challenge_id"], "currentBalance": row["current_balance"],
+                "maxEquity": row["max_equity"], "initialBalance": row["initial_balance"],
+                "dailyStartingBalance": row["daily_starting_balance"],
+                "maxDailyLossLimit": row["max_daily_loss_limit"],
+                "maxTotalLossLimit": row["max_total_loss_limit"], "profitTarget": row["profit_target"],
+            }
+            self.open(trade, challenge)
+            count += 1
+        return count
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(
+                open=len(self._positions),
+                challenges=len(self._slots),
+                symbols={s: len(b) for s, b in self._symbols.items() if len(b)},
+            )
+        batches = stats["batches"]
+        stats["avgMarkMs"] = round(stats["markMs"] / batches, 3) if batches else 0
+        stats["markMs"] = round(stats["markMs"], 3)
+        stats["maxMarkMs"] = round(stats["maxMarkMs"], 3)
+        return stats
+
+
+def _position_from_row(row):
+    return {
+        "id": row["id"], "challengeId": row["challenge_id"], "symbol": row["symbol"],
+        "type": row["side"], "entryPrice": row["entry_price"], "exitPrice": None,
+        "size": row["lots"], "pnl": 0.0, "status": "OPEN", "openedAt": row["opened_at"],
+        "closedAt": None,
+    }
+
+
+class MarkToMarketEngine(threading.Thread):
+    """
+    Applique par lots les derniers prix publiés à l'index du module, puis
+    traite les franchissements (rien à marquer tant qu'il n'existe pas).
+    """
+
+    def __init__(self):
+        super().__init__(name="mark-to-market", daemon=True)
+        self._pending = {}      # symbol -> dernier prix non appliqué
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def on_quote(self, symbol, quote):
+        """Listener price_service : ne garde que le dernier prix par symbole."""
+        price = quote.get("price")
+        if not price:
+            return
+        with self._cond:
+            self._pending[symbol] = float(price)
+            self._cond.notify()
+
+    def run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    prices, self._pending = self._pending, {}
+                book = _book
+                if book is None:
+                    continue
+                try:
+                    for cid in book.mark(prices):
+                        liquidate_challenge(cid)
+                except Exception as e:
+                    print(f"[MTM_ERROR] {e}")
+        finally:
+            release_thread_connections()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+# Créé à la première position : ni l'import du module ni le démarrage sans
+# position ouverte n'importent numpy ; les lectures sans index sont vides
+_book = None
+_book_lock = threading.Lock()
+_engine = None
+_mode = DEFAULT_MODE
+
+
+def _get_book():
+    global _book
+    if _book is None:
+        with _book_lock:
+            if _book is None:
+                _book = PositionBook()
+    return _book
+
+
+def start_position_engine(config):
+    """
+    Lit TRADE_EXECUTION_MODE (défaut : positions, instant en
+    CHALLENGE_STATE_MODE=shared) ; en mode positions, recharge l'index
+    depuis la base et démarre le marquage sur les cotations publiées.
+    """
+    global _book, _engine, _mode
+    from backend import price_service
+
+    shared = str(config.get("CHALLENGE_STATE_MODE", "process")).lower() == "shared"
+    mode = str(config.get("TRADE_EXECUTION_MODE") or ("instant" if shared else DEFAULT_MODE)).lower()
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"TRADE_EXECUTION_MODE invalide : {mode}")
+    if mode == "positions" and shared:
+        raise ValueError("TRADE_EXECUTION_MODE=positions incompatible avec CHALLENGE_STATE_MODE=shared : "
+                         "exposition et PnL latent ne sont connus que du process")
+    _mode = mode
+    if mode != "positions" or _engine is not None:
+        return _engine
+    # Index (et numpy) créé seulement s'il y a des positions à recharger
+    _book = None
+    try:
+        rows = get_read_connection().execute(LOAD_OPEN_SQL).fetchall()
+        loaded = _get_book().load(rows) if rows else 0
+        print(f"[POSITIONS] {loaded} position(s) ouverte(s) rechargée(s)")
+    except Exception as e:
+        print(f"[POSITIONS] rechargement impossible : {e}")
+    finally:
+        release_thread_connections()
+    _engine = MarkToMarketEngine()
+    _engine.start()
+    price_service.add_quote_listener(_engine.on_quote)
+    return _engine
+
+
+def stop_position_engine(timeout=2.0):
+    global _engine
+    from backend import price_service
+
+    engine, _engine = _engine, None
+    if engine is not None:
+        price_service.remove_quote_listener(engine.on_quote)
+        engine.stop()
+        engine.join(timeout)
+
+
+def holds_positions():
+    """True si les trades ouvrent des positions (TRADE_EXECUTION_MODE=positions)."""
+    return _mode == "positions"
+
+
+def mark_challenge(challenge):
+    """Applique le PnL latent des positions ouvertes à l'état `challenge`."""
+    return _book.apply(challenge) if _book is not None else challenge
+
+
+def open_exposure(cid):
+    """Notionnel (prix d'entrée x taille) des positions ouvertes du challenge."""
+    return _book.exposure(cid) if _book is not None else 0.0
+
+
+def has_open_positions(cid):
+    return _book is not None and _book.has_positions(cid)
+
+
+def challenges_with_positions():
+    return _book.challenge_ids() if _book is not None else []
+
+
+def sync_challenge(challenge):
+    """Reporte solde et paramètres des règles (ex: nouveau départ journalier)."""
+    if _book is not None:
+        _book.sync(challenge)
+
+
+def track_trade(trade, challenge):
+    """Indexe un trade OPEN accepté en écriture ; reporte l'état du challenge."""
+    if trade.get('status') == "OPEN":
+        _get_book().open(trade, challenge)
+    else:
+        sync_challenge(challenge)
+
+
+def find_position(pid):
+    """
+    (position, dernier prix, PnL latent) d'une position ouverte, ou None.
+    Hors de l'index (ouverte par un autre worker) : relue en base, non marquée.
+    """
+    found = _book.get(pid) if _book is not None else None
+    if found is not None:
+        return found
+    row = get_read_connection().execute(SELECT_OPEN_SQL, (pid,)).fetchone()
+    return (_position_from_row(row), None, 0.0) if row else None
+
+
+def release_position(pid, challenge):
+    """Retire une position clôturée (écriture acceptée) et reporte le nouveau solde."""
+    if _book is not None:
+        _book.close(pid)
+        _book.sync(challenge)
+
+
+def list_positions(cid):
+    """Positions ouvertes du challenge avec dernier prix et PnL latent."""
+    if _book is None:
+        return []
+    return [
+        dict(position, markPrice=price, unrealizedPnl=upnl)
+        for position, price, upnl in _book.positions_of(cid)
+    ]
+
+
+def liquidate_challenge(cid, lock_timeout=LIQUIDATION_LOCK_TIMEOUT):
+    """
+    Reprend un challenge signalé par le marquage : evaluate_after_trade sur
+    l'état marqué ; s'il n'est plus ACTIVE, toutes ses positions sont
+    clôturées au dernier prix. Retourne le nouveau statut, ou None.
+    """
+    book = _get_book()
+    record = None
+    try:
+        with challenge_lock(cid, timeout=lock_timeout):
+            for _ in range(VERSION_CONFLICT_RETRIES):
+                challenge = get_challenge(cid)
+                if challenge is None:
+                    return None
+                state = book.apply(dict(challenge))
+                if state['status'] == "ACTIVE":
+                    state = evaluate_after_trade(state)
+                    if state['status'] == "ACTIVE":
+                        # Revenu sous les seuils depuis le marquage
+                        return None
+                closing = book.positions_of(cid)
+                records = []
+                for position, price, upnl in closing:
+                    trade, state = close_position(state, position, price, upnl)
+                    records.append(TradeRecord(state, trade, challenge.get('userId')))
+                if not records:
+                    put_challenge(state, persist=True)
+                    return state['status']
+                try:
+                    persist_trades(records)
+                except VersionConflict:
+                    discard_challenge(cid)
+                    continue
+                except PersistenceBackpressure:
+                    # Toujours franchi au prochain tick : nouvel essai
+                    return None
+                for position, _, _ in closing:
+                    book.close(position['id'])
+                put_challenge(state, pending=records[-1])
+                record = records[-1]
+                break
+            else:
+                return None
+    except LockTimeout:
+        return None
+
+    try:
+        record.wait()
+    except Exception as e:
+        print(f"[MTM_LIQUIDATION_ERROR] {cid}: {e}")
+    print(f"[MTM] {cid} {state['status']} : {len(closing)} position(s) clôturée(s)")
+    return state['status']
+
+
+def get_position_stats():
+    stats = _book.get_stats() if _book is not None else {"open": 0, "challenges": 0}
+    return dict(stats, mode=_mode, engine=_engine is not None and _engine.is_alive())
@@ -1,10 +1,456 @@
-from backend.market_data_yahoo import get_yahoo_price
-from backend.market_data_maroc import get_maroc_price
+"""
+Service de prix unifié : cache de cotations partagé par tout le process.
 
-def get_live_price(symbol: str) -> float:
+Tous les appelants (route /api/price, exécution des trades, polling du
+Conseiller IA) passent par get_quote() afin que N requêtes simultanées
+sur le même symbole ne déclenchent qu'un seul appel upstream.
+
+Quand le poller de fond (market_poller) rafraîchit un symbole, les
+requêtes ne font plus que lire le dernier snapshot : aucun appel upstream
+n'a lieu dans le thread de la requête.
+
+Chaque appel upstream passe par le disjoncteur de sa source. Seuls les
+symboles de TRADABLE_SYMBOLS sont demandés upstream : un symbole inconnu
+(routes publiques) n'alimente jamais la fenêtre d'erreurs d'un
+disjoncteur partagé par les symboles tradables. Quand une source est
+indisponible (disjoncteur ouvert ou appel en échec), le
+dernier prix réel connu est servi immédiatement, marqué `stale: True`,
+et une seule sonde de fond revalide la source.
+"""
+
+import threading
+import time
+
+from backend.circuit_breaker import CircuitOpenError, get_breaker
+from backend.market_data_async import get_async_fetcher
+from backend.market_data_yahoo import fetch_yahoo_price, fetch_yahoo_prices, get_yahoo_simulated_price
+from backend.market_data_maroc import fetch_maroc_price, fetch_maroc_prices, get_maroc_simulated_price
+
+YAHOO_SYMBOLS = {"BTC", "ETH", "BTC-USD", "ETH-USD", "AAPL", "TSLA"}
+MAROC_SYMBOLS = {"IAM", "ATW"}
+TRADABLE_SYMBOLS = YAHOO_SYMBOLS | MAROC_SYMBOLS
+
+# Durée de vie (secondes) d'une cotation en cache, par symbole
+QUOTE_TTLS = {
+    "BTC": 1.0,
+    "ETH": 1.0,
+    "BTC-USD": 1.0,
+    "ETH-USD": 1.0,
+    "AAPL": 2.0,
+    "TSLA": 2.0,
+    "IAM": 15.0,
+    "ATW": 15.0,
+}
+DEFAULT_QUOTE_TTL = 2.0
+
+# Âge maximum accepté pour un prix servant à exécuter un trade
+MAX_TRADE_STALENESS = 2.0
+# Pour un symbole rafraîchi en fond : nombre d'intervalles de polling
+# manqués au-delà duquel le snapshot est jugé trop vieux pour trader
+STALE_POLL_INTERVALS = 3
+
+# Temps max d'attente d'un appel upstream déjà en cours (single-flight)
+INFLIGHT_WAIT_TIMEOUT = 10.0
+
+# Nombre max de symboles par requête groupée
+MAX_BATCH_SYMBOLS = 50
+
+# Adaptateurs upstream par source : (unitaire, groupé, simulation)
+UPSTREAMS = {
+    "yahoo": (fetch_yahoo_price, fetch_yahoo_prices, get_yahoo_simulated_price),
+    "maroc": (fetch_maroc_price, fetch_maroc_prices, get_maroc_simulated_price),
+}
+
+_quotes = {}     # symbol -> {"quote": dict, "fetchedAt": float}
+_last_good = {}  # symbol -> dernière cotation réelle (hors simulation)
+_inflight = {}   # symbol -> _Flight
+_polled = {}     # symbol -> intervalle de rafraîchissement du poller (s)
+_listeners = []  # callbacks(symbol, quote) appelés à chaque cotation fraîche
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "stale": 0, "simulated": 0}
+
+
+class _Flight:
+    """Appel upstream en cours, partagé par toutes les requêtes concurrentes."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.quote = None
+
+
+def get_source(symbol):
+    """Retourne la source upstream ('maroc' ou 'yahoo') d'un symbole."""
+    return "maroc" if symbol.upper() in MAROC_SYMBOLS else "yahoo"
+
+
+def get_ttl(symbol):
+    return QUOTE_TTLS.get(symbol.upper(), DEFAULT_QUOTE_TTL)
+
+
+def _probe(source, symbols):
+    """Sonde half-open : un appel groupé dont le succès referme le disjoncteur."""
+    try:
+        fetched = get_breaker(source).probe(UPSTREAMS[source][1], symbols)
+    except Exception as e:
+        print(f"[PRICE_PROBE_FAILED] {source}: {e}")
+        return
+    for symbol, quote in fetched.items():
+        if isinstance(quote, dict) and quote.get("price"):
+            store_quote(symbol, quote)
+
+
+def _start_probe_if_due(source, symbols):
+    """
+    Si le délai d'ouverture du disjoncteur est écoulé, lance la sonde de
+    fond (une seule à la fois) ; l'appelant n'attend jamais la sonde.
+    """
+    if get_breaker(source).acquire_probe():
+        threading.Thread(target=_probe, args=(source, list(symbols)),
+                         name=f"price-probe-{source}", daemon=True).start()
+
+
+def _call_upstream(source, batch, arg):
+    """Appel upstream via le disjoncteur de la source."""
+    breaker = get_breaker(source)
+    _start_probe_if_due(source, arg if batch else [arg])
+    return breaker.call(UPSTREAMS[source][1 if batch else 0], arg)
+
+
+def fetch_quote(symbol):
+    """
+    Appel upstream brut (hors cache). Retourne None si le symbole n'est
+    pas tradable, si la source n'a pas renvoyé de prix exploitable ou si
+    son disjoncteur est ouvert.
+    """
     s = symbol.upper()
-    if s in ["IAM", "ATW"]:
-        data = get_maroc_price(s)
-        return float(data.get("price", 0) or 0)
-    data = get_yahoo_price(s)
-    return float(data.get("price", 0) or 0)
+    if s not in TRADABLE_SYMBOLS:
+        return None
+    try:
+        quote = _call_upstream(get_source(s), False, s)
+    except CircuitOpenError:
+        return None
+    except Exception as e:
+        print(f"[PRICE_FETCH_ERROR] {s}: {e}")
+        return None
+    if not (isinstance(quote, dict) and quote.get("price")):
+        return None
+    return quote
+
+
+def fetch_quotes(symbols):
+    """
+    Appel upstream groupé : un seul appel par source (yf.download pour
+    Yahoo, une requête par page LeBoursier), ou toutes les requêtes en
+    parallèle via le fetcher asyncio s'il est configuré.
+
+    Returns:
+        dict symbol -> cotation (les symboles en échec ou inconnus sont absents)
+    """
+    by_source = {}
+    for symbol in dict.fromkeys(sym.upper() for sym in symbols):
+        if symbol not in TRADABLE_SYMBOLS:
+            continue
+        by_source.setdefault(get_source(symbol), []).append(symbol)
+
+    fetcher = get_async_fetcher()
+    if fetcher is not None:
+        return _fetch_quotes_async(fetcher, by_source)
+
+    quotes = {}
+    for source, group in by_source.items():
+        try:
+            fetched = _call_upstream(source, True, group)
+        except CircuitOpenError:
+            continue
+        except Exception as e:
+            print(f"[PRICE_FETCH_ERROR] {source} {group}: {e}")
+            continue
+        for symbol, quote in fetched.items():
+            if isinstance(quote, dict) and quote.get("price"):
+                quotes[symbol] = quote
+    return quotes
+
+
+def _fetch_quotes_async(fetcher, by_source):
+    """
+    Toutes les sources dont le disjoncteur est fermé sont interrogées en
+    un seul aller-retour concurrent ; chaque disjoncteur reçoit le
+    résultat de sa source (succès si au moins une requête a abouti).
+    """
+    allowed = {}
+    for source, group in by_source.items():
+        _start_probe_if_due(source, group)
+        if get_breaker(source).allow():
+            allowed[source] = group
+    if not allowed:
+        return {}
+
+    started = time.perf_counter()
+    try:
+        fetched, report = fetcher.fetch(allowed)
+    except Exception as e:
+        print(f"[PRICE_FETCH_ERROR] async {sorted(allowed)}: {e}")
+        elapsed = time.perf_counter() - started
+        for source in allowed:
+            get_breaker(source).record(False, elapsed)
+        return {}
+
+    for source, outcome in report.items():
+        get_breaker(source).record(outcome["ok"] > 0, outcome["elapsed"])
+    return {s: q for s, q in fetched.items() if isinstance(q, dict) and q.get("price")}
+
+
+def fallback_quote(symbol):
+    """
+    Cotation de repli quand la source est indisponible : dernier prix réel
+    marqué `stale: True` (non republié), sinon une cotation simulée,
+    publiée pour la continuité des charts.
+    """
+    s = symbol.upper()
+    with _lock:
+        good = _last_good.get(s)
+        _stats["stale" if good else "simulated"] += 1
+    if good:
+        return dict(good, stale=True)
+    return store_quote(s, UPSTREAMS[get_source(s)][2](s))
+
+
+def store_quote(symbol, quote):
+    """
+    Publie une cotation fraîche dans le cache (utilisé par le poller) et
+    la diffuse aux listeners abonnés (flux SSE, ...). Seuls les symboles
+    tradables sont mis en cache : le cache reste borné.
+    """
+    s = symbol.upper()
+    now = time.time()
+    quote = dict(quote, fetchedAt=round(now, 3))
+    if s not in TRADABLE_SYMBOLS:
+        return quote
+    with _lock:
+        _quotes[s] = {"quote": quote, "fetchedAt": now}
+        if "SIMULATION" not in str(quote.get("source", "")):
+            _last_good[s] = quote
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(s, quote)
+        except Exception as e:
+            print(f"[QUOTE_LISTENER_ERROR] {s}: {e}")
+    return quote
+
+
+def add_quote_listener(listener):
+    """Abonne `listener(symbol, quote)` à chaque cotation fraîche."""
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def remove_quote_listener(listener):
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def peek_quote(symbol):
+    """Dernière cotation en cache, sans jamais appeler l'upstream."""
+    with _lock:
+        entry = _quotes.get(symbol.upper())
+        return dict(entry["quote"]) if entry else None
+
+
+def register_polled_symbols(symbols, interval):
+    """Déclare des symboles rafraîchis en fond toutes les `interval` s."""
+    with _lock:
+        for symbol in symbols:
+            _polled[symbol.upper()] = float(interval)
+
+
+def unregister_polled_symbols(symbols=None):
+    with _lock:
+        if symbols is None:
+            _polled.clear()
+        for symbol in symbols or ():
+            _polled.pop(symbol.upper(), None)
+
+
+def get_max_trade_staleness(symbol):
+    """Âge maximum (s) d'un prix utilisable pour exécuter un trade."""
+    interval = _polled.get(symbol.upper())
+    if interval is None:
+        return MAX_TRADE_STALENESS
+    return max(MAX_TRADE_STALENESS, STALE_POLL_INTERVALS * interval)
+
+
+def quote_age(quote):
+    """Âge (s) d'une cotation issue du cache, d'après son fetchedAt."""
+    return max(0.0, time.time() - quote.get("fetchedAt", 0))
+
+
+def _snapshot(symbol, entry):
+    """Copie d'une entrée du cache, marquée stale si sa source est coupée."""
+    quote = dict(entry["quote"])
+    if not get_breaker(get_source(symbol)).is_closed:
+        quote["stale"] = True
+    return quote
+
+
+def get_quote(symbol, max_age=None):
+    """
+    Retourne la cotation d'un symbole depuis le cache si elle a moins de
+    `max_age` secondes (TTL du symbole par défaut), sinon la récupère
+    upstream. Les miss concurrents sur un même symbole sont fusionnés en un
+    seul appel.
+
+    Pour un symbole rafraîchi par le poller, le dernier snapshot est
+    toujours servi tel quel (son âge est lisible via `fetchedAt`), marqué
+    `stale` si le disjoncteur de sa source n'est pas fermé.
+
+    Si la source échoue, la cotation de repli est servie (voir
+    fallback_quote).
+
+    Returns:
+        dict de cotation (copie), None pour un symbole non tradable
+    """
+    s = symbol.upper()
+    if s not in TRADABLE_SYMBOLS:
+        return None
+    ttl = get_ttl(s)
+    max_age = ttl if max_age is None else min(max_age, ttl)
+
+    with _lock:
+        entry = _quotes.get(s)
+        if entry and (s in _polled or time.time() - entry["fetchedAt"] <= max_age):
+            _stats["hits"] += 1
+            return _snapshot(s, entry)
+        flight = _inflight.get(s)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _inflight[s] = flight
+            _stats["misses"] += 1
+        else:
+            _stats["coalesced"] += 1
+
+    if not leader:
+        flight.done.wait(INFLIGHT_WAIT_TIMEOUT)
+        return dict(flight.quote) if flight.quote else fallback_quote(s)
+
+    quote = None
+    try:
+        quote = fetch_quote(s)
+        if quote:
+            quote = store_quote(s, quote)
+    finally:
+        with _lock:
+            if not quote:
+                _stats["errors"] += 1
+            _inflight.pop(s, None)
+        if not quote:
+            quote = fallback_quote(s)
+        flight.quote = quote
+        flight.done.set()
+
+    return dict(quote)
+
+
+def get_quotes(symbols, max_age=None):
+    """
+    Version groupée de get_quote() : les hits sont servis depuis le cache,
+    les miss sont récupérés en un seul appel upstream par source. Les
+    symboles déjà en cours de récupération par une autre requête sont
+    attendus plutôt que re-demandés.
+
+    Returns:
+        dict symbol -> cotation (copie), de repli pour les symboles en échec ;
+        les symboles non tradables sont absents
+    """
+    result = {}
+    led, waiting = [], {}
+    now = time.time()
+
+    with _lock:
+        for s in dict.fromkeys(sym.upper() for sym in symbols):
+            if s not in TRADABLE_SYMBOLS:
+                continue
+            ttl = get_ttl(s)
+            age_limit = ttl if max_age is None else min(max_age, ttl)
+            entry = _quotes.get(s)
+            if entry and (s in _polled or now - entry["fetchedAt"] <= age_limit):
+                _stats["hits"] += 1
+                result[s] = _snapshot(s, entry)
+                continue
+            flight = _inflight.get(s)
+            if flight is None:
+                _inflight[s] = _Flight()
+                _stats["misses"] += 1
+                led.append(s)
+            else:
+                _stats["coalesced"] += 1
+                waiting[s] = flight
+
+    if led:
+        fetched = {}
+        try:
+            fetched = fetch_quotes(led)
+        finally:
+            for s in led:
+                quote = store_quote(s, fetched[s]) if s in fetched else None
+                with _lock:
+                    if not quote:
+                        _stats["errors"] += 1
+                    flight = _inflight.pop(s, None)
+                if not quote:
+                    quote = fallback_quote(s)
+                if flight:
+                    flight.quote = quote
+                    flight.done.set()
+                result[s] = dict(quote)
+
+    for s, flight in waiting.items():
+        flight.done.wait(INFLIGHT_WAIT_TIMEOUT)
+        result[s] = dict(flight.quote) if flight.quote else fallback_quote(s)
+
+    return result
+
+
+def get_trade_quote(symbol):
+    """
+    Cotation d'exécution d'un trade.
+
+    Returns:
+        (quote, None) ou (None, "MARKET_PRICE_UNAVAILABLE" | "MARKET_PRICE_STALE")
+    """
+    quote = get_quote(symbol, max_age=MAX_TRADE_STALENESS)
+    if not quote or not quote.get("price"):
+        return None, "MARKET_PRICE_UNAVAILABLE"
+    if quote.get("stale") or quote_age(quote) > get_max_trade_staleness(symbol):
+        return None, "MARKET_PRICE_STALE"
+    return quote, None
+
+
+def get_trade_price(symbol):
+    """Prix d'exécution, 0 si indisponible ou trop vieux."""
+    quote, _ = get_trade_quote(symbol)
+    if not quote:
+        return 0
+    return float(quote.get("price", 0) or 0)
+
+
+def get_live_price(symbol: str) -> float:
+    quote = get_quote(symbol)
+    if not quote:
+        return 0
+    return float(quote.get("price", 0) or 0)
+
+
+def get_cache_stats():
+    """Compteurs du cache (hits / misses / coalesced / errors)."""
+    with _lock:
+        stats = dict(_stats)
+        stats["cachedSymbols"] = len(_quotes)
+        stats["inflight"] = len(_inflight)
+        stats["polledSymbols"] = len(_polled)
+    lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+    stats["hitRatio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,232 @@
+"""
+Diffusion des cotations en Server-Sent Events.
+
+Une seule source de ticks (les cotations publiées par price_service) est
+diffusée à tous les clients abonnés. Chaque client a une file bornée qui
+ne garde que le dernier tick non lu par symbole : un client lent saute
+les ticks périmés au lieu d'accumuler du retard. Un historique court des
+derniers événements permet de reprendre un flux via Last-Event-ID.
+
+Deux façons de servir un flux :
+  - stream_quotes : générateur de la route Flask, qui attend sur un
+    threading.Condition dans le thread de sa requête (un thread par
+    flux ouvert sous le serveur threadé) ;
+  - price_stream_server : serveur asyncio (PRICE_STREAM_PORT) qui
+    multiplexe tous les flux sur une seule boucle ; la route Flask y
+    redirige quand il tourne.
+"""
+
+import itertools
+import json
+import threading
+from collections import OrderedDict, deque
+
+from backend import price_service
+
+STREAM_HEARTBEAT_INTERVAL = 15.0   # secondes sans tick avant un commentaire keep-alive
+STREAM_REPLAY_SIZE = 1024          # événements conservés pour Last-Event-ID
+STREAM_RETRY_MS = 3000             # délai de reconnexion suggéré au navigateur
+MAX_STREAM_SYMBOLS = 20
+
+
+class StreamSubscriber:
+    """File bornée d'un client : au plus un tick en attente par symbole."""
+
+    def __init__(self, symbols):
+        self.symbols = frozenset(symbols)
+        self.pending = OrderedDict()   # symbol -> (seq, quote)
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def push(self, seq, symbol, quote):
+        with self.cond:
+            if symbol in self.pending:
+                # Le tick précédent n'a pas été lu : il est périmé
+                self.dropped += 1
+                del self.pending[symbol]
+            self.pending[symbol] = (seq, quote)
+            self.cond.notify()
+
+    def pop_all(self, timeout):
+        """Attend au plus `timeout` s et retourne les ticks en attente."""
+        with self.cond:
+            if not self.pending and not self.closed:
+                self.cond.wait(timeout)
+            events = [(seq, symbol, quote) for symbol, (seq, quote) in self.pending.items()]
+            self.pending.clear()
+        events.sort()
+        return events
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+
+class PriceStreamHub:
+    """Répartit chaque tick vers les abonnés du symbole concerné."""
+
+    def __init__(self, replay_size=STREAM_REPLAY_SIZE):
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._history = deque(maxlen=replay_size)   # (seq, symbol, quote)
+        self._subscribers = {}                      # symbol -> set(StreamSubscriber)
+        self._listeners = []                        # fn(seq, symbol, quote), tous symboles
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def publish(self, symbol, quote):
+        with self._lock:
+            seq = next(self._seq)
+            self._last_seq = seq
+            self._history.append((seq, symbol, quote))
+            targets = list(self._subscribers.get(symbol, ()))
+            self.stats["published"] += 1
+            self.stats["delivered"] += len(targets)
+            listeners = list(self._listeners)
+        for sub in targets:
+            sub.push(seq, symbol, quote)
+        for listener in listeners:
+            listener(seq, symbol, quote)
+
+    def add_listener(self, listener):
+        """Reçoit chaque tick numéroté (serveur asyncio : un seul saut de thread par tick)."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def subscribe(self, symbols):
+        sub = StreamSubscriber(symbols)
+        with self._lock:
+            for symbol in sub.symbols:
+                self._subscribers.setdefault(symbol, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.close()
+        with self._lock:
+            self.stats["dropped"] += sub.dropped
+            for symbol in sub.symbols:
+                subs = self._subscribers.get(symbol)
+                if subs:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[symbol]
+
+    def replay_since(self, last_event_id, symbols):
+        """
+        Événements postérieurs à `last_event_id` pour ces symboles, ou None
+        si l'historique ne remonte plus assez loin ou si l'id vient d'une
+        numérotation antérieure (redémarrage) : reprise impossible.
+        """
+        with self._lock:
+            history = list(self._history)
+            last_seq = self._last_seq
+        if last_event_id > last_seq:
+            return None
+        if history and history[0][0] > last_event_id + 1:
+            return None
+        return [e for e in history if e[0] > last_event_id and e[1] in symbols]
+
+    def last_seq(self):
+        with self._lock:
+            return self._last_seq
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            subs = set()
+            for group in self._subscribers.values():
+                subs.update(group)
+            stats["clients"] = len(subs)
+            stats["dropped"] += sum(s.dropped for s in subs)
+            stats["lastEventId"] = self._last_seq
+        return stats
+
+
+hub = PriceStreamHub()
+price_service.add_quote_listener(hub.publish)
+
+
+def format_event(seq, quote):
+    return f"id: {seq}\nevent: quote\ndata: {json.dumps(quote)}\n\n"
+
+
+def parse_stream_request(args, headers):
+    """
+    Symboles et Last-Event-ID d'une requête de flux (query + en-têtes).
+
+    Returns:
+        (symboles, last_event_id, None) ou (None, None, corps d'erreur 400)
+    """
+    symbols = [s.strip().upper() for s in (args.get('symbols') or '').split(',') if s.strip()]
+    if not symbols:
+        return None, None, {"error": "MISSING_SYMBOLS"}
+    if len(symbols) > MAX_STREAM_SYMBOLS:
+        return None, None, {"error": "TOO_MANY_SYMBOLS", "max": MAX_STREAM_SYMBOLS}
+    unknown = [s for s in symbols if s not in price_service.TRADABLE_SYMBOLS]
+    if unknown:
+        return None, None, {"error": "UNKNOWN_SYMBOLS", "symbols": unknown}
+
+    last_event_id = headers.get('Last-Event-ID') or args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    return frozenset(symbols), last_event_id, None
+
+
+def initial_events(symbols, last_event_id):
+    """
+    Début d'un flux : reprise depuis Last-Event-ID si l'historique le
+    permet, sinon snapshot de la dernière cotation de chaque symbole.
+    À appeler après l'abonnement (aucun tick perdu entre les deux).
+
+    Returns:
+        ([(seq, quote)], dernier seq envoyé)
+    """
+    replay = hub.replay_since(last_event_id, symbols) if last_event_id is not None else None
+    if replay is not None:
+        events = [(seq, quote) for seq, _, quote in replay]
+        return events, events[-1][0] if events else last_event_id
+    sent = hub.last_seq()
+    events = []
+    for symbol in sorted(symbols):
+        quote = price_service.peek_quote(symbol)
+        if quote:
+            events.append((sent, quote))
+    return events, sent
+
+
+def stream_quotes(symbols, last_event_id=None, heartbeat=STREAM_HEARTBEAT_INTERVAL):
+    """
+    Générateur SSE : reprise (Last-Event-ID) ou snapshot initial, puis
+    ticks en direct et heartbeats.
+    """
+    symbols = frozenset(symbols)
+    sub = hub.subscribe(symbols)
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+
+        events, sent = initial_events(symbols, last_event_id)
+        for seq, quote in events:
+            yield format_event(seq, quote)
+
+        while not sub.closed:
+            events = sub.pop_all(heartbeat)
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+            for seq, _, quote in events:
+                # Déjà envoyé pendant la reprise
+                if seq <= sent:
+                    continue
+                sent = seq
+                yield format_event(seq, quote)
+    finally:
+        hub.unsubscribe(sub)
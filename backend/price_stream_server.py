@@ -0,0 +1,265 @@
+"""
+Serveur SSE asyncio des cotations : tous les flux sur une seule boucle.
+
+Sous le serveur threadé de Flask, chaque flux /api/price/stream ouvert
+occupe un thread de requête. Avec PRICE_STREAM_PORT, un serveur aiohttp
+tourne dans un thread de fond et sert ces flux : un client inactif ne
+coûte qu'une coroutine et un socket. La route Flask redirige (307) vers
+ce serveur, ou le frontend s'y connecte directement (VITE_STREAM_URL).
+
+Les ticks du hub arrivent par un seul listener : un call_soon_threadsafe
+par tick, la répartition vers les clients se fait dans la boucle. Mêmes
+règles que le flux Flask : au plus un tick en attente par symbole et par
+client, reprise via Last-Event-ID.
+
+aiohttp n'est importé qu'au démarrage du serveur (dépendance optionnelle).
+"""
+
+import asyncio
+import importlib.util
+import threading
+from collections import OrderedDict
+
+from backend.price_stream import (STREAM_HEARTBEAT_INTERVAL, STREAM_RETRY_MS, format_event, hub,
+                                  initial_events, parse_stream_request)
+
+STREAM_PATH = "/api/price/stream"
+DEFAULT_MAX_CLIENTS = 10000
+START_TIMEOUT = 5.0
+STOP_TIMEOUT = 5.0
+
+HAS_AIOHTTP = importlib.util.find_spec("aiohttp") is not None
+
+STREAM_HEADERS = {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+    'Access-Control-Allow-Origin': '*',
+}
+
+
+class AsyncStreamClient:
+    """Ticks en attente d'un client, manipulés dans la boucle uniquement."""
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.pending = OrderedDict()   # symbol -> (seq, quote)
+        self.dropped = 0
+        self.wakeup = asyncio.Event()
+
+    def push(self, seq, symbol, quote):
+        if symbol in self.pending:
+            # Le tick précédent n'a pas été écrit : il est périmé
+            self.dropped += 1
+            del self.pending[symbol]
+        self.pending[symbol] = (seq, quote)
+        self.wakeup.set()
+
+    def pop_all(self):
+        events = sorted((seq, symbol, quote) for symbol, (seq, quote) in self.pending.items())
+        self.pending.clear()
+        self.wakeup.clear()
+        return events
+
+
+class PriceStreamServer:
+    """Serveur aiohttp dans un thread de fond, boucle dédiée."""
+
+    def __init__(self, host, port, max_clients=DEFAULT_MAX_CLIENTS, heartbeat=STREAM_HEARTBEAT_INTERVAL):
+        self.host = host
+        self.port = int(port)
+        self.max_clients = int(max_clients)
+        self.heartbeat = float(heartbeat)
+        self.loop = asyncio.new_event_loop()
+        self._clients = {}   # symbol -> set(AsyncStreamClient)
+        self._count = 0
+        self._closing = False
+        self._runner = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="price-stream-server", daemon=True)
+        self.stats = {"connections": 0, "rejected": 0, "published": 0, "delivered": 0, "dropped": 0}
+
+    def start(self, timeout=START_TIMEOUT):
+        """Démarre la boucle et attend l'ouverture du port (erreur de bind propagée)."""
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError(f"price stream server not started within {timeout}s")
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._listen())
+        except Exception as e:
+            self._error = e
+            if self._runner is not None:
+                self.loop.run_until_complete(self._runner.cleanup())
+            self.loop.close()
+            self._ready.set()
+            return
+        hub.add_listener(self._on_publish)
+        self._ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _listen(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get(STREAM_PATH, self._handle)
+        self._runner = web.AppRunner(app, access_log=None, handler_cancellation=True)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, shutdown_timeout=1.0, backlog=1024)
+        await site.start()
+
+    def _on_publish(self, seq, symbol, quote):
+        # Thread du publieur (poller) : un seul saut vers la boucle par tick
+        self.loop.call_soon_threadsafe(self._dispatch, seq, symbol, quote)
+
+    def _dispatch(self, seq, symbol, quote):
+        clients = self._clients.get(symbol, ())
+        self.stats["published"] += 1
+        self.stats["delivered"] += len(clients)
+        for client in clients:
+            client.push(seq, symbol, quote)
+
+    def _add(self, client):
+        self._count += 1
+        for symbol in client.symbols:
+            self._clients.setdefault(symbol, set()).add(client)
+
+    def _remove(self, client):
+        self._count -= 1
+        self.stats["dropped"] += client.dropped
+        for symbol in client.symbols:
+            clients = self._clients.get(symbol)
+            if clients:
+                clients.discard(client)
+                if not clients:
+                    del self._clients[symbol]
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        symbols, last_event_id, error = parse_stream_request(request.query, request.headers)
+        if error:
+            return web.json_response(error, status=400, headers={'Access-Control-Allow-Origin': '*'})
+        if self._count >= self.max_clients or self._closing:
+            self.stats["rejected"] += 1
+            return web.json_response({"error": "STREAM_CAPACITY", "max": self.max_clients}, status=503,
+                                     headers={'Retry-After': '5', 'Access-Control-Allow-Origin': '*'})
+
+        client = AsyncStreamClient(symbols)
+        # Abonné avant la reprise : les ticks publiés entre-temps sont en attente
+        self._add(client)
+        self.stats["connections"] += 1
+        response = web.StreamResponse(headers=STREAM_HEADERS)
+        try:
+            await response.prepare(request)
+            events, sent = initial_events(symbols, last_event_id)
+            await response.write("".join(
+                [f"retry: {STREAM_RETRY_MS}\n\n"] + [format_event(seq, quote) for seq, quote in events]
+            ).encode('utf-8'))
+
+            while not self._closing:
+                try:
+                    await asyncio.wait_for(client.wakeup.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    await response.write(b": heartbeat\n\n")
+                    continue
+                chunks = []
+                for seq, _, quote in client.pop_all():
+                    # Déjà envoyé pendant la reprise
+                    if seq <= sent:
+                        continue
+                    sent = seq
+                    chunks.append(format_event(seq, quote))
+                if chunks:
+                    await response.write("".join(chunks).encode('utf-8'))
+        except ConnectionResetError:
+            pass
+        finally:
+            self._remove(client)
+        return response
+
+    def get_stats(self):
+        # Lecture hors boucle : compteurs entiers, valeurs approchées suffisantes
+        return dict(self.stats, clients=self._count, maxClients=self.max_clients,
+                    port=self.port, heartbeatSeconds=self.heartbeat)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        hub.remove_listener(self._on_publish)
+
+        async def _shutdown():
+            self._closing = True
+            for clients in list(self._clients.values()):
+                for client in clients:
+                    client.wakeup.set()
+            await self._runner.cleanup()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_shutdown(), self.loop).result(timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+
+
+_server = None
+_public_url = None
+
+
+def start_price_stream_server(config):
+    """
+    Démarre le serveur SSE si PRICE_STREAM_PORT est défini et aiohttp
+    disponible. Retourne False si les flux restent servis par Flask
+    (port non configuré, aiohttp absent ou port déjà pris par un autre
+    worker).
+    """
+    global _server, _public_url
+    port = int(config.get("PRICE_STREAM_PORT") or 0)
+    if not port:
+        return False
+    if not HAS_AIOHTTP:
+        print("[PRICE_STREAM] aiohttp absent : flux servis par Flask")
+        return False
+    server = PriceStreamServer(
+        config.get("PRICE_STREAM_HOST", "0.0.0.0"), port,
+        max_clients=config.get("PRICE_STREAM_MAX_CLIENTS", DEFAULT_MAX_CLIENTS),
+    )
+    try:
+        server.start()
+    except Exception as e:
+        print(f"[PRICE_STREAM] serveur non démarré sur le port {port} : {e}")
+        return False
+    _server = server
+    _public_url = (config.get("PRICE_STREAM_URL") or "").rstrip('/') or None
+    print(f"[PRICE_STREAM] flux SSE servis par la boucle asyncio sur le port {port}")
+    return True
+
+
+def stop_price_stream_server():
+    global _server
+    server, _server = _server, None
+    if server is not None:
+        server.stop()
+
+
+def stream_redirect_url(scheme, host):
+    """
+    URL du flux sur le serveur asyncio (None s'il ne tourne pas) :
+    PRICE_STREAM_URL, sinon l'hôte de la requête avec le port du serveur.
+    """
+    server = _server
+    if server is None:
+        return None
+    if _public_url:
+        return _public_url + STREAM_PATH
+    hostname = host if host.endswith("]") else host.rsplit(":", 1)[0]
+    return f"{scheme}://{hostname}:{server.port}{STREAM_PATH}"
+
+
+def get_price_stream_server_stats():
+    server = _server
+    return server.get_stats() if server is not None else None
@@ -1,24 +1,386 @@
+"""
+Limitation de débit par token bucket, appliquée en middleware.
 
+Chaque règle (RATE_LIMIT_*) donne "N/secondes" à un préfixe de route et
+à une portée (utilisateur ou IP) : le bucket d'une clé contient au plus N
+jetons et se remplit de N jetons par fenêtre. Une vérification est en
+O(1) : remplissage selon le temps écoulé puis retrait d'un jeton. Une
+requête refusée reçoit 429 et un header Retry-After (secondes avant le
+prochain jeton). Un lot (/api/trades/execute-batch) coûte un jeton par
+ordre.
+
+La portée "user" est le propriétaire du challenge visé, lu côté serveur
+(challenge du corps, de la position ou de l'ordre de l'URL) : jamais un
+identifiant fourni par le client.
+
+Deux backends :
+  - memory : dict LRU du process ; un bucket inactif assez longtemps pour
+             être plein équivaut à une clé absente et est évincé
+             (RATE_LIMIT_MAX_KEYS borne la mémoire) ;
+  - sqlite : table rate_limits partagée par tous les workers, un seul
+             UPSERT ... RETURNING atomique par vérification ; les clés
+             inactives sont purgées périodiquement.
+Défaut : sqlite en CHALLENGE_STATE_MODE=shared, memory sinon.
+"""
+
+import math
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 
-# In-memory rate limiting
-user_last_trade = {}
-MAX_TRADES_PER_MINUTE = 10
+from flask import jsonify, request
+
+from backend.db import transaction
+
+BACKENDS = ("memory", "sqlite")
+DEFAULT_MAX_KEYS = 100000
+PRUNE_EVERY = 1000      # purge SQLite des clés inactives toutes les N vérifications
+
+# Règles par défaut : nom -> (préfixes de route, portée, clé de config, "N/secondes")
+DEFAULT_RULES = {
+    # /api/trades/ : execute, execute-batch et <tid>/close
+    "trade-user": (("/api/trades/", "/api/orders"), "user", "RATE_LIMIT_TRADE_USER", "20/60"),
+    "trade-ip": (("/api/trades/", "/api/orders"), "ip", "RATE_LIMIT_TRADE_IP", "120/60"),
+    "ai-ip": (("/api/ai/",), "ip", "RATE_LIMIT_AI_IP", "20/60"),
+    "price-ip": (("/api/price/", "/api/prices"), "ip", "RATE_LIMIT_PRICE_IP", "300/60"),
+}
+
+BATCH_PATH = "/api/trades/execute-batch"
+
+# Consommation de :cost jetons ; les SET lisent tous l'ancienne ligne. updated_at
+# ne recule jamais : un worker dont l'horodatage précède le dernier écrit
+# (attente du verrou d'écriture) ne recrédite pas le même intervalle
+TAKE_TOKEN_SQL = """
+    INSERT INTO rate_limits (key, tokens, updated_at, allowed)
+    VALUES (:key, :capacity - :cost * (:capacity >= :cost), :now, :capacity >= :cost)
+    ON CONFLICT(key) DO UPDATE SET
+        allowed = MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= :cost,
+        tokens = MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate)
+                 - :cost * (MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= :cost),
+        updated_at = MAX(updated_at, :now)
+    RETURNING tokens, allowed
+"""
+
+
+class RateLimitRule:
+    """N requêtes par fenêtre de `seconds`, en rafale d'au plus N."""
+
+    def __init__(self, name, prefixes, scope, capacity, seconds):
+        if scope not in ("user", "ip"):
+            raise ValueError(f"portée de limite invalide : {scope}")
+        self.name = name
+        self.prefixes = tuple(prefixes)
+        self.scope = scope
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(seconds)   # jetons par seconde
+
+    def matches(self, path):
+        return path.startswith(self.prefixes)
+
+    def retry_after(self, tokens, cost=1):
+        """Secondes avant que `cost` jetons soient disponibles."""
+        return max(0.0, (cost - tokens) / self.rate)
+
+
+def parse_limit(spec):
+    """"20/60" -> (20, 60.0) ; vide ou "0" -> None (règle désactivée)."""
+    spec = str(spec or "").strip()
+    if not spec or spec == "0":
+        return None
+    count, sep, seconds = spec.partition("/")
+    try:
+        count, seconds = int(count), float(seconds if sep else 60)
+    except ValueError:
+        raise ValueError(f"limite invalide : {spec!r} (attendu N/secondes)")
+    if count <= 0 or seconds <= 0:
+        return None
+    return count, seconds
+
+
+class _Denied(Exception):
+    """Refus d'un bucket : fait annuler la transaction de SQLiteBackend.take_all."""
+
+    def __init__(self, results):
+        super().__init__("rate limited")
+        self.results = results
+
+
+class MemoryBackend:
+    """Buckets du process : clé -> [jetons, horodatage, plein à partir de]."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = int(max_keys)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def take(self, key, rule, now, cost=1):
+        return self.take_all([(key, rule, cost)], now)[0]
+
+    def take_all(self, takes, now):
+        """
+        [(clé, règle, coût)] -> [(autorisé, jetons)] : tout ou rien, aucun
+        jeton n'est pris si un seul bucket est insuffisant.
+        """
+        with self._lock:
+            results, states = [], []
+            for key, rule, cost in takes:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    tokens, at = rule.capacity, now
+                else:
+                    tokens = min(rule.capacity, bucket[0] + max(0.0, now - bucket[1]) * rule.rate)
+                    at = max(now, bucket[1])
+                results.append((tokens >= cost, tokens))
+                states.append((key, rule, cost, tokens, at))
+            allowed = all(ok for ok, _ in results)
+            for key, rule, cost, tokens, at in states:
+                if allowed:
+                    tokens -= cost
+                self._buckets[key] = [tokens, at, at + (rule.capacity - tokens) / rule.rate]
+                self._buckets.move_to_end(key)
+            if allowed:
+                results = [(True, state[3] - state[2]) for state in states]
+            self._evict(now)
+        return results
+
+    def _evict(self, now):
+        # Appelé sous self._lock : les moins récents d'abord
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[2] > now and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+            self.evictions += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {"backend": "memory", "keys": len(self._buckets), "maxKeys": self.max_keys,
+                    "evictions": self.evictions}
+
+
+class SQLiteBackend:
+    """Buckets partagés par les workers (table rate_limits)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checks = 0
+        self._max_window = 0.0
+        self.pruned = 0
+
+    def take(self, key, rule, now, cost=1):
+        return self.take_all([(key, rule, cost)], now)[0]
+
+    def take_all(self, takes, now):
+        """
+        Tout ou rien dans une seule transaction : un refus annule (rollback)
+        les jetons déjà pris sur les autres buckets.
+        """
+        with self._lock:
+            self._checks += 1
+            prune = self._checks % PRUNE_EVERY == 0
+            self._max_window = max([self._max_window] + [rule.capacity / rule.rate for _, rule, _ in takes])
+        try:
+            with transaction() as conn:
+                results = []
+                for key, rule, cost in takes:
+                    tokens, allowed = conn.execute(
+                        TAKE_TOKEN_SQL,
+                        {"key": key, "capacity": rule.capacity, "rate": rule.rate, "now": now, "cost": cost},
+                    ).fetchone()
+                    results.append((bool(allowed), tokens))
+                if not all(ok for ok, _ in results):
+                    raise _Denied(results)
+                if prune:
+                    # Inactive depuis plus d'une fenêtre : bucket plein, équivaut à une clé absente
+                    self.pruned += conn.execute("DELETE FROM rate_limits WHERE updated_at < ?",
+                                                (now - self._max_window,)).rowcount
+        except _Denied as denied:
+            return denied.results
+        return results
+
+    def get_stats(self):
+        return {"backend": "sqlite", "checks": self._checks, "pruned": self.pruned}
+
+
+class RateLimiter:
+    """Règles + backend ; compteurs par règle."""
+
+    def __init__(self, rules, backend, trust_proxy=False):
+        self.rules = list(rules)
+        self.backend = backend
+        self.trust_proxy = trust_proxy
+        self._stats_lock = threading.Lock()
+        self._stats = {rule.name: {"allowed": 0, "limited": 0} for rule in self.rules}
+
+    def check(self, rule, identity, now=None, cost=1):
+        """(autorisé, secondes avant nouvel essai) pour `identity` sous `rule`."""
+        allowed, retry_after, _ = self.check_all([(rule, identity, cost)], now)
+        return allowed, retry_after
+
+    def check_all(self, checks, now=None):
+        """
+        [(règle, identité, coût)] -> (autorisé, secondes avant nouvel essai,
+        règle refusée) : les jetons ne sont pris que si tous les buckets
+        suffisent.
+        """
+        takes = [(f"{rule.name}:{identity}", rule, cost) for rule, identity, cost in checks]
+        results = self.backend.take_all(takes, now or time.time())
+        denied = [(rule, rule.retry_after(tokens, cost))
+                  for (rule, _, cost), (ok, tokens) in zip(checks, results) if not ok]
+        with self._stats_lock:
+            if denied:
+                for rule, _ in denied:
+                    self._stats[rule.name]["limited"] += 1
+            else:
+                for rule, _, _ in checks:
+                    self._stats[rule.name]["allowed"] += 1
+        if not denied:
+            return True, 0.0, None
+        rule, retry_after = max(denied, key=lambda d: d[1])
+        return False, retry_after, rule
+
+    def get_stats(self):
+        with self._stats_lock:
+            rules = {
+                rule.name: dict(self._stats[rule.name], scope=rule.scope, prefixes=list(rule.prefixes),
+                                capacity=rule.capacity, perSecond=round(rule.rate, 6))
+                for rule in self.rules
+            }
+        return dict(self.backend.get_stats(), trustProxy=self.trust_proxy, rules=rules)
+
+
+_limiter = None
+
+
+def configure_rate_limiter(config):
+    """Construit règles et backend depuis la config (None si désactivé)."""
+    global _limiter
+    if not config.get("RATE_LIMIT_ENABLED", True):
+        _limiter = None
+        return None
+    rules = []
+    for name, (prefixes, scope, key, default) in DEFAULT_RULES.items():
+        limit = parse_limit(config.get(key, default))
+        if limit:
+            rules.append(RateLimitRule(name, prefixes, scope, *limit))
+    shared = str(config.get("CHALLENGE_STATE_MODE", "process")).lower() == "shared"
+    backend = str(config.get("RATE_LIMIT_BACKEND") or ("sqlite" if shared else "memory")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"RATE_LIMIT_BACKEND invalide : {backend}")
+    _limiter = RateLimiter(
+        rules,
+        SQLiteBackend() if backend == "sqlite" else MemoryBackend(config.get("RATE_LIMIT_MAX_KEYS", DEFAULT_MAX_KEYS)),
+        trust_proxy=bool(config.get("RATE_LIMIT_TRUST_PROXY", False)),
+    )
+    return _limiter
+
+
+def get_rate_limit_stats():
+    return _limiter.get_stats() if _limiter else {"enabled": False}
+
+
+def _client_ip(limiter):
+    if limiter.trust_proxy and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or "unknown"
+
+
+def _target_challenges():
+    """
+    Challenges visés par la requête, un par ordre pour un lot : corps de la
+    requête, ou position / ordre désigné par l'URL (relu en base).
+    """
+    from backend.db import get_read_connection
+
+    args = request.view_args or {}
+    if 'tid' in args:
+        row = get_read_connection().execute("SELECT challenge_id FROM trades WHERE id = ?", (args['tid'],)).fetchone()
+        return [row[0]] if row else []
+    if 'oid' in args:
+        row = get_read_connection().execute("SELECT challenge_id FROM orders WHERE id = ?", (args['oid'],)).fetchone()
+        return [row[0]] if row else []
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return []
+    if isinstance(data.get('orders'), list):
+        return [o.get('challengeId') or o.get('challenge_id') for o in data['orders'] if isinstance(o, dict)]
+    return [data.get('challengeId') or data.get('challenge_id')]
+
+
+def _request_cost():
+    """Jetons dus par la requête : un par ordre pour un lot, sinon un."""
+    if request.path != BATCH_PATH:
+        return 1
+    data = request.get_json(silent=True)
+    orders = data.get('orders') if isinstance(data, dict) else None
+    return max(1, len(orders)) if isinstance(orders, list) else 1
+
+
+def _owner_costs():
+    """Propriétaire (userId du challenge, côté serveur) -> nombre d'ordres visés."""
+    from backend.challenge_store import get_challenge
+
+    costs = {}
+    for cid in _target_challenges():
+        challenge = get_challenge(cid) if cid else None
+        owner = challenge.get('userId') if challenge else None
+        if owner:
+            costs[owner] = costs.get(owner, 0) + 1
+    return costs
+
+
+def enforce_rate_limits():
+    """
+    before_request : 429 + Retry-After dès qu'une règle de la route est
+    épuisée (aucun jeton pris alors), 400 si le lot dépasse la capacité.
+    """
+    limiter = _limiter
+    if limiter is None or request.method == 'OPTIONS':
+        return None
+    rules = [rule for rule in limiter.rules if rule.matches(request.path)]
+    if not rules:
+        return None
+    owners = None
+    checks = []
+    for rule in rules:
+        if rule.scope == "ip":
+            costs = {_client_ip(limiter): _request_cost()}
+        else:
+            # Challenge inconnu : la route le refusera, seule la limite IP s'applique
+            owners = _owner_costs() if owners is None else owners
+            costs = owners
+        for identity, cost in costs.items():
+            if cost > rule.capacity:
+                # Jamais servable, même bucket plein : pas de Retry-After
+                return jsonify({"error": "BATCH_EXCEEDS_RATE_LIMIT", "limit": rule.name,
+                                "max": int(rule.capacity), "orders": cost}), 400
+            checks.append((rule, identity, cost))
+    allowed, retry_after, rule = limiter.check_all(checks, time.time())
+    if not allowed:
+        seconds = max(1, math.ceil(retry_after))
+        response = jsonify({"error": "RATE_LIMIT_EXCEEDED", "limit": rule.name, "retryAfter": seconds})
+        response.headers['Retry-After'] = str(seconds)
+        return response, 429
+    return None
+
+
+def register_rate_limiter(app):
+    """Installe la limitation en before_request (règles lues à la configuration)."""
+    configure_rate_limiter(app.config)
+    app.before_request(enforce_rate_limits)
+
 
 def can_execute_trade(user_id):
-    now = time.time()
-    if user_id in user_last_trade:
-        # Simplistic sliding window mock
-        recent_trades = [t for t in user_last_trade[user_id] if now - t < 60]
-        if len(recent_trades) >= MAX_TRADES_PER_MINUTE:
-            return False, "RATE_LIMIT_EXCEEDED"
-        user_last_trade[user_id] = recent_trades
-    else:
-        user_last_trade[user_id] = []
-    
-    user_last_trade[user_id].append(now)
-    return True, None
+    """Compatibilité : règle trade-user (toujours autorisé si la limitation est désactivée)."""
+    limiter = _limiter
+    rule = next((r for r in limiter.rules if r.name == "trade-user"), None) if limiter else None
+    if rule is None:
+        return True, None
+    allowed, _ = limiter.check(rule, user_id)
+    return (True, None) if allowed else (False, "RATE_LIMIT_EXCEEDED")
+
 
 def is_market_open(symbol):
     """
@@ -27,12 +389,12 @@ def is_market_open(symbol):
     """
     if "BTC" in symbol:
         return True
-    
+
     now = datetime.now()
     # Mocking standard market hours (9:30 AM - 4:00 PM EST, Mon-Fri)
     if now.weekday() >= 5: # Weekend
         return False
     if now.hour < 9 or (now.hour == 9 and now.minute < 30) or now.hour >= 16:
         return False
-        
+
     return True
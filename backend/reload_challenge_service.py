@@ -1,17 +1,264 @@
+"""
+Redémarrage à chaud : préchargement de l'état des challenges.
+
+Au démarrage, le cache des challenges est vide et chaque challenge était
+relu par un SELECT isolé à son premier trade. Un thread de fond précharge
+à la place les challenges ACTIVE (au plus CHALLENGE_CACHE_SIZE, les plus
+récemment modifiés) :
+  1. depuis le snapshot binaire (challenge_snapshot) s'il existe : si
+     l'empreinte de la table (COUNT, TOTAL(version), MAX(rowid)) est
+     inchangée, il est pris tel quel ; sinon les versions (id, version)
+     sont comparées et seuls les challenges modifiés sont relus ;
+  2. sinon par une seule requête sur user_challenges.
+Le trafic est servi pendant le préchargement (un miss relit le challenge
+comme avant) ; GET /ready répond 503 jusqu'à la fin, /health reste un
+simple test de vie.
+
+Le snapshot est réécrit depuis la base (après vidage de l'écrivain des
+trades) toutes les CHALLENGE_SNAPSHOT_INTERVAL secondes et à l'arrêt.
+"""
+
+import os
+import threading
+import time
+
+from backend.challenge_snapshot import (SELECT_ACTIVE_SQL, SNAPSHOT_COLUMNS, SnapshotError, encode_snapshot,
+                                        read_fingerprint, read_snapshot_file, write_snapshot_file)
+from backend.challenge_store import (CHALLENGE_COLUMNS, discard_challenge, get_challenge, get_challenge_capacity,
+                                     warm_challenges)
+from backend.db import get_db_path, get_read_connection, release_thread_connections
+from backend.lock_manager import challenge_lock
+from backend.trade_persistence import flush_trade_writer
+
+SNAPSHOT_SUFFIX = ".challenges.snap"
+VERSIONS_SQL = "SELECT id, version FROM user_challenges WHERE status = 'ACTIVE' ORDER BY updated_at DESC LIMIT ?"
+RELOAD_IN_CHUNK = 500       # ids par SELECT ... IN (...) des challenges modifiés
+READY_WAIT_TIMEOUT = 60.0
+
+_ready = threading.Event()
+_state = {"status": "PENDING", "source": None, "loaded": 0, "warmed": 0, "stale": 0,
+          "timeToReadyMs": None, "error": None, "snapshots": 0, "lastSnapshot": None}
+_state_lock = threading.Lock()
+_snapshot_path = None
+
 
 def reload_challenge_state(challenge_id):
     """
     Reconstruit l'état complet depuis la base de données.
     Ne fait JAMAIS confiance au state envoyé par le frontend.
     """
-    # 1. Fetch challenge row from DB
-    # challenge = db.execute("SELECT * FROM challenges WHERE id = ?", (challenge_id,))
-    
-    # 2. Fetch all closed trades to verify equity integrity
-    # trades = db.execute("SELECT pnl FROM trades WHERE challenge_id = ?", (challenge_id,))
-    # reconstructed_equity = challenge['initial_balance'] + sum(t['pnl'] for t in trades)
-    
-    # 3. Apply daily reset check
-    # _, challenge = check_and_reset_trading_day(challenge)
-    
+    from backend.replay_service import verify_challenge_integrity
+
+    # 1. Écritures en file commitées, puis relecture de la ligne
+    flush_trade_writer()
+    with challenge_lock(challenge_id):
+        discard_challenge(challenge_id)
+        challenge = get_challenge(challenge_id)
+    if challenge is None:
+        return "CHALLENGE_NOT_FOUND"
+
+    # 2. Solde = initial + somme des PnL clôturés
+    try:
+        verify_challenge_integrity(challenge)
+    except ValueError as e:
+        return str(e)
+
+    # 3. Daily reset: handled by the scheduled rollover (trading_day_service.roll_over)
+
     return "STATE_SYNCHRONIZED"
+
+
+def _rows_to_challenges(rows):
+    keys = [CHALLENGE_COLUMNS[name] for name in SNAPSHOT_COLUMNS]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _tuple_cursor(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def load_from_db(conn, limit):
+    """Challenges ACTIVE les plus récents, en une requête (tuples bruts)."""
+    return _rows_to_challenges(_tuple_cursor(conn).execute(SELECT_ACTIVE_SQL, (limit,)).fetchall())
+
+
+def load_from_snapshot(conn, path, limit):
+    """
+    (challenges, nombre relus en base) depuis le snapshot vérifié contre la
+    base. SnapshotError si le fichier est inutilisable.
+    """
+    challenges, fingerprint = read_snapshot_file(path)
+    if fingerprint == read_fingerprint(conn):
+        return challenges[:limit], 0
+
+    # Empreinte changée : comparaison des versions, relecture des seuls challenges modifiés
+    current = _tuple_cursor(conn).execute(VERSIONS_SQL, (limit,)).fetchall()
+    by_id = {c['id']: c for c in challenges}
+    stale = [cid for cid, version in current if cid not in by_id or by_id[cid]['version'] != version]
+    if len(stale) > len(current) // 2:
+        return load_from_db(conn, limit), len(current)
+    cursor = _tuple_cursor(conn)
+    fresh = {}
+    for start in range(0, len(stale), RELOAD_IN_CHUNK):
+        ids = stale[start:start + RELOAD_IN_CHUNK]
+        sql = (f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM user_challenges "
+               f"WHERE status = 'ACTIVE' AND id IN ({', '.join('?' * len(ids))})")
+        fresh.update((c['id'], c) for c in _rows_to_challenges(cursor.execute(sql, ids).fetchall()))
+    # Ordre de la base (plus récent d'abord), challenges sortis d'ACTIVE écartés
+    loaded = [fresh.get(cid) or by_id[cid] for cid, _ in current if cid in fresh or cid in by_id]
+    return loaded, len(stale)
+
+
+def warm_up(path=None):
+    """Précharge le cache des challenges (voir module) ; retourne l'état du préchargement."""
+    started = time.perf_counter()
+    limit = get_challenge_capacity()
+    source, stale = "db", 0
+    try:
+        conn = get_read_connection()
+        conn.execute("BEGIN")
+        try:
+            challenges = None
+            if path and os.path.exists(path):
+                try:
+                    challenges, stale = load_from_snapshot(conn, path, limit)
+                    source = "snapshot" if stale == 0 else "snapshot+db"
+                except SnapshotError as e:
+                    print(f"[WARMUP] snapshot ignoré : {e}")
+            if challenges is None:
+                challenges = load_from_db(conn, limit)
+        finally:
+            conn.rollback()
+        loaded = time.perf_counter()
+        # Du moins récent au plus récent : les plus récents restent en fin de LRU
+        warmed = warm_challenges(challenges[::-1])
+        state = {"status": "READY", "source": source, "loaded": len(challenges), "warmed": warmed,
+                 "stale": stale, "loadMs": round((loaded - started) * 1000, 2), "error": None}
+    except Exception as e:
+        # Le cache se remplit à la demande : l'instance reste utilisable
+        state = {"status": "READY", "source": None, "error": str(e)}
+    finally:
+        release_thread_connections()
+    state["timeToReadyMs"] = round((time.perf_counter() - started) * 1000, 2)
+    with _state_lock:
+        _state.update(state)
+    _ready.set()
+    print(f"[WARMUP] {state}")
+    return state
+
+
+def write_snapshot(path=None):
+    """Snapshot des challenges ACTIVE commités (écrivain des trades vidé d'abord)."""
+    path = path or _snapshot_path
+    if not path:
+        return None
+    started = time.perf_counter()
+    flush_trade_writer()
+    try:
+        conn = get_read_connection()
+        conn.execute("BEGIN")
+        try:
+            fingerprint = read_fingerprint(conn)
+            rows = _tuple_cursor(conn).execute(SELECT_ACTIVE_SQL, (get_challenge_capacity(),)).fetchall()
+        finally:
+            conn.rollback()
+    finally:
+        release_thread_connections()
+    data = encode_snapshot(rows, fingerprint)
+    write_snapshot_file(path, data)
+    result = {"challenges": len(rows), "bytes": len(data),
+              "ms": round((time.perf_counter() - started) * 1000, 2)}
+    with _state_lock:
+        _state["snapshots"] += 1
+        _state["lastSnapshot"] = result
+    return result
+
+
+class WarmupThread(threading.Thread):
+    """Préchargement, puis snapshot périodique (interval 0 : à l'arrêt seulement)."""
+
+    def __init__(self, path, interval):
+        super().__init__(name="challenge-warmup", daemon=True)
+        self.path = path
+        self.interval = float(interval)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            warm_up(self.path)
+            if not self.path or self.interval <= 0:
+                return
+            while not self._stop_event.wait(self.interval):
+                try:
+                    write_snapshot(self.path)
+                except Exception as e:
+                    print(f"[SNAPSHOT_ERROR] {e}")
+        finally:
+            release_thread_connections()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_thread = None
+
+
+def start_challenge_warmup(config):
+    """
+    Démarre le préchargement en arrière-plan si CHALLENGE_WARMUP_ENABLED
+    (sinon prêt tout de suite) ; snapshot si CHALLENGE_SNAPSHOT_ENABLED.
+    """
+    global _thread, _snapshot_path
+    if _thread is not None:
+        return _thread
+    _snapshot_path = None
+    if config.get("CHALLENGE_SNAPSHOT_ENABLED", True):
+        _snapshot_path = config.get("CHALLENGE_SNAPSHOT_PATH") or get_db_path() + SNAPSHOT_SUFFIX
+    if not config.get("CHALLENGE_WARMUP_ENABLED", True):
+        with _state_lock:
+            _state["status"] = "READY"
+        _ready.set()
+        return None
+    with _state_lock:
+        _state["status"] = "WARMING_UP"
+    _thread = WarmupThread(_snapshot_path, config.get("CHALLENGE_SNAPSHOT_INTERVAL", 0))
+    _thread.start()
+    return _thread
+
+
+def stop_challenge_warmup(timeout=2.0):
+    """Arrêt : dernier snapshot, écrit depuis la base."""
+    global _thread
+    thread, _thread = _thread, None
+    if thread is None:
+        return
+    thread.stop()
+    thread.join(timeout)
+    if _snapshot_path:
+        try:
+            write_snapshot(_snapshot_path)
+        except Exception as e:
+            print(f"[SNAPSHOT_ERROR] {e}")
+
+
+def wait_until_ready(timeout=READY_WAIT_TIMEOUT):
+    """
+    Attend la fin du préchargement s'il est en cours. Les écritures
+    ensemblistes hors cache (bascule journalière, réévaluation des risques)
+    ne doivent pas précéder l'insertion des états lus par le préchargement.
+    """
+    if _thread is None:
+        return True
+    return _ready.wait(timeout)
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def get_warmup_stats():
+    with _state_lock:
+        stats = dict(_state)
+    return dict(stats, ready=_ready.is_set(), snapshotPath=_snapshot_path)
@@ -1,3 +1,5 @@
+from backend.db import get_read_connection
+
 
 def reconstruct_equity(challenge_id, trades, initial_balance):
     """
@@ -9,9 +11,15 @@ def reconstruct_equity(challenge_id, trades, initial_balance):
     return expected_equity
 
 def verify_challenge_integrity(challenge):
-    # Fetch all trades for this challenge from DB
-    # trades = get_trades_by_challenge(challenge['id'])
-    # current_equity = reconstruct_equity(challenge['id'], trades, challenge['initialBalance'])
-    # if abs(current_equity - challenge['equity']) > 0.01:
-    #    raise ValueError("DATA_INTEGRITY_VIOLATION")
+    """
+    Vérification complète d'un challenge (tous ses trades). Le solde
+    réalisé est comparé : l'equity inclut le PnL latent des positions
+    ouvertes. Vérification continue de tous les challenges :
+    backend.integrity_verifier.
+    """
+    conn = get_read_connection()
+    trades = conn.execute("SELECT pnl, status FROM trades WHERE challenge_id = ?", (challenge['id'],)).fetchall()
+    expected_balance = reconstruct_equity(challenge['id'], trades, challenge['initialBalance'])
+    if abs(expected_balance - challenge['currentBalance']) > 0.01:
+        raise ValueError("DATA_INTEGRITY_VIOLATION")
     return True
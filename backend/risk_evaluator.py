@@ -0,0 +1,202 @@
+"""
+Évaluation en masse des règles de risque de tous les challenges ACTIVE.
+
+evaluate_after_trade ne voit un challenge que lorsqu'il trade : un
+challenge inactif n'est jamais réévalué (après le reset journalier, ou
+quand son equity bouge avec les prix). Ici :
+  1. une requête charge tous les challenges ACTIVE en colonnes NumPy
+     (equity, initial, départ journalier, limites) ;
+  2. evaluate_arrays calcule en une passe perte journalière, perte totale
+     et objectif de profit ;
+  3. les changements de statut sont écrits par un seul UPDATE groupé
+     (executemany), conditionné à la version lue.
+
+Seuls les challenges qui changent de statut sont repris un par un, sous
+leur verrou : s'ils sont en cache, c'est l'état en mémoire (le plus
+récent) qui est réévalué et persisté ; s'ils ont des positions ouvertes,
+c'est la liquidation de position_book qui les reprend (equity marquée).
+
+Un thread de fond relance l'évaluation toutes les RISK_EVAL_INTERVAL
+secondes (0 = désactivé) ; POST /api/admin/risk/evaluate la déclenche.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+from backend.challenge_evaluator import STATUS_FAILED, STATUS_KEEP, STATUS_PASSED, evaluate_after_trade, evaluate_arrays
+from backend.challenge_store import peek_challenge, put_challenge
+from backend.db import get_read_connection, release_thread_connections, transaction
+from backend.lock_manager import LockTimeout, challenge_locks
+from backend.position_book import has_open_positions, liquidate_challenge, mark_challenge
+from backend.reload_challenge_service import wait_until_ready
+
+LOAD_ACTIVE_SQL = """
+    SELECT id, version, equity, initial_balance, daily_starting_balance,
+           max_daily_loss_limit, max_total_loss_limit, profit_target
+    FROM user_challenges
+    WHERE status = 'ACTIVE'
+"""
+UPDATE_STATUS_SQL = (
+    "UPDATE user_challenges SET status = ?, updated_at = ?, version = version + 1 "
+    "WHERE id = ? AND version = ? AND status = 'ACTIVE'"
+)
+STATUS_NAMES = {STATUS_FAILED: "FAILED", STATUS_PASSED: "PASSED"}
+
+_stats = {"runs": 0, "evaluated": 0, "failed": 0, "passed": 0, "skipped": 0, "lastRun": None}
+_stats_lock = threading.Lock()
+
+
+def load_active_columns(conn):
+    """Challenges ACTIVE -> (ids, versions, dict nom -> colonne float64)."""
+    import numpy as np
+
+    cursor = conn.cursor()
+    # Tuples bruts : pas de sqlite3.Row par ligne
+    cursor.row_factory = None
+    rows = cursor.execute(LOAD_ACTIVE_SQL).fetchall()
+    if not rows:
+        empty = np.empty(0)
+        return [], [], {name: empty for name in ("equity", "initial", "dailyStart", "maxDaily", "maxTotal", "target")}
+    ids, versions, *values = zip(*rows)
+    columns = [np.array(v, dtype=np.float64) for v in values]
+    return list(ids), list(versions), dict(zip(("equity", "initial", "dailyStart", "maxDaily", "maxTotal", "target"), columns))
+
+
+def evaluate_all(lock_timeout=2.0):
+    """
+    Évalue tous les challenges ACTIVE et persiste les changements de statut.
+
+    Returns:
+        dict : évalués, FAILED, PASSED, ignorés (modifiés entre-temps), durées (ms)
+    """
+    import numpy as np
+
+    started = time.perf_counter()
+    conn = get_read_connection()
+    ids, versions, cols = load_active_columns(conn)
+    # Fin de la lecture : libère le snapshot WAL avant les écritures
+    conn.rollback()
+    loaded = time.perf_counter()
+
+    codes = evaluate_arrays(cols["equity"], cols["initial"], cols["dailyStart"],
+                            cols["maxDaily"], cols["maxTotal"], cols["target"])
+    changed = np.flatnonzero(codes != STATUS_KEEP)
+    computed = time.perf_counter()
+
+    now = datetime.now(timezone.utc).isoformat()
+    updates = []
+    counts = {"FAILED": 0, "PASSED": 0}
+    skipped = 0
+    changed_ids = [ids[i] for i in changed]
+    with_positions = []
+    try:
+        with challenge_locks(changed_ids, timeout=lock_timeout):
+            for i in changed:
+                cid = ids[i]
+                if has_open_positions(cid):
+                    # Repris hors des verrous (liquidation sous le verrou du challenge)
+                    with_positions.append(cid)
+                    continue
+                cached = peek_challenge(cid)
+                if cached is None:
+                    updates.append((STATUS_NAMES[int(codes[i])], now, cid, versions[i]))
+                    continue
+                # En cache : l'état en mémoire fait foi (trades pas encore commités)
+                updated = evaluate_after_trade(mark_challenge(dict(cached)))
+                if updated['status'] == cached['status']:
+                    skipped += 1
+                    continue
+                updated['updatedAt'] = now
+                put_challenge(updated, persist=True)
+                counts[updated['status']] = counts.get(updated['status'], 0) + 1
+            if updates:
+                with transaction() as wconn:
+                    # Un executemany par statut : rowcount exact par statut ; une ligne
+                    # modifiée entre la lecture et l'UPDATE est laissée au prochain passage
+                    for status in STATUS_NAMES.values():
+                        rows = [u for u in updates if u[0] == status]
+                        if rows:
+                            written = wconn.executemany(UPDATE_STATUS_SQL, rows).rowcount
+                            counts[status] += written
+                            skipped += len(rows) - written
+    except LockTimeout:
+        skipped += len(changed_ids)
+        with_positions = []
+    for cid in with_positions:
+        status = liquidate_challenge(cid, lock_timeout=lock_timeout)
+        if status in counts:
+            counts[status] += 1
+        else:
+            skipped += 1
+    finished = time.perf_counter()
+
+    result = {
+        "evaluated": len(ids),
+        "failed": counts["FAILED"],
+        "passed": counts["PASSED"],
+        "skipped": skipped,
+        "loadMs": round((loaded - started) * 1000, 2),
+        "computeMs": round((computed - loaded) * 1000, 2),
+        "writeMs": round((finished - computed) * 1000, 2),
+    }
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["evaluated"] += result["evaluated"]
+        _stats["failed"] += result["failed"]
+        _stats["passed"] += result["passed"]
+        _stats["skipped"] += result["skipped"]
+        _stats["lastRun"] = dict(result, at=now)
+    return result
+
+
+class RiskEvaluatorThread(threading.Thread):
+    """Réévaluation périodique de tous les challenges ACTIVE."""
+
+    def __init__(self, interval):
+        super().__init__(name="risk-evaluator", daemon=True)
+        self.interval = float(interval)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            wait_until_ready()
+            while not self._stop_event.wait(self.interval):
+                try:
+                    evaluate_all()
+                except Exception as e:
+                    print(f"[RISK_EVAL_ERROR] {e}")
+        finally:
+            release_thread_connections()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_thread = None
+
+
+def start_risk_evaluator(config):
+    """Démarre la réévaluation périodique si RISK_EVAL_INTERVAL > 0 (idempotent)."""
+    global _thread
+    interval = float(config.get("RISK_EVAL_INTERVAL", 0) or 0)
+    if interval <= 0 or _thread is not None:
+        return _thread
+    _thread = RiskEvaluatorThread(interval)
+    _thread.start()
+    return _thread
+
+
+def stop_risk_evaluator(timeout=2.0):
+    global _thread
+    thread, _thread = _thread, None
+    if thread is not None:
+        thread.stop()
+        thread.join(timeout)
+
+
+def get_risk_evaluator_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["interval"] = _thread.interval if _thread else 0
+    return stats
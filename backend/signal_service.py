@@ -1,10 +1,10 @@
 
-import numpy as np
-
 def calculate_signal(price_history):
     """
     IA Engine: Simple Moving Average Crossover (SMA 5/20)
     """
+    import numpy as np
+
     if len(price_history) < 20:
         return "HOLD", "INSUFFICIENT_DATA"
     
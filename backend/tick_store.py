@@ -0,0 +1,185 @@
+"""
+Historique en mémoire des cotations : un ring buffer NumPy par symbole.
+
+Chaque cotation publiée par price_service est ajoutée en O(1) au buffer
+de ticks du symbole et agrège incrémentalement les bougies OHLCV
+1s / 1m / 5m / 1h. La mémoire par symbole est fixe (capacités
+configurables) et les lectures renvoient des copies de tranches prises
+sous le verrou du symbole, sans copie objet par objet.
+
+Le volume d'une bougie est un volume « tick » (nombre de cotations
+reçues) : les flux Yahoo / LeBoursier utilisés ne fournissent pas de
+volume échangé.
+
+NumPy n'est importé qu'à la création du premier store (premier tick).
+"""
+
+import threading
+
+from backend import price_service
+
+TIMEFRAMES = {"1s": 1, "1m": 60, "5m": 300, "1h": 3600}
+
+DEFAULT_TICK_CAPACITY = 4096
+DEFAULT_CANDLE_CAPACITY = 1000
+
+_config = {
+    "tick_capacity": DEFAULT_TICK_CAPACITY,
+    "candle_capacity": DEFAULT_CANDLE_CAPACITY,
+}
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _ordered(arr, head, size):
+    """
+    Copie chronologique des `size` derniers éléments d'un ring buffer.
+    Appelé sous le verrou du store : une vue serait réécrite par les ticks
+    suivants pendant la sérialisation.
+    """
+    import numpy as np
+
+    cap = len(arr)
+    start = (head - size) % cap
+    if start + size <= cap:
+        return arr[start:start + size].copy()
+    return np.concatenate((arr[start:], arr[:head]))
+
+
+class CandleSeries:
+    """Bougies OHLCV d'une unité de temps, agrégées au fil des ticks."""
+
+    FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+    def __init__(self, seconds, capacity):
+        import numpy as np
+
+        self.seconds = seconds
+        self.time = np.zeros(capacity, dtype=np.int64)
+        self.open = np.zeros(capacity, dtype=np.float64)
+        self.high = np.zeros(capacity, dtype=np.float64)
+        self.low = np.zeros(capacity, dtype=np.float64)
+        self.close = np.zeros(capacity, dtype=np.float64)
+        self.volume = np.zeros(capacity, dtype=np.float64)
+        self.head = 0   # index de la prochaine bougie à ouvrir
+        self.size = 0
+
+    def update(self, ts, price, volume):
+        bucket = int(ts // self.seconds) * self.seconds
+        if self.size:
+            cur = self.head - 1
+            last = self.time[cur]
+            if bucket == last:
+                if price > self.high[cur]:
+                    self.high[cur] = price
+                if price < self.low[cur]:
+                    self.low[cur] = price
+                self.close[cur] = price
+                self.volume[cur] += volume
+                return
+            if bucket < last:
+                # Tick hors ordre pour une bougie déjà close : ignoré
+                return
+        i = self.head
+        self.time[i] = bucket
+        self.open[i] = self.high[i] = self.low[i] = self.close[i] = price
+        self.volume[i] = volume
+        self.head = (i + 1) % len(self.time)
+        self.size = min(self.size + 1, len(self.time))
+
+    def latest(self, limit):
+        """Dict de tableaux copiés (ordre chronologique) des `limit` dernières bougies."""
+        n = min(max(int(limit), 0), self.size)
+        return {f: _ordered(getattr(self, f), self.head, n) for f in self.FIELDS}
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in self.FIELDS)
+
+
+class SymbolTickStore:
+    """Ticks bruts + bougies multi-unités d'un symbole."""
+
+    def __init__(self, symbol, tick_capacity, candle_capacity):
+        import numpy as np
+
+        self.symbol = symbol
+        self.ts = np.zeros(tick_capacity, dtype=np.float64)
+        self.price = np.zeros(tick_capacity, dtype=np.float64)
+        self.head = 0
+        self.size = 0
+        self.candles = {tf: CandleSeries(sec, candle_capacity) for tf, sec in TIMEFRAMES.items()}
+        self.lock = threading.Lock()
+
+    def append(self, ts, price, volume=1.0):
+        with self.lock:
+            i = self.head
+            self.ts[i] = ts
+            self.price[i] = price
+            self.head = (i + 1) % len(self.ts)
+            self.size = min(self.size + 1, len(self.ts))
+            for series in self.candles.values():
+                series.update(ts, price, volume)
+
+    def latest_ticks(self, limit):
+        with self.lock:
+            n = min(max(int(limit), 0), self.size)
+            return _ordered(self.ts, self.head, n), _ordered(self.price, self.head, n)
+
+    def latest_candles(self, tf, limit):
+        with self.lock:
+            return self.candles[tf].latest(limit)
+
+    @property
+    def nbytes(self):
+        return self.ts.nbytes + self.price.nbytes + sum(c.nbytes for c in self.candles.values())
+
+
+def configure_tick_store(config):
+    """Capacités lues depuis la config Flask (avant la création des stores)."""
+    _config["tick_capacity"] = int(config.get("TICK_STORE_CAPACITY", DEFAULT_TICK_CAPACITY))
+    _config["candle_capacity"] = int(config.get("CANDLE_STORE_CAPACITY", DEFAULT_CANDLE_CAPACITY))
+
+
+def get_store(symbol, create=False):
+    s = symbol.upper()
+    store = _stores.get(s)
+    if store is None and create:
+        with _stores_lock:
+            store = _stores.get(s)
+            if store is None:
+                store = SymbolTickStore(s, _config["tick_capacity"], _config["candle_capacity"])
+                _stores[s] = store
+    return store
+
+
+def on_quote(symbol, quote):
+    """Listener price_service : ajoute chaque cotation fraîche au store."""
+    # Symboles connus uniquement : la mémoire totale reste bornée
+    if symbol not in price_service.TRADABLE_SYMBOLS:
+        return
+    price = quote.get("price")
+    if not price:
+        return
+    get_store(symbol, create=True).append(quote.get("fetchedAt") or quote.get("timestamp"), float(price))
+
+
+def get_candles(symbol, tf, limit):
+    """Bougies en colonnes NumPy, ou None si aucun tick reçu pour ce symbole."""
+    store = get_store(symbol)
+    if store is None:
+        return None
+    return store.latest_candles(tf, limit)
+
+
+def get_tick_store_stats():
+    with _stores_lock:
+        stores = list(_stores.values())
+    return {
+        "symbols": len(stores),
+        "bytes": sum(s.nbytes for s in stores),
+        "ticks": {s.symbol: s.size for s in stores},
+    }
+
+
+price_service.add_quote_listener(on_quote)
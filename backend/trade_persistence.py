@@ -0,0 +1,377 @@
+"""
+Persistance des trades en écriture différée (write-behind, group commit).
+
+Le chemin de trade n'écrit plus lui-même en base : il dépose un
+enregistrement (utilisateur, état du challenge, trade) dans une file
+bornée. Un thread écrivain dédié vide la file par lots (au plus
+TRADE_WRITE_BATCH_SIZE enregistrements) et écrit chaque lot en une seule
+transaction :
+  - INSERT OR IGNORE des utilisateurs (executemany)
+  - UPSERT des challenges, un seul par challenge (le dernier état du lot)
+  - INSERT des trades (executemany)
+Un seul commit (donc un seul fsync) couvre tout le lot.
+
+Durabilité (TRADE_WRITE_DURABILITY) :
+  - "commit"  : la requête attend le commit du lot qui contient son trade ;
+                l'écrivain commite dès que la file est vide, les trades
+                arrivés pendant un commit forment le lot suivant
+  - "enqueue" : la requête répond dès la mise en file ; l'écrivain attend
+                jusqu'à TRADE_WRITE_BATCH_MS pour grossir le lot (le trade
+                peut être perdu si le process meurt avant le commit)
+
+File pleine : persist_trade() attend au plus TRADE_WRITE_ENQUEUE_TIMEOUT puis
+lève PersistenceBackpressure (la route répond 503). À l'arrêt, la file
+est vidée avant la fermeture des connexions.
+
+CHALLENGE_STATE_MODE=shared (plusieurs workers) : pas d'écrivain de fond,
+chaque groupe est écrit dans la requête, en transaction IMMEDIATE, avec
+contrôle de la colonne version (VersionConflict si un autre process a
+modifié le challenge entre-temps).
+"""
+
+import queue
+import threading
+import time
+
+from backend.db import release_thread_connections, transaction
+
+DURABILITY_MODES = ("commit", "enqueue")
+
+DEFAULT_BATCH_MS = 5
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_ENQUEUE_TIMEOUT = 0.5   # secondes d'attente max quand la file est pleine
+DEFAULT_COMMIT_TIMEOUT = 5.0    # attente max du commit en mode "commit"
+
+INSERT_USER_SQL = "INSERT OR IGNORE INTO users (id, name, email, is_admin) VALUES (?, ?, ?, 0)"
+_UPSERT_CHALLENGE_BASE = """
+    INSERT INTO user_challenges (id, user_id, type, status, initial_balance, current_balance, equity,
+        max_equity, daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit,
+        created_at, updated_at, daily_date, version)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        status = excluded.status,
+        current_balance = excluded.current_balance,
+        equity = excluded.equity,
+        max_equity = excluded.max_equity,
+        daily_starting_balance = excluded.daily_starting_balance,
+        daily_date = excluded.daily_date,
+        updated_at = excluded.updated_at,
+"""
+UPSERT_CHALLENGE_SQL = _UPSERT_CHALLENGE_BASE + "        version = user_challenges.version + 1"
+# Concurrence optimiste : la ligne n'est modifiée que si sa version est
+# celle sur laquelle l'état en mémoire a été calculé (rowcount 0 sinon)
+UPSERT_CHALLENGE_CHECKED_SQL = (
+    _UPSERT_CHALLENGE_BASE + "        version = excluded.version\n"
+    "    WHERE user_challenges.version = excluded.version - 1"
+)
+# Une position clôturée réécrit la ligne insérée à son ouverture
+UPSERT_TRADE_SQL = (
+    "INSERT INTO trades (id, challenge_id, symbol, side, entry_price, exit_price, lots, pnl, status, opened_at, closed_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET exit_price = excluded.exit_price, pnl = excluded.pnl, "
+    "status = excluded.status, closed_at = excluded.closed_at"
+)
+
+
+class PersistenceBackpressure(Exception):
+    """La file d'écriture est pleine : le trade n'a pas été accepté."""
+
+
+class VersionConflict(Exception):
+    """Un autre worker a modifié le challenge depuis sa lecture."""
+
+    def __init__(self, challenge_ids):
+        super().__init__(f"challenge version conflict: {', '.join(challenge_ids)}")
+        self.challenge_ids = challenge_ids
+
+
+class TradeRecord:
+    """
+    Un trade exécuté et l'état du challenge qui en résulte. `statements` :
+    écritures liées au trade, (sql, paramètres) exécutées dans la même
+    transaction (ex: statut de l'ordre déclenché).
+    """
+
+    __slots__ = ("user_id", "challenge", "trade", "statements", "done", "error", "wait_commit")
+
+    def __init__(self, challenge, trade, user_id=None, statements=()):
+        self.user_id = user_id or challenge.get('userId')
+        self.challenge = challenge
+        self.trade = trade
+        self.statements = tuple(statements)
+        self.done = threading.Event()
+        self.error = None
+        self.wait_commit = False
+
+    def wait(self, timeout=DEFAULT_COMMIT_TIMEOUT):
+        """
+        En durabilité "commit", attend le commit du lot (hors verrou du
+        challenge) et relève l'erreur d'écriture éventuelle.
+        """
+        if not self.wait_commit:
+            return
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"trade {self.trade.get('id')} not committed in time")
+        if self.error is not None:
+            raise self.error
+
+    def challenge_row(self):
+        c = self.challenge
+        return (
+            c['id'], self.user_id, c['type'], c['status'], c['initialBalance'], c['currentBalance'],
+            c['equity'], c['maxEquity'], c['dailyStartingBalance'], c['profitTarget'],
+            c['maxDailyLossLimit'], c['maxTotalLossLimit'], c['createdAt'], c['updatedAt'],
+            c.get('dailyDate'), c.get('version', 0) + 1,
+        )
+
+    def trade_row(self):
+        t = self.trade
+        return (
+            t['id'], self.challenge['id'], t['symbol'], t['type'], t['entryPrice'], t['exitPrice'],
+            t['size'], t['pnl'], t['status'], t['openedAt'], t['closedAt'],
+        )
+
+
+def write_records(records, check_versions=False):
+    """
+    Écrit un lot d'enregistrements en une transaction (un seul commit).
+
+    Avec `check_versions`, la transaction est IMMEDIATE et chaque challenge
+    n'est écrit que si sa version en base est celle lue par l'appelant ;
+    sinon rien n'est écrit et VersionConflict est levée.
+    """
+    users = {r.user_id for r in records if r.user_id}
+    challenges = {}
+    for record in records:
+        # Le dernier état de chaque challenge suffit
+        challenges[record.challenge['id']] = record
+    with transaction(foreign_keys=True, immediate=check_versions) as conn:
+        conn.executemany(INSERT_USER_SQL, [(uid, uid, f"{uid}@local") for uid in users])
+        if check_versions:
+            stale = [cid for cid, r in challenges.items()
+                     if conn.execute(UPSERT_CHALLENGE_CHECKED_SQL, r.challenge_row()).rowcount == 0]
+            if stale:
+                raise VersionConflict(stale)
+        else:
+            conn.executemany(UPSERT_CHALLENGE_SQL, [r.challenge_row() for r in challenges.values()])
+        conn.executemany(UPSERT_TRADE_SQL, [r.trade_row() for r in records])
+        for record in records:
+            for sql, params in record.statements:
+                if conn.execute(sql, params).rowcount == 0 and check_versions:
+                    # Écriture liée périmée (ex: ordre annulé par un autre worker)
+                    raise VersionConflict([record.challenge['id']])
+    if check_versions:
+        for record in challenges.values():
+            record.challenge['version'] = record.challenge.get('version', 0) + 1
+
+
+class TradeWriter(threading.Thread):
+    """Thread unique qui vide la file et commite par lots."""
+
+    def __init__(self, batch_ms=DEFAULT_BATCH_MS, batch_size=DEFAULT_BATCH_SIZE,
+                 queue_size=DEFAULT_QUEUE_SIZE, durability="commit",
+                 enqueue_timeout=DEFAULT_ENQUEUE_TIMEOUT):
+        super().__init__(name="trade-writer", daemon=True)
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"TRADE_WRITE_DURABILITY invalide : {durability}")
+        self.batch_window = float(batch_ms) / 1000
+        self.batch_size = int(batch_size)
+        self.durability = durability
+        self.enqueue_timeout = float(enqueue_timeout)
+        self.queue = queue.Queue(maxsize=int(queue_size))
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "maxBatch": 0,
+                      "rejected": 0, "errors": 0, "commitSeconds": 0.0}
+
+    def enqueue(self, records):
+        """
+        Met un groupe de trades en file (PersistenceBackpressure si elle
+        reste pleine). Un groupe est toujours écrit dans une seule transaction.
+        """
+        if self._stop_event.is_set():
+            raise PersistenceBackpressure("trade writer stopped")
+        for record in records:
+            record.wait_commit = self.durability == "commit"
+        try:
+            self.queue.put(records, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.stats["rejected"] += len(records)
+            raise PersistenceBackpressure("trade write queue full") from None
+        with self._stats_lock:
+            self.stats["enqueued"] += len(records)
+        return records
+
+    def _next_batch(self):
+        try:
+            first = self.queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first]
+        size = len(first)
+        # En durabilité "commit" les requêtes attendent : pas d'attente
+        # supplémentaire, ce qui arrive pendant un commit forme le lot suivant
+        window = self.batch_window if self.durability == "enqueue" else 0
+        deadline = time.monotonic() + window
+        while size < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                group = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(group)
+            size += len(group)
+        return batch
+
+    def _write(self, batch):
+        records = [record for group in batch for record in group]
+        started = time.perf_counter()
+        try:
+            write_records(records)
+        except Exception as e:
+            # Un enregistrement invalide ne doit pas faire perdre le lot :
+            # on réécrit groupe par groupe pour isoler le fautif
+            print(f"[TRADE_WRITER] lot de {len(records)} en échec ({e}), réécriture par groupe")
+            for group in batch:
+                try:
+                    write_records(group)
+                except Exception as err:
+                    for record in group:
+                        record.error = err
+                    with self._stats_lock:
+                        self.stats["errors"] += len(group)
+                    print(f"[TRADE_WRITER] DB_INSERT_ERROR trades {[r.trade.get('id') for r in group]}: {err}")
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.stats["batches"] += 1
+            self.stats["written"] += len(records)
+            self.stats["maxBatch"] = max(self.stats["maxBatch"], len(records))
+            self.stats["commitSeconds"] += elapsed
+        for record in records:
+            record.done.set()
+        for _ in batch:
+            self.queue.task_done()
+
+    def run(self):
+        try:
+            while not (self._stop_event.is_set() and self.queue.empty()):
+                batch = self._next_batch()
+                if batch:
+                    self._write(batch)
+        finally:
+            release_thread_connections()
+
+    def flush(self, timeout=DEFAULT_COMMIT_TIMEOUT):
+        """Attend que tout ce qui est en file soit commité."""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return not self.queue.unfinished_tasks
+
+    def stop(self, timeout=DEFAULT_COMMIT_TIMEOUT):
+        """Refuse les nouveaux trades, vide la file puis arrête le thread."""
+        self._stop_event.set()
+        self.join(timeout)
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        batches = stats["batches"]
+        commit_seconds = stats.pop("commitSeconds")
+        stats["avgBatch"] = round(stats["written"] / batches, 2) if batches else 0
+        stats["avgCommitMs"] = round(commit_seconds / batches * 1000, 3) if batches else 0
+        stats.update(queueDepth=self.queue.qsize(), queueSize=self.queue.maxsize,
+                     durability=self.durability, batchMs=self.batch_window * 1000,
+                     batchSize=self.batch_size, alive=self.is_alive())
+        return stats
+
+
+STATE_MODES = ("process", "shared")
+
+_writer = None
+_writer_lock = threading.Lock()
+_check_versions = False   # CHALLENGE_STATE_MODE=shared
+
+
+def start_trade_writer(config):
+    """
+    Démarre le thread écrivain (idempotent) si TRADE_WRITE_BEHIND est actif.
+
+    En CHALLENGE_STATE_MODE=shared (plusieurs workers sur la même base),
+    l'état d'un challenge doit être commité avant qu'un autre process le
+    relise : pas d'écriture différée, chaque trade est écrit dans la
+    requête avec contrôle de version.
+    """
+    global _writer, _check_versions
+    mode = str(config.get("CHALLENGE_STATE_MODE", "process")).lower()
+    if mode not in STATE_MODES:
+        raise ValueError(f"CHALLENGE_STATE_MODE invalide : {mode}")
+    _check_versions = mode == "shared"
+    if _check_versions or not config.get("TRADE_WRITE_BEHIND", True):
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = TradeWriter(
+                batch_ms=config.get("TRADE_WRITE_BATCH_MS", DEFAULT_BATCH_MS),
+                batch_size=config.get("TRADE_WRITE_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+                queue_size=config.get("TRADE_WRITE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE),
+                durability=str(config.get("TRADE_WRITE_DURABILITY", "commit")).lower(),
+                enqueue_timeout=config.get("TRADE_WRITE_ENQUEUE_TIMEOUT", DEFAULT_ENQUEUE_TIMEOUT),
+            )
+            _writer.start()
+        return _writer
+
+
+def stop_trade_writer(timeout=DEFAULT_COMMIT_TIMEOUT):
+    """Vide la file et arrête l'écrivain (appelé à l'arrêt du process)."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop(timeout)
+
+
+def flush_trade_writer(timeout=DEFAULT_COMMIT_TIMEOUT):
+    """Attend le commit de tout ce qui est en file (True sans écrivain de fond)."""
+    writer = _writer
+    return writer.flush(timeout) if writer else True
+
+
+def persist_trades(records):
+    """
+    Persiste un groupe de TradeRecord dans une seule transaction : mise en
+    file de l'écrivain de fond s'il tourne, sinon écriture directe dans le
+    thread appelant. L'appelant attend ensuite record.wait() hors de son
+    verrou.
+    """
+    writer = _writer
+    if _check_versions:
+        # Synchrone ; VersionConflict remonte à l'appelant qui relit et rejoue
+        write_records(records, check_versions=True)
+        for record in records:
+            record.done.set()
+        return records
+    if writer is None:
+        error = None
+        try:
+            write_records(records)
+        except Exception as e:
+            error = e
+        for record in records:
+            record.error = error
+            record.wait_commit = error is not None
+            record.done.set()
+        return records
+    return writer.enqueue(records)
+
+
+def persist_trade(challenge, trade, user_id=None):
+    """Persiste un trade (voir persist_trades)."""
+    return persist_trades([TradeRecord(challenge, trade, user_id)])[0]
+
+
+def get_trade_writer_stats():
+    writer = _writer
+    return writer.get_stats() if writer else {"enabled": False}
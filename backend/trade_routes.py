@@ -1,37 +1,56 @@
 
 from flask import Blueprint, request, jsonify, current_app
-from threading import Lock
-from backend.trade_service import execute_trade
-from backend.market_data_yahoo import get_yahoo_price
-from backend.market_data_maroc import get_maroc_price
-import sqlite3
-import os
+from backend.trade_service import execute_trade, close_position
+from backend.price_service import get_quote, get_quotes, get_trade_quote, TRADABLE_SYMBOLS, MAX_BATCH_SYMBOLS
+from backend.db import get_read_connection, transaction
+from backend.trade_persistence import persist_trade, persist_trades, TradeRecord, PersistenceBackpressure, VersionConflict
+from backend.lock_manager import challenge_lock, challenge_locks, LockTimeout
+from backend.challenge_store import get_challenge, put_challenge, discard_challenge
+from backend.idempotency import idempotent
+from backend.position_book import (holds_positions, mark_challenge, open_exposure, track_trade,
+                                   find_position, release_position, list_positions)
+from backend.order_book import cancel_position_orders
 from datetime import datetime
 
 trade_bp = Blueprint('trades', __name__)
 
+MAX_BATCH_ORDERS = 100
+VERSION_CONFLICT_RETRIES = 5   # CHALLENGE_STATE_MODE=shared : relectures max sur conflit
+
 @trade_bp.route('/api/price/<symbol>', methods=['GET'])
 def get_live_price(symbol):
+    if symbol.upper() not in TRADABLE_SYMBOLS:
+        return jsonify({"error": "UNKNOWN_SYMBOL", "symbol": symbol}), 404
     try:
-        if "-" in symbol:
-            y = get_yahoo_price(symbol)
-            if isinstance(y, dict) and 'price' in y:
-                return jsonify(y)
-            return jsonify({"error": "PRICE_SOURCE_FAILED", "symbol": symbol}), 502
-        else:
-            m = get_maroc_price(symbol)
-            if isinstance(m, dict) and 'price' in m:
-                return jsonify(m)
-            return jsonify({"error": "PRICE_SOURCE_FAILED", "symbol": symbol}), 502
+        quote = get_quote(symbol)
+        if quote:
+            return jsonify(quote)
+        return jsonify({"error": "PRICE_SOURCE_FAILED", "symbol": symbol}), 502
     except Exception as e:
         return jsonify({"error": "PRICE_FETCH_ERROR", "detail": str(e), "symbol": symbol}), 500
 
+@trade_bp.route('/api/prices', methods=['GET'])
+def get_live_prices():
+    """
+    Cotations de plusieurs symboles en une seule requête.
+    Query: ?symbols=BTC-USD,ETH-USD,IAM,ATW
+    """
+    symbols = [s.strip() for s in request.args.get('symbols', '').split(',') if s.strip()]
+    if not symbols:
+        return jsonify({"error": "MISSING_SYMBOLS"}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"error": "TOO_MANY_SYMBOLS", "max": MAX_BATCH_SYMBOLS}), 400
+    try:
+        quotes = get_quotes(symbols)
+        missing = [s for s in symbols if s.upper() not in quotes]
+        return jsonify({"quotes": quotes, "missing": missing})
+    except Exception as e:
+        return jsonify({"error": "PRICE_FETCH_ERROR", "detail": str(e)}), 500
+
 @trade_bp.route('/api/challenges/<cid>/trades', methods=['GET'])
 def list_trades(cid):
     try:
-        db_path = os.path.join(os.getcwd(), "tradesense.db")
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = get_read_connection()
         cur = conn.cursor()
         
         cur.execute("""
@@ -44,62 +63,28 @@ def list_trades(cid):
         
         rows = cur.fetchall()
         trades = []
+        # PnL latent des positions encore ouvertes (dernier marquage)
+        marks = {p['id']: p['unrealizedPnl'] for p in list_positions(cid)}
         for row in rows:
             t_dict = dict(row)
-            # Ensure proper types for JSON serialization if needed, though dict(row) usually suffices
+            if t_dict['id'] in marks:
+                t_dict['unrealizedPnl'] = marks[t_dict['id']]
             trades.append(t_dict)
             
-        conn.close()
         return jsonify(trades)
     except Exception as e:
         current_app.logger.error(f"TRADE_HISTORY_ERROR: {e}")
         return jsonify([]), 200 # Return empty list on error to avoid breaking frontend
 
 @trade_bp.route('/api/trades/execute', methods=['POST', 'OPTIONS'])
+@idempotent
 def handle_trade():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'OK'}), 200
     data = request.json
     cid = data.get('challengeId') or data.get('challenge_id')
-    store = getattr(current_app, "challenges_db", {})
-    challenge = store.get(cid)
-
-    # RECOVERY & VALIDATION
-    if not challenge:
-        # Fallback: Try loading from DB if server restarted
-        try:
-            db_path = os.path.join(os.getcwd(), "tradesense.db")
-            with sqlite3.connect(db_path) as conn:
-                row = conn.execute("SELECT * FROM user_challenges WHERE id = ?", (cid,)).fetchone()
-                if row:
-                    # Map DB columns (assuming standard schema order or using row factory if available, 
-                    # but here we use explicit index based on INSERT statement structure)
-                    # DB Cols: id, user_id, type, status, initial_balance, current_balance, equity, max_equity, 
-                    # daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, created_at, updated_at
-                    # Note: We must be careful with indices. Let's assume the INSERT order.
-                    # Actually safer to look up or just minimal fields needed for trade.
-                    # For safety, we will rely on key fields matching INSERT in this file.
-                    challenge = {
-                        "id": row[0],
-                        "userId": row[1],
-                        "type": row[2],
-                        "status": row[3],
-                        "initialBalance": row[4],
-                        "currentBalance": row[5],
-                        "equity": row[6],
-                        "maxEquity": row[7],
-                        "dailyStartingBalance": row[8],
-                        "profitTarget": row[9],
-                        "maxDailyLossLimit": row[10],
-                        "maxTotalLossLimit": row[11],
-                        "createdAt": row[12],
-                        "updatedAt": row[13],
-                        "dailyDate": datetime.now().date().isoformat() # Reset daily date tracking on reload
-                    }
-                    store[cid] = challenge
-                    current_app.challenges_db = store
-        except Exception as e:
-            current_app.logger.error(f"DB_RECOVERY_FAILED: {e}")
+    # Cache LRU, rechargé depuis la base si absent (ex: après redémarrage)
+    challenge = get_challenge(cid)
 
     if not challenge or challenge['status'] != "ACTIVE":
         return jsonify({"error": "TRADING_FORBIDDEN_INVALID_STATUS", "message": "Challenge must be ACTIVE"}), 403
@@ -114,139 +99,304 @@ def handle_trade():
     if sv <= 0:
         return jsonify({"error": "INVALID_TRADE_VOLUME"}), 400
 
-    locks = getattr(current_app, "challenge_locks", {})
-    if cid not in locks:
-        locks[cid] = Lock()
-    current_app.challenge_locks = locks
-    lock = locks[cid]
-    lock.acquire()
+    # SYSTEM TRUTH ENFORCEMENT: Ignore client price, read the server quote.
+    # Lecture du snapshot AVANT le verrou : aucune attente upstream sous lock.
+    symbol = data['symbol']
+    if symbol not in TRADABLE_SYMBOLS:
+        return jsonify({"error": "MARKET_PRICE_UNAVAILABLE", "message": "System could not verify price"}), 503
+    quote, price_error = get_trade_quote(symbol)
+    if not quote:
+        if price_error == "MARKET_PRICE_STALE":
+            return jsonify({"error": "MARKET_PRICE_STALE", "message": "Market price is too old to execute"}), 503
+        return jsonify({"error": "MARKET_PRICE_UNAVAILABLE", "message": "System could not verify price"}), 503
+    live_price = quote['price']
+
     try:
-        symbol = data['symbol']
-        # SYSTEM TRUTH ENFORCEMENT: Ignore client price, fetch from source
-        live_price = 0
-        
-        yf_symbols = {"BTC", "ETH", "BTC-USD", "ETH-USD", "AAPL", "TSLA"}
-        bvc_symbols = {"IAM", "ATW"}
-        
-        if symbol in yf_symbols:
-            y = get_yahoo_price(symbol)
-            if isinstance(y, dict) and 'price' in y:
-                live_price = y['price']
-        elif symbol in bvc_symbols:
-            m = get_maroc_price(symbol)
-            if isinstance(m, dict) and 'price' in m:
-                live_price = m['price']
-        
-        # Fallback pour symboles inconnus ou erreur fetch
-        if not isinstance(live_price, (int, float)) or live_price <= 0:
-             return jsonify({"error": "MARKET_PRICE_UNAVAILABLE", "message": "System could not verify price"}), 503
-        
-        result = execute_trade(
-            challenge, 
-            symbol, 
-            data['type'], 
-            live_price, 
-            sv
-        )
+        with challenge_lock(cid):
+            for _ in range(VERSION_CONFLICT_RETRIES):
+                # Relu sous le verrou : un trade concurrent a pu remplacer l'entrée du cache
+                challenge = get_challenge(cid)
+                if not challenge or challenge['status'] != "ACTIVE":
+                    return jsonify({"error": "TRADING_FORBIDDEN_INVALID_STATUS", "message": "Challenge must be ACTIVE"}), 403
+                # Copie : l'état en mémoire n'est remplacé qu'une fois le trade accepté en écriture
+                result = execute_trade(
+                    mark_challenge(dict(challenge)), 
+                    symbol, 
+                    data['type'], 
+                    live_price, 
+                    sv,
+                    hold=holds_positions(),
+                    exposure=open_exposure(cid)
+                )
         
-        if result[0] is None:
-            # Logic Failure (Insufficient funds, risk rules, etc.)
-            return jsonify({"error": "TRADE_REJECTED", "message": result[1]}), 400
+                if result[0] is None:
+                    # Logic Failure (Insufficient funds, risk rules, etc.)
+                    return jsonify({"error": "TRADE_REJECTED", "message": result[1]}), 400
             
-        trade, updated_challenge = result
-        db_path = os.path.join(os.getcwd(), "tradesense.db")
+                trade, updated_challenge = result
+                # Mise en file sous le verrou : l'ordre des trades d'un challenge est conservé
+                try:
+                    record = persist_trade(updated_challenge, trade, challenge.get('userId'))
+                except PersistenceBackpressure:
+                    response = jsonify({"error": "PERSISTENCE_BACKPRESSURE", "message": "Trade queue is full, retry shortly"})
+                    response.headers['Retry-After'] = '1'
+                    return response, 503
+                except VersionConflict:
+                    # Multi-worker : un autre process a modifié le challenge, relecture puis nouvel essai
+                    discard_challenge(cid)
+                    continue
+                track_trade(trade, updated_challenge)
+                put_challenge(updated_challenge, pending=record)
+                break
+            else:
+                response = jsonify({"error": "CHALLENGE_CONFLICT", "message": "Challenge updated concurrently, retry shortly"})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+    except LockTimeout:
+        response = jsonify({"error": "CHALLENGE_BUSY", "message": "Challenge is busy, retry shortly"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    try:
+        # Durabilité "commit" : attente du group commit, hors verrou
+        record.wait()
+    except Exception as e:
+        # LOG ONLY - DO NOT FAIL THE REQUEST
+        # For Module C demo, In-Memory consistency is priority over DB persistence if DB fails.
+        current_app.logger.error(f"DB_INSERT_ERROR (Non-Fatal): {e}")
+    
+    return jsonify({
+        "trade": trade,
+        "challenge": updated_challenge
+    })
+
+def _execute_orders(by_challenge, prices, results):
+    """
+    Exécute les ordres groupés par challenge (verrous tenus par l'appelant).
+    Remplit `results` et retourne (TradeRecord à persister, état final par challenge).
+    """
+    records = []
+    final = {}
+    for cid, items in by_challenge.items():
+        challenge = get_challenge(cid)
+        if not challenge or challenge['status'] != "ACTIVE":
+            for i, *_ in items:
+                results[i] = {"index": i, "challengeId": cid, "status": "REJECTED",
+                              "error": "TRADING_FORBIDDEN_INVALID_STATUS"}
+            continue
+        state = mark_challenge(dict(challenge))
+        exposure = open_exposure(cid)
+        hold = holds_positions()
+        executed = False
+        for i, symbol, t, sv in items:
+            if state['status'] != "ACTIVE":
+                # Stop-on-failure : le challenge vient de passer FAILED/PASSED
+                results[i] = {"index": i, "challengeId": cid, "status": "SKIPPED",
+                              "error": "CHALLENGE_CLOSED", "challengeStatus": state['status']}
+                continue
+            live_price, price_error = prices[symbol]
+            if live_price is None:
+                results[i] = {"index": i, "challengeId": cid, "status": "REJECTED", "error": price_error}
+                continue
+            trade, outcome = execute_trade(state, symbol, t, live_price, sv, hold=hold, exposure=exposure)
+            if trade is None:
+                results[i] = {"index": i, "challengeId": cid, "status": "REJECTED",
+                              "error": "TRADE_REJECTED", "message": outcome}
+                continue
+            state = outcome
+            if trade['status'] == "OPEN":
+                exposure += trade['entryPrice'] * trade['size']
+            executed = True
+            records.append(TradeRecord(state, trade, challenge.get('userId')))
+            results[i] = {"index": i, "challengeId": cid, "status": "EXECUTED", "trade": trade}
+        if executed:
+            final[cid] = state
+    return records, final
+
+@trade_bp.route('/api/trades/execute-batch', methods=['POST', 'OPTIONS'])
+@idempotent
+def handle_trade_batch():
+    """
+    Exécute une liste d'ordres (un ou plusieurs challenges) en une requête.
+    Body: {"orders": [{"challengeId", "symbol", "type", "size"}, ...]}
+
+    - un prix serveur par symbole distinct, lu avant les verrous
+    - les ordres d'un challenge s'exécutent dans l'ordre, sous une seule
+      prise de verrou ; dès que le challenge passe FAILED/PASSED, ses
+      ordres suivants sont SKIPPED
+    - tous les trades sont persistés dans une seule transaction
+    Réponse: un résultat par ordre (EXECUTED, REJECTED, SKIPPED, INVALID).
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'OK'}), 200
+    data = request.get_json(silent=True) or {}
+    orders = data.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify({"error": "MISSING_ORDERS"}), 400
+    if len(orders) > MAX_BATCH_ORDERS:
+        return jsonify({"error": "TOO_MANY_ORDERS", "max": MAX_BATCH_ORDERS}), 400
+
+    results = [None] * len(orders)
+    by_challenge = {}   # cid -> [(index, symbol, type, size)], ordre de la requête
+    for i, order in enumerate(orders):
+        order = order if isinstance(order, dict) else {}
+        cid = order.get('challengeId') or order.get('challenge_id')
+        t = order.get('type') or order.get('side')
+        symbol = order.get('symbol')
         try:
-            conn = sqlite3.connect(db_path)
-            conn.execute("PRAGMA foreign_keys = ON")
-            cur = conn.cursor()
-            uid = updated_challenge.get('userId') or challenge.get('userId')
-            if uid:
-                cur.execute("SELECT 1 FROM users WHERE id = ?", (uid,))
-                if not cur.fetchone():
-                    cur.execute("INSERT INTO users (id, name, email, is_admin) VALUES (?, ?, ?, ?)", (uid, uid, f"{uid}@local", 0))
-            cid_row = cur.execute("SELECT 1 FROM user_challenges WHERE id = ?", (updated_challenge['id'],)).fetchone()
-            if not cid_row:
-                cur.execute(
-                    "INSERT INTO user_challenges (id, user_id, type, status, initial_balance, current_balance, equity, max_equity, daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (
-                        updated_challenge['id'],
-                        uid,
-                        updated_challenge['type'],
-                        updated_challenge['status'],
-                        updated_challenge['initialBalance'],
-                        updated_challenge['currentBalance'],
-                        updated_challenge['equity'],
-                        updated_challenge['maxEquity'],
-                        updated_challenge['dailyStartingBalance'],
-                        updated_challenge['profitTarget'],
-                        updated_challenge['maxDailyLossLimit'],
-                        updated_challenge['maxTotalLossLimit'],
-                        updated_challenge['createdAt'],
-                        updated_challenge['updatedAt'],
-                    ),
-                )
+            sv = float(order.get('size') or order.get('volume'))
+        except (TypeError, ValueError):
+            sv = 0
+        error = None
+        if not cid:
+            error = "MISSING_CHALLENGE_ID"
+        elif t not in {"BUY", "SELL"}:
+            error = "INVALID_TRADE_TYPE"
+        elif sv <= 0:
+            error = "INVALID_TRADE_VOLUME"
+        elif symbol not in TRADABLE_SYMBOLS:
+            error = "MARKET_PRICE_UNAVAILABLE"
+        if error:
+            results[i] = {"index": i, "challengeId": cid, "status": "INVALID", "error": error}
+            continue
+        by_challenge.setdefault(cid, []).append((i, symbol, t, sv))
+
+    # SYSTEM TRUTH ENFORCEMENT : un snapshot par symbole, hors verrou
+    prices = {}
+    for symbol in {item[1] for items in by_challenge.values() for item in items}:
+        quote, price_error = get_trade_quote(symbol)
+        prices[symbol] = (quote['price'], None) if quote else (None, price_error or "MARKET_PRICE_UNAVAILABLE")
+
+    try:
+        with challenge_locks(list(by_challenge)):
+            for _ in range(VERSION_CONFLICT_RETRIES):
+                records, final = _execute_orders(by_challenge, prices, results)
+                if records:
+                    try:
+                        persist_trades(records)
+                    except PersistenceBackpressure:
+                        response = jsonify({"error": "PERSISTENCE_BACKPRESSURE", "message": "Trade queue is full, retry shortly"})
+                        response.headers['Retry-After'] = '1'
+                        return response, 503
+                    except VersionConflict as e:
+                        # Multi-worker : rien n'a été écrit, on relit les challenges modifiés et on rejoue le lot
+                        for cid in e.challenge_ids:
+                            discard_challenge(cid)
+                        continue
+                for record in records:
+                    track_trade(record.trade, final[record.challenge['id']])
+                for state in final.values():
+                    put_challenge(state, pending=records[-1])
+                break
             else:
-                cur.execute(
-                    "UPDATE user_challenges SET status = ?, current_balance = ?, equity = ?, max_equity = ?, daily_starting_balance = ?, updated_at = ? WHERE id = ?",
-                    (
-                        updated_challenge['status'],
-                        updated_challenge['currentBalance'],
-                        updated_challenge['equity'],
-                        updated_challenge['maxEquity'],
-                        updated_challenge['dailyStartingBalance'],
-                        updated_challenge['updatedAt'],
-                        updated_challenge['id'],
-                    ),
-                )
-            cur.execute(
-                "INSERT INTO trades (id, challenge_id, symbol, side, entry_price, exit_price, lots, pnl, status, opened_at, closed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (
-                    trade['id'],
-                    updated_challenge['id'],
-                    trade['symbol'],
-                    trade['type'],
-                    trade['entryPrice'],
-                    trade['exitPrice'],
-                    trade['size'],
-                    trade['pnl'],
-                    trade['status'],
-                    trade['openedAt'],
-                    trade['closedAt'],
-                ),
-            )
-            conn.commit()
+                response = jsonify({"error": "CHALLENGE_CONFLICT", "message": "Challenges updated concurrently, retry shortly"})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+    except LockTimeout:
+        response = jsonify({"error": "CHALLENGE_BUSY", "message": "Challenge is busy, retry shortly"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    if records:
+        try:
+            # Une seule transaction pour tout le lot : attendre le dernier suffit
+            records[-1].wait()
         except Exception as e:
-            if conn:
-                conn.rollback()
-                conn.close()
-            # LOG ONLY - DO NOT FAIL THE REQUEST
-            # For Module C demo, In-Memory consistency is priority over DB persistence if DB fails.
             current_app.logger.error(f"DB_INSERT_ERROR (Non-Fatal): {e}")
-            # return jsonify({"error": "DB_INSERT_ERROR", "detail": str(e)}), 500 -> REMOVED
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
-        store[cid] = updated_challenge
-        current_app.challenges_db = store
-    finally:
-        lock.release()
-    
+
+    return jsonify({
+        "results": results,
+        "executed": len(records),
+        "challenges": final,
+    })
+
+@trade_bp.route('/api/trades/<tid>/close', methods=['POST', 'OPTIONS'])
+@idempotent
+def handle_close(tid):
+    """Clôture une position ouverte au prix serveur courant."""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'OK'}), 200
+    found = find_position(tid)
+    if found is None:
+        return jsonify({"error": "POSITION_NOT_FOUND", "message": "No open position with this id"}), 404
+    cid = found[0]['challengeId']
+
+    # Prix serveur lu avant le verrou, comme pour l'ouverture
+    quote, price_error = get_trade_quote(found[0]['symbol'])
+    if not quote:
+        return jsonify({"error": price_error, "message": "System could not verify price"}), 503
+    live_price = quote['price']
+
+    try:
+        with challenge_lock(cid):
+            for _ in range(VERSION_CONFLICT_RETRIES):
+                challenge = get_challenge(cid)
+                # Relue sous le verrou : une liquidation a pu la clôturer entre-temps
+                found = find_position(tid)
+                if not challenge or found is None:
+                    return jsonify({"error": "POSITION_NOT_FOUND", "message": "No open position with this id"}), 404
+                position, _, unrealized = found
+                trade, updated_challenge = close_position(mark_challenge(dict(challenge)), position, live_price, unrealized)
+                try:
+                    record = persist_trade(updated_challenge, trade, challenge.get('userId'))
+                except PersistenceBackpressure:
+                    response = jsonify({"error": "PERSISTENCE_BACKPRESSURE", "message": "Trade queue is full, retry shortly"})
+                    response.headers['Retry-After'] = '1'
+                    return response, 503
+                except VersionConflict:
+                    discard_challenge(cid)
+                    continue
+                release_position(tid, updated_challenge)
+                put_challenge(updated_challenge, pending=record)
+                break
+            else:
+                response = jsonify({"error": "CHALLENGE_CONFLICT", "message": "Challenge updated concurrently, retry shortly"})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+    except LockTimeout:
+        response = jsonify({"error": "CHALLENGE_BUSY", "message": "Challenge is busy, retry shortly"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    try:
+        record.wait()
+    except Exception as e:
+        current_app.logger.error(f"DB_INSERT_ERROR (Non-Fatal): {e}")
+    try:
+        # Stop-loss / take-profit de la position devenus sans objet
+        cancel_position_orders(cid, tid)
+    except Exception as e:
+        current_app.logger.error(f"ORDER_CANCEL_ERROR (Non-Fatal): {e}")
+
     return jsonify({
         "trade": trade,
         "challenge": updated_challenge
     })
 
+@trade_bp.route('/api/challenges/<cid>/positions', methods=['GET'])
+def get_positions(cid):
+    """Positions ouvertes (dernier prix, PnL latent) et equity marquée du challenge."""
+    challenge = get_challenge(cid)
+    if not challenge:
+        return jsonify({"error": "CHALLENGE_NOT_FOUND"}), 404
+    return jsonify({
+        "positions": list_positions(cid),
+        "challenge": mark_challenge(dict(challenge)),
+    })
+
 @trade_bp.route('/api/challenges/register', methods=['POST'])
 def register_challenge():
     data = request.json
     cid = data.get('id')
     if not cid:
         return jsonify({"error": "MISSING_ID"}), 400
-    store = getattr(current_app, "challenges_db", {})
-    store[cid] = data
-    current_app.challenges_db = store
+    try:
+        put_challenge(data, persist=True)
+    except Exception as e:
+        current_app.logger.error(f"CHALLENGE_REGISTER_PERSIST_ERROR (Non-Fatal): {e}")
+        put_challenge(data)
+    return jsonify({"status": "SUCCESS", "challenge": data})
+
 @trade_bp.route('/trade/execute', methods=['POST', 'OPTIONS'])
 def emergency_execute():
     if request.method == 'OPTIONS':
@@ -256,7 +406,6 @@ def emergency_execute():
         data = request.json
         import uuid
         import time
-        import sqlite3
         
         # 1. Extraction (Map requested fields to DB schema)
         # User requested: user_id, symbol, side, price, quantity
@@ -269,14 +418,12 @@ def emergency_execute():
         qty = data.get('quantity')
         
         # 2. Insert DB Direct (Atomic, no checks)
-        db_path = os.path.join(os.getcwd(), "tradesense.db")
-        with sqlite3.connect(db_path) as conn:
+        with transaction() as conn:
             cur = conn.cursor()
             cur.execute(
                 "INSERT INTO trades (id, challenge_id, symbol, side, entry_price, lots, status, opened_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
                 (str(uuid.uuid4()), c_id, symbol, side, price, qty, 'OPEN', datetime.now(timezone.utc).isoformat())
             )
-            conn.commit()
         
         # 3. Return Success ALWAYS
         return jsonify({
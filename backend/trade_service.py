@@ -3,14 +3,15 @@ import uuid
 from datetime import datetime, timezone
 from backend.challenge_evaluator import evaluate_after_trade
 
-def execute_trade(challenge, symbol, trade_type, price, size):
+def execute_trade(challenge, symbol, trade_type, price, size, hold=False, exposure=0.0):
     """
     Exécute un trade réel dans le contexte d'une Prop Firm.
     
     Logique:
     - BUY: Ouvre une position LONG (parie sur la hausse)
     - SELL: Ouvre une position SHORT (parie sur la baisse)
-    - Les positions sont fermées immédiatement avec un slippage simulé
+    - Sans `hold`, les positions sont fermées immédiatement avec un slippage simulé
+    - Avec `hold`, la position reste OPEN (valorisée par position_book)
     
     Args:
         challenge: État du challenge actuel
@@ -18,6 +19,8 @@ def execute_trade(challenge, symbol, trade_type, price, size):
         trade_type: "BUY" ou "SELL"
         price: Prix du marché en temps réel (récupéré côté serveur)
         size: Taille de la position (lots)
+        hold: Garder la position ouverte
+        exposure: Notionnel des positions déjà ouvertes (déduit de l'equity disponible)
     
     Returns:
         (trade, updated_challenge) ou (None, error_message)
@@ -31,18 +34,32 @@ def execute_trade(challenge, symbol, trade_type, price, size):
     
     # Check Solde (Règle de risque)
     trade_cost = price * size
-    current_equity = challenge.get('equity', 0)
+    current_equity = challenge.get('equity', 0) - exposure
     if trade_cost > current_equity:
         return None, f"Insufficient equity ({current_equity:.2f}) for trade cost ({trade_cost:.2f})"
     
-    # Reset journalier basé sur la date UTC
+    # Le départ journalier est rebasé par la bascule planifiée (trading_day_service)
     now_utc = datetime.now(timezone.utc)
-    today_str = now_utc.date().isoformat()
-    if challenge.get('dailyDate') != today_str:
-        challenge['dailyDate'] = today_str
-        # Le point de départ journalier devient l'équité courante au début de la journée
-        challenge['dailyStartingBalance'] = challenge.get('equity', challenge['initialBalance'])
     
+    if hold:
+        # Position ouverte au prix du marché : PnL latent nul jusqu'au prochain tick
+        challenge['updatedAt'] = now_utc.isoformat()
+        challenge = evaluate_after_trade(challenge)
+        trade = {
+            "id": str(uuid.uuid4()),
+            "challengeId": challenge['id'],
+            "symbol": symbol,
+            "type": trade_type,
+            "entryPrice": price,
+            "exitPrice": None,
+            "size": size,
+            "pnl": 0.0,
+            "status": "OPEN",
+            "openedAt": now_utc.isoformat(),
+            "closedAt": None
+        }
+        return trade, challenge
+
     # Simulation de l'exécution du trade
     import random
     
@@ -86,3 +103,31 @@ def execute_trade(challenge, symbol, trade_type, price, size):
     }
     
     return trade, challenge
+
+
+def close_position(challenge, position, exit_price, unrealized_pnl=0.0):
+    """
+    Clôture une position ouverte au prix `exit_price`.
+
+    Le PnL réalisé passe dans le solde ; `unrealized_pnl` est le PnL latent
+    de la position déjà compté dans l'equity du challenge (dernier marquage).
+
+    Returns:
+        (trade clôturé, updated_challenge)
+    """
+    now_utc = datetime.now(timezone.utc)
+    size = position['size']
+    if position['type'] == "BUY":
+        pnl = (exit_price - position['entryPrice']) * size
+    else:
+        pnl = (position['entryPrice'] - exit_price) * size
+
+    challenge['currentBalance'] += pnl
+    challenge['equity'] += pnl - unrealized_pnl
+    challenge['maxEquity'] = max(challenge['maxEquity'], challenge['equity'])
+    challenge['updatedAt'] = now_utc.isoformat()
+    if challenge['status'] == "ACTIVE":
+        challenge = evaluate_after_trade(challenge)
+
+    trade = dict(position, exitPrice=exit_price, pnl=pnl, status="CLOSED", closedAt=now_utc.isoformat())
+    return trade, challenge
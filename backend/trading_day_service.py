@@ -1,18 +1,242 @@
+"""
+Journée de trading des challenges et bascule quotidienne du
+daily_starting_balance.
 
-from datetime import datetime, timezone
+La perte journalière se mesure depuis daily_starting_balance, l'equity au
+début de la journée de trading du plan : minuit UTC par défaut, ou
+minuit d'un autre fuseau pour les plans listés dans TRADING_DAY_TIMEZONES
+(ex: "ELITE=Africa/Casablanca").
 
-def check_and_reset_trading_day(challenge):
+Au lieu d'un test de date à chaque trade, un thread planifié fait la
+bascule à chaque changement de jour d'un fuseau :
+  1. les challenges en cache, et ceux qui ont des positions ouvertes,
+     sont rebasés sous leur verrou sur leur equity en mémoire (marquée) ;
+  2. l'écrivain des trades est vidé, puis un seul UPDATE ensembliste
+     rebascule en base tous les challenges ACTIVE du fuseau dont
+     daily_date est antérieure au jour courant.
+
+La bascule est idempotente (condition sur daily_date) : au démarrage elle
+rattrape les jours manqués pendant un arrêt, et plusieurs workers peuvent
+l'exécuter sans double effet. Sans le thread (DAILY_ROLLOVER_ENABLED=0),
+le départ journalier n'est plus rebasé.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.challenge_store import cached_challenge_ids, get_challenge, put_challenge
+from backend.db import release_thread_connections, transaction
+from backend.lock_manager import LockTimeout, challenge_lock
+from backend.position_book import challenges_with_positions, mark_challenge, sync_challenge
+from backend.reload_challenge_service import wait_until_ready
+from backend.trade_persistence import flush_trade_writer
+
+DEFAULT_ZONE = "UTC"
+ROLLOVER_GRACE = 1.0        # secondes après minuit avant la bascule
+MAX_SLEEP = 300.0           # réveil périodique (changement d'heure, horloge ajustée)
+REBASE_LOCK_TIMEOUT = 2.0
+
+# version incrémentée comme pour toute écriture de la ligne (empreinte du snapshot des challenges)
+ROLLOVER_SQL = (
+    "UPDATE user_challenges SET daily_starting_balance = equity, daily_date = ?, version = version + 1 "
+    "WHERE status = 'ACTIVE' AND (daily_date IS NULL OR daily_date < ?)"
+)
+
+_plan_zones = {}    # plan -> nom de fuseau (hors UTC)
+_zones = {DEFAULT_ZONE: timezone.utc}
+_stats = {"runs": 0, "rebased": 0, "rows": 0, "lastRun": None}
+_stats_lock = threading.Lock()
+
+
+def parse_plan_zones(spec):
+    """"ELITE=Africa/Casablanca,PRO=UTC" -> {"ELITE": "Africa/Casablanca", "PRO": "UTC"}."""
+    zones = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        plan, sep, zone = item.partition("=")
+        if not sep or not plan.strip() or not zone.strip():
+            raise ValueError(f"TRADING_DAY_TIMEZONES invalide : {item!r}")
+        zones[plan.strip().upper()] = zone.strip()
+    return zones
+
+
+def configure_trading_day(config):
+    """Lit TRADING_DAY_TIMEZONES (fuseau de la journée de trading par plan)."""
+    from zoneinfo import ZoneInfo
+
+    global _plan_zones
+    plan_zones = parse_plan_zones(config.get("TRADING_DAY_TIMEZONES", ""))
+    for name in set(plan_zones.values()) - set(_zones):
+        _zones[name] = ZoneInfo(name)
+    _plan_zones = plan_zones
+    return dict(_plan_zones)
+
+
+def zone_of(plan):
+    return _plan_zones.get(str(plan or "").upper(), DEFAULT_ZONE)
+
+
+def trading_date(plan=None, now=None):
+    """Jour de trading courant (YYYY-MM-DD) d'un plan."""
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(_zones[zone_of(plan)]).date().isoformat()
+
+
+def _zone_groups():
+    """Nom de fuseau -> plans ; None = tous les plans non listés (UTC)."""
+    groups = {DEFAULT_ZONE: None}
+    for plan, zone in _plan_zones.items():
+        if zone != DEFAULT_ZONE:
+            groups.setdefault(zone, []).append(plan)
+    return groups
+
+
+def next_boundary(now=None):
+    """Prochain minuit (UTC) parmi les fuseaux utilisés."""
+    now = now or datetime.now(timezone.utc)
+    boundaries = []
+    for name in _zone_groups():
+        local = now.astimezone(_zones[name])
+        midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time(), tzinfo=_zones[name])
+        boundaries.append(midnight.astimezone(timezone.utc))
+    return min(boundaries)
+
+
+def _rebase(cid, now, lock_timeout):
+    """Rebase un challenge en mémoire sur son equity marquée ; True si modifié."""
+    try:
+        with challenge_lock(cid, timeout=lock_timeout):
+            challenge = get_challenge(cid)
+            if not challenge or challenge['status'] != "ACTIVE":
+                return False
+            today = trading_date(challenge.get('type'), now)
+            if (challenge.get('dailyDate') or "") >= today:
+                return False
+            state = mark_challenge(dict(challenge))
+            state['dailyStartingBalance'] = state['equity']
+            state['dailyDate'] = today
+            # Écrit en base avec le prochain trade ; l'UPDATE ensembliste couvre d'ici là
+            put_challenge(state)
+            sync_challenge(state)
+            return True
+    except LockTimeout:
+        return False
+
+
+def roll_over(now=None, lock_timeout=REBASE_LOCK_TIMEOUT):
     """
-    Reset le daily_starting_balance si nous avons changé de jour UTC.
-    Indispensable pour le calcul correct du daily drawdown.
+    Bascule journalière de tous les challenges ACTIVE dont le jour de
+    trading a changé (voir module). Retourne compteurs et durées.
     """
-    now_utc = datetime.now(timezone.utc)
-    last_update = datetime.fromisoformat(challenge['updatedAt'].replace('Z', '+00:00'))
-    
-    if now_utc.date() > last_update.date():
-        # Nouveau jour de trading
-        challenge['dailyStartingBalance'] = challenge['equity']
-        challenge['updatedAt'] = now_utc.isoformat()
-        return True, challenge
-        
-    return False, challenge
+    now = now or datetime.now(timezone.utc)
+    started = time.perf_counter()
+
+    ids = dict.fromkeys(cached_challenge_ids())
+    ids.update(dict.fromkeys(challenges_with_positions()))
+    rebased = sum(1 for cid in ids if _rebase(cid, now, lock_timeout))
+    cached = time.perf_counter()
+
+    # Les états en file (antérieurs au rebasage) sont commités avant l'UPDATE
+    flush_trade_writer()
+    rows = 0
+    configured = sorted(_plan_zones)
+    with transaction() as conn:
+        for name, plans in _zone_groups().items():
+            today = trading_date(plans[0] if plans else None, now)
+            if plans is None:
+                sql, params = ROLLOVER_SQL, [today, today]
+                if configured:
+                    sql += f" AND type NOT IN ({', '.join('?' * len(configured))})"
+                    params += configured
+            else:
+                sql = ROLLOVER_SQL + f" AND type IN ({', '.join('?' * len(plans))})"
+                params = [today, today] + sorted(plans)
+            rows += conn.execute(sql, params).rowcount
+    finished = time.perf_counter()
+
+    result = {
+        "rebased": rebased,
+        "rows": rows,
+        "cacheMs": round((cached - started) * 1000, 2),
+        "updateMs": round((finished - cached) * 1000, 2),
+    }
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["rebased"] += rebased
+        _stats["rows"] += rows
+        _stats["lastRun"] = dict(result, at=now.isoformat())
+    return result
+
+
+class RolloverScheduler(threading.Thread):
+    """Bascule au démarrage (rattrapage), puis à chaque minuit d'un fuseau."""
+
+    def __init__(self):
+        super().__init__(name="trading-day-rollover", daemon=True)
+        self._stop_event = threading.Event()
+
+    def _dates(self, now):
+        return {name: trading_date(plans[0] if plans else None, now) for name, plans in _zone_groups().items()}
+
+    def _run_once(self):
+        try:
+            print(f"[ROLLOVER] {roll_over()}")
+        except Exception as e:
+            print(f"[ROLLOVER_ERROR] {e}")
+
+    def run(self):
+        try:
+            # Bascule après le préchargement : les challenges préchargés sont rebasés en mémoire
+            wait_until_ready()
+            self._run_once()
+            dates = self._dates(datetime.now(timezone.utc))
+            while True:
+                now = datetime.now(timezone.utc)
+                delay = (next_boundary(now) - now).total_seconds() + ROLLOVER_GRACE
+                if self._stop_event.wait(min(max(delay, 0.0), MAX_SLEEP)):
+                    return
+                current = self._dates(datetime.now(timezone.utc))
+                if current != dates:
+                    self._run_once()
+                    dates = current
+        finally:
+            release_thread_connections()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_scheduler = None
+
+
+def start_rollover_scheduler(config):
+    """Démarre la bascule planifiée si DAILY_ROLLOVER_ENABLED (idempotent)."""
+    global _scheduler
+    if not config.get("DAILY_ROLLOVER_ENABLED", True) or _scheduler is not None:
+        return _scheduler
+    _scheduler = RolloverScheduler()
+    _scheduler.start()
+    return _scheduler
+
+
+def stop_rollover_scheduler(timeout=2.0):
+    global _scheduler
+    scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.stop()
+        scheduler.join(timeout)
+
+
+def get_trading_day_stats():
+    now = datetime.now(timezone.utc)
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update(
+        zones={name: trading_date(plans[0] if plans else None, now) for name, plans in _zone_groups().items()},
+        planZones=dict(_plan_zones),
+        nextBoundary=next_boundary(now).isoformat(),
+        scheduler=_scheduler is not None and _scheduler.is_alive(),
+    )
+    return stats
@@ -0,0 +1,143 @@
+"""
+Benchmark du fetcher asyncio contre un stub HTTP local à latence fixe.
+
+Le stub répond à l'API chart Yahoo (/v8/finance/chart/<SYM>) et sert
+les pages LeBoursier enregistrées, chaque réponse étant retardée de
+--latency ms (aller-retour upstream simulé). On compare, pour N symboles :
+  - séquentiel : une requête après l'autre sur une session requests
+  - asyncio    : AsyncMarketFetcher.fetch(), toutes les requêtes en parallèle
+
+Usage:
+    python benchmarks/bench_async_fetcher.py [--symbols 20] [--latency 80] [--rounds 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from backend.maroc_extractors import extract_price
+from backend.market_data_async import AsyncMarketFetcher
+from backend.market_data_maroc import LEBOURSIER_PATHS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "leboursier")
+CHART_PREFIX = "/v8/finance/chart/"
+
+
+class _Server(ThreadingHTTPServer):
+    # Backlog suffisant pour N connexions ouvertes en même temps
+    request_queue_size = 128
+
+
+class LatencyStub:
+    """Stub HTTP/1.1 (un thread par connexion) avec latence par requête."""
+
+    def __init__(self, latency):
+        self.pages = {}
+        for symbol, path in LEBOURSIER_PATHS.items():
+            with open(os.path.join(FIXTURES_DIR, f"{symbol}.html"), "rb") as f:
+                self.pages[path] = f.read()
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(latency)
+                path = self.path.split("?", 1)[0]
+                if path.startswith(CHART_PREFIX):
+                    symbol = path[len(CHART_PREFIX):]
+                    body = json.dumps({"chart": {"result": [{"meta": {
+                        "symbol": symbol, "currency": "USD", "regularMarketPrice": 100.0 + len(symbol),
+                    }}]}}).encode()
+                    content_type = "application/json"
+                else:
+                    body = stub.pages.get(path)
+                    content_type = "text/html; charset=utf-8"
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _Server(("127.0.0.1", 0), Handler)
+        self.base_url = "http://127.0.0.1:%d" % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def sequential_fetch(session, base_url, by_source):
+    """Ancien modèle : un appel bloquant par symbole, l'un après l'autre."""
+    quotes = {}
+    for symbol in by_source.get("yahoo", []):
+        resp = session.get(f"{base_url}{CHART_PREFIX}{symbol}", params={"interval": "1m", "range": "1d"}, timeout=5)
+        quotes[symbol] = resp.json()["chart"]["result"][0]["meta"]["regularMarketPrice"]
+    for symbol in by_source.get("maroc", []):
+        resp = session.get(base_url + LEBOURSIER_PATHS[symbol], timeout=5)
+        quotes[symbol] = extract_price(resp.text)
+    return quotes
+
+
+def bench(label, fn, rounds):
+    fn()  # warm-up (connexions ouvertes)
+    samples = []
+    for _ in range(rounds):
+        t = time.perf_counter()
+        quotes = fn()
+        samples.append(time.perf_counter() - t)
+    print(f"{label:<12}{len(quotes):>8}{statistics.median(samples) * 1000:>12.1f}{max(samples) * 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=80, help="latence par requête (ms)")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    maroc = sorted(LEBOURSIER_PATHS)
+    yahoo = [f"SYM{i:02d}" for i in range(max(0, args.symbols - len(maroc)))]
+    by_source = {"yahoo": yahoo, "maroc": maroc}
+
+    with LatencyStub(args.latency / 1000) as stub:
+        print(f"{len(yahoo) + len(maroc)} symboles, latence {args.latency:.0f} ms par requête")
+        print(f"{'mode':<12}{'cotés':>8}{'médiane ms':>12}{'max ms':>12}")
+
+        session = requests.Session()
+        bench("séquentiel", lambda: sequential_fetch(session, stub.base_url, by_source), args.rounds)
+        session.close()
+
+        fetcher = AsyncMarketFetcher(yahoo_url=stub.base_url + CHART_PREFIX, leboursier_url=stub.base_url)
+        try:
+            bench("asyncio", lambda: fetcher.fetch(by_source, deadline=5.0)[0], args.rounds)
+        finally:
+            fetcher.close()
+
+
+if __name__ == "__main__":
+    main()
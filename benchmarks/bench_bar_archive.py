@@ -0,0 +1,65 @@
+"""
+Benchmark de l'archive de bougies mappée en mémoire.
+
+Remplit (hors-ligne, source stub) un an de bougies 1m pour un symbole
+dans un répertoire temporaire, puis mesure des requêtes par plage
+(1 jour, 1 semaine, 1 mois, 1 an) : latence et mémoire Python allouée
+(tracemalloc), pour vérifier que le fichier n'est pas chargé dans le tas.
+
+Usage:
+    python benchmarks/bench_bar_archive.py [--days 365] [--symbol BTC-USD]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.bar_archive import BarArchive, backfill
+
+
+def timed_range(archive, symbol, start, end, repeat=20):
+    archive.read_range(symbol, "1m", start, end)  # warm-up (memmap ouvert)
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        bars = archive.read_range(symbol, "1m", start, end)
+        samples.append(time.perf_counter() - t)
+    tracemalloc.start()
+    bars = archive.read_range(symbol, "1m", start, end)
+    closes_max = float(bars["close"].max()) if len(bars) else 0.0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(bars), min(samples), peak, closes_max
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--symbol", default="BTC-USD")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        archive = BarArchive(root)
+        now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        t = time.perf_counter()
+        added = backfill(archive, args.symbol, "1m", args.days, offline=True, now=now)
+        fill_s = time.perf_counter() - t
+        size_mb = os.path.getsize(archive.path(args.symbol, "1m")) / 1e6
+        print(f"backfill: {added} bougies 1m ({size_mb:.1f} Mo) en {fill_s:.2f}s")
+
+        end = archive.last_ts(args.symbol, "1m")
+        print(f"{'plage':<10}{'bougies':>10}{'latence ms':>12}{'tas KiB':>10}{'(max close)':>14}")
+        for label, seconds in (("1 jour", 86400), ("1 semaine", 7 * 86400),
+                               ("1 mois", 30 * 86400), ("1 an", 365 * 86400)):
+            n, best, peak, cmax = timed_range(archive, args.symbol, end - seconds, end)
+            print(f"{label:<10}{n:>10}{best * 1000:>12.3f}{peak / 1024:>10.1f}{cmax:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
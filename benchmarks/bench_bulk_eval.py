@@ -0,0 +1,101 @@
+"""
+Benchmark de la réévaluation en masse des challenges ACTIVE.
+
+--challenges challenges ACTIVE sont créés dans une base temporaire
+(schema.sql), dont ~1 % en dépassement de perte et ~1 % à l'objectif :
+  - dicts    : un evaluate_after_trade par challenge (comme si chacun
+               était réévalué un par un), sans écriture
+  - colonnes : risk_evaluator.evaluate_all (chargement en colonnes NumPy,
+               calcul vectorisé, UPDATE groupé des changements)
+
+Usage:
+    python benchmarks/bench_bulk_eval.py [--challenges 100000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import db
+from backend.challenge_evaluator import evaluate_after_trade
+from backend.challenge_store import SELECT_CHALLENGE_SQL, challenge_from_row
+from backend.risk_evaluator import evaluate_all
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOW = "2025-01-01T00:00:00+00:00"
+
+
+def seed(path, count):
+    rng = random.Random(42)
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        conn = sqlite3.connect(path)
+        conn.executescript(f.read())
+    rows = []
+    for n in range(count):
+        roll = rng.random()
+        if roll < 0.01:
+            equity = 4400.0              # perte totale > 500
+        elif roll < 0.02:
+            equity = 5600.0              # objectif > 500
+        else:
+            equity = 5000.0 + rng.uniform(-200, 200)
+        rows.append((f"bench-{n}", "bench", "STARTER", "ACTIVE", 5000.0, equity, equity, max(equity, 5000.0),
+                     5000.0, 500.0, 250.0, 500.0, NOW, NOW))
+    conn.execute("INSERT INTO users (id, name, email) VALUES ('bench', 'bench', 'bench@local')")
+    conn.executemany(
+        "INSERT INTO user_challenges (id, user_id, type, status, initial_balance, current_balance, equity, "
+        "max_equity, daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, "
+        "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_dicts(count):
+    conn = db.get_read_connection()
+    started = time.perf_counter()
+    rows = conn.execute(SELECT_CHALLENGE_SQL.replace("WHERE id = ?", "WHERE status = 'ACTIVE'")).fetchall()
+    challenges = [challenge_from_row(row) for row in rows]
+    loaded = time.perf_counter()
+    changed = sum(1 for c in challenges if evaluate_after_trade(dict(c))["status"] != "ACTIVE")
+    finished = time.perf_counter()
+    conn.rollback()
+    return changed, loaded - started, finished - loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--challenges", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="tradesense-bulk-") as workdir:
+        path = os.path.join(workdir, "bench.db")
+        seed(path, args.challenges)
+        db.configure_db({"SQLITE_PATH": path})
+
+        changed, load_s, eval_s = run_dicts(args.challenges)
+        print(f"challenges ACTIVE : {args.challenges}")
+        print(f"  dicts    : chargement {load_s * 1000:8.1f} ms  évaluation {eval_s * 1000:8.1f} ms  "
+              f"changements {changed}")
+
+        result = evaluate_all()
+        total = result["loadMs"] + result["computeMs"] + result["writeMs"]
+        print(f"  colonnes : chargement {result['loadMs']:8.1f} ms  calcul {result['computeMs']:8.1f} ms  "
+              f"écriture {result['writeMs']:8.1f} ms  total {total:8.1f} ms")
+        print(f"             FAILED {result['failed']}  PASSED {result['passed']}  ignorés {result['skipped']}")
+
+        again = evaluate_all()
+        print(f"  2e passage (plus aucun changement) : {again['loadMs'] + again['computeMs'] + again['writeMs']:.1f} ms"
+              f"  évalués {again['evaluated']}")
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark des accès SQLite : connexion par requête vs connexions partagées.
+
+Deux bases temporaires créées depuis schema.sql et remplies à l'identique
+(un challenge, --trades trades). Pendant --seconds secondes, --readers
+threads lisent l'historique des trades (requête de list_trades) pendant
+qu'un thread écrivain insère des trades (comme handle_trade) :
+  - legacy : sqlite3.connect() + close() à chaque requête, journal rollback
+  - pool   : backend.db (connexions par thread, WAL, lecteurs read-only)
+
+Usage:
+    python benchmarks/bench_db.py [--readers 4] [--seconds 3] [--trades 500]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LIST_TRADES_SQL = """
+    SELECT id, symbol, side AS type, entry_price AS entryPrice, exit_price AS exitPrice,
+           lots AS size, pnl, status, opened_at AS openedAt, closed_at AS closedAt
+    FROM trades
+    WHERE challenge_id = ?
+    ORDER BY opened_at DESC
+"""
+INSERT_TRADE_SQL = (
+    "INSERT INTO trades (id, challenge_id, symbol, side, entry_price, exit_price, lots, pnl, status, opened_at, closed_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+CHALLENGE_ID = "bench-challenge"
+# L'écrivain insère sur un autre challenge : le résultat lu reste identique
+WRITER_CHALLENGE_ID = "bench-writer"
+
+
+def trade_row(i, challenge_id=CHALLENGE_ID):
+    ts = f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}"
+    return (str(uuid.uuid4()), challenge_id, "BTC-USD", "BUY", 100.0, 101.0, 1.0, 1.0, "CLOSED", ts, ts)
+
+
+def seed(path, trades):
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        schema = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    conn.execute("INSERT INTO users (id, name, email) VALUES ('bench', 'bench', 'bench@local')")
+    conn.execute(
+        "INSERT INTO user_challenges (id, user_id, type, status, initial_balance, current_balance, equity, "
+        "max_equity, daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit) "
+        "VALUES (?, 'bench', 'STARTER', 'ACTIVE', 5000, 5000, 5000, 5000, 5000, 500, 250, 500)",
+        (CHALLENGE_ID,),
+    )
+    conn.executemany(INSERT_TRADE_SQL, [trade_row(i) for i in range(trades)])
+    conn.commit()
+    conn.close()
+
+
+def legacy_read(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(r) for r in conn.execute(LIST_TRADES_SQL, (CHALLENGE_ID,)).fetchall()]
+    conn.close()
+    return rows
+
+
+def legacy_write(path, i):
+    conn = sqlite3.connect(path)
+    conn.execute(INSERT_TRADE_SQL, trade_row(i, WRITER_CHALLENGE_ID))
+    conn.commit()
+    conn.close()
+
+
+def pool_read(_path):
+    rows = [dict(r) for r in db.get_read_connection().execute(LIST_TRADES_SQL, (CHALLENGE_ID,)).fetchall()]
+    db.release_thread_connections()
+    return rows
+
+
+def pool_write(_path, i):
+    with db.transaction() as conn:
+        conn.execute(INSERT_TRADE_SQL, trade_row(i, WRITER_CHALLENGE_ID))
+    db.release_thread_connections()
+
+
+def run(label, path, read, write, readers, seconds):
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        n = errors = 0
+        while not stop.is_set():
+            try:
+                read(path)
+                n += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts["reads"] += n
+            counts["errors"] += errors
+
+    def writer():
+        n = errors = 0
+        while not stop.is_set():
+            try:
+                write(path, 1_000_000 + n)
+                n += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts["writes"] += n
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    print(f"{label:<8}{counts['reads'] / seconds:>12.0f}{counts['writes'] / seconds:>12.0f}{counts['errors']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--trades", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        legacy_path = os.path.join(root, "legacy.db")
+        pool_path = os.path.join(root, "pool.db")
+        seed(legacy_path, args.trades)
+        seed(pool_path, args.trades)
+        db.configure_db({"SQLITE_PATH": pool_path})
+
+        print(f"{args.readers} lecteurs + 1 écrivain, {args.trades} trades, {args.seconds:.0f}s par mode")
+        print(f"{'mode':<8}{'lectures/s':>12}{'écritures/s':>12}{'erreurs':>10}")
+        run("legacy", legacy_path, legacy_read, legacy_write, args.readers, args.seconds)
+        run("pool", pool_path, pool_read, pool_write, args.readers, args.seconds)
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
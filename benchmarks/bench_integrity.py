@@ -0,0 +1,130 @@
+"""
+Benchmark de la vérification d'intégrité des soldes.
+
+--trades trades CLOSED répartis sur --challenges challenges cohérents
+(solde = initial + somme des PnL), dans une base temporaire (schema.sql) :
+  - scan complet : un SUM(pnl) GROUP BY challenge_id sur toute la table
+  - full_verify  : même somme par tranches de rowid, 1 puis --workers threads
+  - incrémental  : --append nouveaux trades, puis une passe depuis le point
+                   de contrôle
+Un solde est ensuite faussé : la passe suivante doit le signaler.
+
+Usage:
+    python benchmarks/bench_integrity.py [--trades 1000000] [--workers 4]
+    python benchmarks/bench_integrity.py --trades 10000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import db
+from backend.integrity_verifier import full_verify, verify_incremental
+
+NOW = "2025-01-01T00:00:00+00:00"
+
+
+def seed(path, trades, challenges, seed_value):
+    rng = random.Random(seed_value)
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        conn = sqlite3.connect(path)
+        conn.executescript(f.read())
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("INSERT INTO users (id, name, email) VALUES ('bench', 'bench', 'bench@local')")
+    balances = [5000.0] * challenges
+    batch = []
+    for n in range(trades):
+        c = n % challenges
+        pnl = round(rng.uniform(-5, 5), 2)
+        balances[c] += pnl
+        batch.append((f"t{n}", f"bench-{c}", pnl, NOW, NOW))
+        if len(batch) == 100000:
+            insert_trades(conn, batch)
+            batch = []
+    insert_trades(conn, batch)
+    conn.executemany(
+        "INSERT INTO user_challenges (id, user_id, type, status, initial_balance, current_balance, equity, "
+        "max_equity, daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, "
+        "created_at, updated_at) VALUES (?, 'bench', 'STARTER', 'ACTIVE', 5000, ?, ?, 5000, 5000, "
+        "500, 250, 500, ?, ?)",
+        [(f"bench-{c}", b, b, NOW, NOW) for c, b in enumerate(balances)],
+    )
+    conn.commit()
+    return conn, balances
+
+
+def insert_trades(conn, rows):
+    conn.executemany(
+        "INSERT INTO trades (id, challenge_id, symbol, side, entry_price, exit_price, lots, pnl, status, "
+        "opened_at, closed_at) VALUES (?, ?, 'BTC-USD', 'BUY', 100, 100, 1, ?, 'CLOSED', ?, ?)",
+        rows,
+    )
+
+
+def full_scan(path):
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    sums = conn.execute("SELECT challenge_id, SUM(pnl) FROM trades WHERE status = 'CLOSED' "
+                        "GROUP BY challenge_id").fetchall()
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return len(sums), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trades", type=int, default=1000000)
+    parser.add_argument("--challenges", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk", type=int, default=250000)
+    parser.add_argument("--append", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="tradesense-integrity-") as workdir:
+        path = os.path.join(workdir, "bench.db")
+        started = time.perf_counter()
+        conn, balances = seed(path, args.trades, args.challenges, 42)
+        print(f"{args.trades} trades, {args.challenges} challenges (seed {time.perf_counter() - started:.1f} s)")
+        db.configure_db({"SQLITE_PATH": path})
+
+        groups, elapsed = full_scan(path)
+        print(f"  scan complet        : {elapsed * 1000:9.1f} ms  ({groups} challenges)")
+        for workers in sorted({1, args.workers}):
+            result = full_verify(workers=workers, chunk=args.chunk)
+            print(f"  full_verify x{workers:<2}     : {result['sumMs']:9.1f} ms somme, {result['totalMs']:9.1f} ms total"
+                  f"  ({result['chunks']} tranches, violations {result['lastPass']['violations']})")
+
+        rng = random.Random(7)
+        rows = []
+        for n in range(args.append):
+            c = rng.randrange(args.challenges)
+            pnl = round(rng.uniform(-5, 5), 2)
+            balances[c] += pnl
+            rows.append((f"a{n}", f"bench-{c}", pnl, NOW, NOW))
+        insert_trades(conn, rows)
+        conn.executemany("UPDATE user_challenges SET current_balance = ?, equity = ? WHERE id = ?",
+                         [(b, b, f"bench-{c}") for c, b in enumerate(balances)])
+        conn.commit()
+        result = verify_incremental(batch=max(args.append * 2, 1))
+        print(f"  incrémental (+{args.append}) : {result['readMs'] + result['writeMs']:9.1f} ms (lecture {result['readMs']:.1f})"
+              f"  ({result['folded']} trades pliés, {result['checked']} soldes comparés, "
+              f"violations {result['violations']})")
+
+        conn.execute("UPDATE user_challenges SET current_balance = current_balance + 100 WHERE id = 'bench-0'")
+        conn.commit()
+        result = verify_incremental()
+        status = "OK" if result["violations"] == 1 else "KO"
+        print(f"  [{status}] solde faussé signalé : {result['violations']} violation(s)")
+        conn.close()
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
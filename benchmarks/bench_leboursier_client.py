@@ -0,0 +1,204 @@
+"""
+Benchmark du client LeBoursier contre un stub HTTP local.
+
+Le stub sert les pages enregistrées de benchmarks/fixtures/leboursier/
+(avec ETag / Last-Modified) et compte les connexions TCP ouvertes.
+On compare :
+  - legacy  : requests.get nu + parse BeautifulSoup à chaque appel
+  - client  : session keep-alive + GET conditionnels (304)
+  - client (hash) : même client face à un serveur sans ETag/Last-Modified
+                    (le parse est évité grâce au hash du contenu)
+
+Usage:
+    python benchmarks/bench_leboursier_client.py [--rounds 50]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from backend.market_data_maroc import LEBOURSIER_PATHS, LeBoursierClient
+from backend.maroc_extractors import extract_price_bs4
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "leboursier")
+
+
+def load_fixtures():
+    pages = {}
+    for symbol, path in LEBOURSIER_PATHS.items():
+        with open(os.path.join(FIXTURES_DIR, f"{symbol}.html"), "rb") as f:
+            pages[path] = f.read()
+    return pages
+
+
+class StubServer:
+    """Stub HTTP/1.1 keep-alive servant les pages LeBoursier enregistrées."""
+
+    def __init__(self, pages, conditional=True):
+        self.pages = pages
+        self.conditional = conditional
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        last_modified = formatdate(time.time(), usegmt=True)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                stub.connections += 1
+                super().setup()
+
+            def do_GET(self):
+                stub.requests += 1
+                body = stub.pages.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if stub.conditional and (
+                    self.headers.get("If-None-Match") == etag
+                    or self.headers.get("If-Modified-Since") == last_modified
+                ):
+                    stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if stub.conditional:
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = "http://127.0.0.1:%d" % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def legacy_fetch(url):
+    """Ancien chemin : requête sans session + parse complet à chaque appel."""
+    resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=5)
+    return extract_price_bs4(resp.text)
+
+
+def measure_connect(base_url, n=50):
+    """Surcoût d'une requête sur connexion neuve vs connexion keep-alive."""
+    url = base_url + "/ping"
+    start = time.perf_counter()
+    for _ in range(n):
+        requests.get(url, timeout=5)
+    fresh = (time.perf_counter() - start) / n
+    session = requests.Session()
+    session.get(url, timeout=5)
+    start = time.perf_counter()
+    for _ in range(n):
+        session.get(url, timeout=5)
+    reused = (time.perf_counter() - start) / n
+    session.close()
+    return max(0.0, fresh - reused)
+
+
+def measure_parse(pages, n=20):
+    bodies = [b.decode("utf-8") for b in pages.values()]
+    start = time.perf_counter()
+    for _ in range(n):
+        for html in bodies:
+            extract_price_bs4(html)
+    return (time.perf_counter() - start) / (n * len(bodies))
+
+
+def run(label, pages, rounds, conditional, fetch_factory):
+    with StubServer(pages, conditional=conditional) as stub:
+        fetch, parsed_count = fetch_factory(stub.base_url)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in pages:
+                price = fetch(path)
+                assert price is not None, f"{label}: no price for {path}"
+        elapsed = time.perf_counter() - start
+        calls = rounds * len(pages)
+        return {
+            "label": label,
+            "calls": calls,
+            "totalMs": elapsed * 1000,
+            "perCallMs": elapsed * 1000 / calls,
+            "connections": stub.connections,
+            "notModified": stub.not_modified,
+            "parsed": parsed_count(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+
+    def legacy_factory(base_url):
+        calls = {"n": 0}
+
+        def fetch(path):
+            calls["n"] += 1
+            return legacy_fetch(base_url + path)
+        return fetch, lambda: calls["n"]
+
+    def client_factory(base_url):
+        client = LeBoursierClient(base_url=base_url)
+        return client.fetch_price, lambda: client.stats["parsed"]
+
+    results = [
+        run("legacy", pages, args.rounds, True, legacy_factory),
+        run("client", pages, args.rounds, True, client_factory),
+        run("client (hash)", pages, args.rounds, False, client_factory),
+    ]
+
+    with StubServer(pages) as stub:
+        connect_s = measure_connect(stub.base_url)
+    parse_s = measure_parse(pages)
+
+    print(f"{'mode':<15}{'calls':>7}{'total ms':>11}{'ms/call':>10}{'conns':>7}{'304':>6}{'parsed':>8}")
+    for r in results:
+        print(f"{r['label']:<15}{r['calls']:>7}{r['totalMs']:>11.1f}{r['perCallMs']:>10.3f}"
+              f"{r['connections']:>7}{r['notModified']:>6}{r['parsed']:>8}")
+
+    base = results[0]
+    print()
+    print(f"connexion neuve (loopback, sans TLS): +{connect_s * 1000:.3f} ms  |  parse BeautifulSoup: {parse_s * 1000:.2f} ms")
+    for r in results[1:]:
+        saved_conn = base["connections"] - r["connections"]
+        saved_parse = base["parsed"] - r["parsed"]
+        print(f"{r['label']}: {saved_conn} handshakes évités (~{saved_conn * connect_s * 1000:.1f} ms), "
+              f"{saved_parse} parses évités (~{saved_parse * parse_s * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
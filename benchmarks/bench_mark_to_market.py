@@ -0,0 +1,126 @@
+"""
+Benchmark du mark-to-market des positions ouvertes.
+
+--positions positions réparties sur --challenges challenges et sur les
+symboles tradables, puis --batches lots de ticks (un nouveau prix par
+symbole et par lot) :
+  - scan    : à chaque lot, parcours de tous les challenges et de leurs
+              positions en Python, equity recalculée puis
+              evaluate_after_trade (sans index par symbole)
+  - book    : PositionBook.mark, index par symbole en colonnes NumPy,
+              mise à jour incrémentale du PnL latent par challenge
+
+Usage:
+    python benchmarks/bench_mark_to_market.py [--positions 50000] [--challenges 20000] [--batches 50]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.challenge_evaluator import evaluate_after_trade
+from backend.position_book import PositionBook
+from backend.price_service import TRADABLE_SYMBOLS
+
+SYMBOLS = sorted(TRADABLE_SYMBOLS)
+
+
+def make_challenge(n):
+    return {
+        "id": f"bench-{n}", "status": "ACTIVE", "initialBalance": 1e9, "currentBalance": 1e9,
+        "equity": 1e9, "maxEquity": 1e9, "dailyStartingBalance": 1e9, "profitTarget": 1e8,
+        "maxDailyLossLimit": 5e7, "maxTotalLossLimit": 1e8,
+    }
+
+
+def make_positions(count, challenges, rng):
+    positions = []
+    for i in range(count):
+        positions.append({
+            "id": f"pos-{i}", "challengeId": f"bench-{rng.randrange(challenges)}",
+            "symbol": rng.choice(SYMBOLS), "type": rng.choice(("BUY", "SELL")),
+            "entryPrice": 100.0, "size": rng.uniform(0.1, 5.0), "status": "OPEN",
+        })
+    return positions
+
+
+def tick_batches(batches, rng):
+    return [{s: 100.0 * (1 + rng.uniform(-0.01, 0.01)) for s in SYMBOLS} for _ in range(batches)]
+
+
+def run_scan(challenges, positions, batches):
+    by_challenge = {}
+    for p in positions:
+        by_challenge.setdefault(p["challengeId"], []).append(p)
+    states = {c["id"]: c for c in challenges}
+    samples = []
+    for prices in batches:
+        started = time.perf_counter()
+        for cid, state in states.items():
+            unrealized = 0.0
+            for p in by_challenge.get(cid, ()):
+                qty = p["size"] if p["type"] == "BUY" else -p["size"]
+                unrealized += (prices[p["symbol"]] - p["entryPrice"]) * qty
+            state["equity"] = state["currentBalance"] + unrealized
+            evaluate_after_trade(state)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run_book(challenges, positions, batches):
+    book = PositionBook()
+    states = {c["id"]: c for c in challenges}
+    for p in positions:
+        book.open(p, states[p["challengeId"]])
+    samples = []
+    for prices in batches:
+        started = time.perf_counter()
+        book.mark(prices)
+        samples.append(time.perf_counter() - started)
+    return samples, book
+
+
+def report(label, samples):
+    ms = sorted(s * 1000 for s in samples)
+    print(f"  {label:<5}: médiane {statistics.median(ms):8.2f} ms  p95 {ms[int(len(ms) * 0.95) - 1]:8.2f} ms"
+          f"  max {ms[-1]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--positions", type=int, default=50000)
+    parser.add_argument("--challenges", type=int, default=20000)
+    parser.add_argument("--batches", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    positions = make_positions(args.positions, args.challenges, rng)
+    batches = tick_batches(args.batches, rng)
+    print(f"{args.positions} positions, {args.challenges} challenges, {len(SYMBOLS)} symboles, "
+          f"{args.batches} lots de ticks")
+
+    report("scan", run_scan([make_challenge(n) for n in range(args.challenges)], positions, batches))
+    samples, book = run_book([make_challenge(n) for n in range(args.challenges)], positions, batches)
+    report("book", samples)
+
+    # Contrôle : PnL latent incrémental == recalcul complet au dernier prix
+    last = batches[-1]
+    expected = sum((last[p["symbol"]] - 100.0) * (p["size"] if p["type"] == "BUY" else -p["size"])
+                   for p in positions)
+    got = float(book._cols["unrealized"].sum())
+    print(f"  PnL latent total : {got:.6f}  recalcul : {expected:.6f}  écart {abs(got - expected):.2e}")
+
+    one = {SYMBOLS[0]: last[SYMBOLS[0]] * 1.001}
+    started = time.perf_counter()
+    book.mark(one)
+    print(f"  tick d'un seul symbole ({book.get_stats()['symbols'][SYMBOLS[0]]} positions) : "
+          f"{(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
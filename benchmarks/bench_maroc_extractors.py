@@ -0,0 +1,82 @@
+"""
+Benchmark des extracteurs de cours LeBoursier sur les pages enregistrées
+(benchmarks/fixtures/leboursier/IAM.html, ATW.html, et ATW_nested.html
+dont le cours contient une balise imbriquée : "480<sup>,25</sup>").
+
+Pour chaque extracteur : latence médiane / p95 d'une extraction et pic
+mémoire alloué (tracemalloc) pendant une extraction. Le prix retourné par
+la chaîne est comparé au prix attendu de chaque page.
+
+Usage:
+    python benchmarks/bench_maroc_extractors.py [--runs 200]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import maroc_extractors
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "leboursier")
+PAGES = {"IAM": 95.50, "ATW": 480.00, "ATW_nested": 480.25}   # page -> prix attendu
+
+
+def bench(fn, html, runs):
+    fn(html)  # warm-up (imports, caches regex)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(html)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+
+    tracemalloc.start()
+    price = fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "price": price,
+        "medianMs": statistics.median(samples) * 1000,
+        "p95Ms": samples[int(len(samples) * 0.95) - 1] * 1000,
+        "peakKiB": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    available = maroc_extractors.available_extractors()
+    extractors = [(name, fn) for name, fn in maroc_extractors.EXTRACTORS if name in available]
+    extractors.append(("chain", maroc_extractors.extract_price))
+
+    print(f"{'page':<12}{'extracteur':<10}{'prix':>9}{'médiane ms':>12}{'p95 ms':>10}{'pic KiB':>10}")
+    for symbol, expected in PAGES.items():
+        with open(os.path.join(FIXTURES_DIR, f"{symbol}.html"), encoding="utf-8") as f:
+            html = f.read()
+        baseline = None
+        for name, fn in extractors:
+            r = bench(fn, html, args.runs)
+            if name == "bs4":
+                baseline = r
+            print(f"{symbol:<12}{name:<10}{r['price'] or 0:>9.2f}{r['medianMs']:>12.3f}{r['p95Ms']:>10.3f}{r['peakKiB']:>10.1f}")
+        price = maroc_extractors.extract_price(html)
+        status = "OK" if price == expected else "KO"
+        print(f"{symbol:<12}[{status}] chaîne : {price} (attendu {expected})")
+        if baseline:
+            r = bench(maroc_extractors.extract_price, html, args.runs)
+            print(f"{symbol:<12}-> chaîne vs bs4 : x{baseline['medianMs'] / r['medianMs']:.0f} plus rapide, "
+                  f"{baseline['peakKiB'] - r['peakKiB']:.0f} KiB de moins")
+    if "lxml" not in available:
+        print("(lxml non installé : extracteur ignoré)")
+
+
+if __name__ == "__main__":
+    main()
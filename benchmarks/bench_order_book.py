@@ -0,0 +1,99 @@
+"""
+Benchmark du déclenchement des ordres en attente sur les ticks.
+
+--orders ordres (limites et stops, achat et vente) répartis sur
+--symbols symboles, seuils autour du prix initial ; --ticks ticks d'une
+marche aléatoire :
+  - scan : chaque tick teste tous les ordres du symbole (is_triggered)
+  - tas  : TriggerIndex.pop_triggered, ne dépile que les ordres franchis
+Les deux doivent déclencher exactement les mêmes ordres.
+
+Usage:
+    python benchmarks/bench_order_book.py [--orders 100000] [--ticks 5000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.order_book import ENTRY_TYPES, TriggerIndex, is_triggered
+
+
+def make_orders(count, symbols, seed):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"o{n}", "challengeId": f"c{n % 5000}", "symbol": f"S{n % symbols}",
+            "type": rng.choice(ENTRY_TYPES), "side": rng.choice(("BUY", "SELL")),
+            "triggerPrice": 100.0 * (1 + rng.uniform(-0.2, 0.2)),
+        }
+        for n in range(count)
+    ]
+
+
+def make_ticks(count, symbols, seed):
+    rng = random.Random(seed)
+    prices = {f"S{s}": 100.0 for s in range(symbols)}
+    ticks = []
+    for _ in range(count):
+        symbol = f"S{rng.randrange(symbols)}"
+        prices[symbol] *= 1 + rng.gauss(0, 0.004)
+        ticks.append((symbol, prices[symbol]))
+    return ticks
+
+
+def run_scan(orders, ticks):
+    by_symbol = {}
+    for order in orders:
+        by_symbol.setdefault(order['symbol'], []).append(order)
+    fired = []
+    started = time.perf_counter()
+    for symbol, price in ticks:
+        pending = by_symbol.get(symbol, [])
+        hit = [o for o in pending if is_triggered(o, price)]
+        if hit:
+            fired.extend(o['id'] for o in hit)
+            by_symbol[symbol] = [o for o in pending if not is_triggered(o, price)]
+    return fired, time.perf_counter() - started
+
+
+def run_heap(orders, ticks):
+    index = TriggerIndex()
+    for order in orders:
+        index.add(order)
+    fired = []
+    started = time.perf_counter()
+    for symbol, price in ticks:
+        for order in index.pop_triggered(symbol, price):
+            fired.append(order['id'])
+            index.done(order['id'])
+    return fired, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--ticks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    orders = make_orders(args.orders, args.symbols, args.seed)
+    ticks = make_ticks(args.ticks, args.symbols, args.seed + 1)
+    print(f"{args.orders} ordres, {args.symbols} symboles, {args.ticks} ticks")
+    scan_fired, scan_time = run_scan(orders, ticks)
+    heap_fired, heap_time = run_heap(orders, ticks)
+    for label, elapsed in (("scan", scan_time), ("tas", heap_time)):
+        print(f"  {label:<5}: {elapsed * 1000:9.1f} ms  ({elapsed / args.ticks * 1e6:8.1f} µs/tick)")
+    print(f"  ordres déclenchés : {len(heap_fired)}  (x{scan_time / heap_time:.0f})")
+    if sorted(scan_fired) != sorted(heap_fired):
+        raise SystemExit("[KO] les deux méthodes ne déclenchent pas les mêmes ordres")
+    print("  [OK] mêmes ordres déclenchés")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark du serveur SSE asyncio : milliers de flux inactifs, un tick diffusé.
+
+--clients connexions ouvertes sur PriceStreamServer (port local libre),
+toutes abonnées au même symbole, puis --ticks cotations publiées par
+price_service.store_quote. On mesure :
+  - threads du process une fois les flux ouverts (constant, pas un par client)
+  - latence de diffusion d'un tick jusqu'au dernier client (médiane, max)
+
+Usage:
+    python benchmarks/bench_price_stream.py [--clients 2000] [--ticks 5]
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import price_service
+from backend.price_stream_server import PriceStreamServer
+
+SYMBOL = "BTC-USD"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def open_stream(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /api/price/stream?symbols={SYMBOL} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+    await writer.drain()
+    buf = b""
+    while b"retry:" not in buf:
+        buf += await reader.read(4096)
+    return reader, writer
+
+
+async def wait_tick(reader, price):
+    marker = f'"price": {price}'.encode()
+    buf = b""
+    while marker not in buf:
+        buf = buf[-256:] + await reader.read(4096)
+    return time.perf_counter()
+
+
+async def run(port, clients, ticks):
+    streams = await asyncio.gather(*(open_stream(port) for _ in range(clients)))
+    print(f"flux ouverts : {clients}, threads du process : {threading.active_count()}")
+    latencies = []
+    for n in range(ticks):
+        price = 1000.0 + n
+        waiters = [asyncio.create_task(wait_tick(reader, price)) for reader, _ in streams]
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        # Depuis un autre thread, comme le poller
+        threading.Thread(target=price_service.store_quote,
+                         args=(SYMBOL, {"symbol": SYMBOL, "price": price, "currency": "USD"})).start()
+        done = await asyncio.gather(*waiters)
+        latencies.append((max(done) - started) * 1000)
+    for _, writer in streams:
+        writer.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--ticks", type=int, default=5)
+    args = parser.parse_args()
+
+    # Deux descripteurs par flux (client + serveur) dans ce process
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.clients * 2 + 256)), hard))
+
+    server = PriceStreamServer("127.0.0.1", free_port())
+    server.start()
+    try:
+        latencies = asyncio.run(run(server.port, args.clients, args.ticks))
+    finally:
+        server.stop()
+    print(f"diffusion d'un tick au dernier client : médiane {statistics.median(latencies):.1f} ms, "
+          f"max {max(latencies):.1f} ms")
+    print(f"stats serveur : {server.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
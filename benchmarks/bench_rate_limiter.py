@@ -0,0 +1,114 @@
+"""
+Benchmark de la limitation de débit.
+
+  - legacy : ancienne fenêtre glissante (liste d'horodatages reconstruite
+             à chaque appel, dict jamais purgé)
+  - memory : token bucket du process (MemoryBackend)
+  - sqlite : token bucket partagé (SQLiteBackend, un UPSERT par appel)
+
+Puis --workers processes consomment le même bucket SQLite pendant
+--seconds secondes : le total autorisé doit rester capacité + débit x
+durée, quel que soit le nombre de workers.
+
+Usage:
+    python benchmarks/bench_rate_limiter.py [--checks 20000] [--workers 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import db
+from backend.rate_limiter import MemoryBackend, RateLimitRule, SQLiteBackend
+
+SHARED_RULE = ("shared", ("/",), "user", 50, 1.0)   # 50 jetons, 50 / s
+
+
+def legacy_check(history, user_id, now, limit=10):
+    if user_id in history:
+        recent = [t for t in history[user_id] if now - t < 60]
+        if len(recent) >= limit:
+            return False
+        history[user_id] = recent
+    else:
+        history[user_id] = []
+    history[user_id].append(now)
+    return True
+
+
+def make_db(path):
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        sqlite3.connect(path).executescript(f.read()).close()
+
+
+def timed(label, checks, fn):
+    started = time.perf_counter()
+    allowed = sum(1 for i in range(checks) if fn(i))
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<7}: {checks / elapsed:10.0f} vérifications/s  ({elapsed / checks * 1e6:6.2f} µs)"
+          f"  autorisées {allowed}")
+
+
+def shared_worker(path, seconds, start, out):
+    db.configure_db({"SQLITE_PATH": path})
+    backend = SQLiteBackend()
+    rule = RateLimitRule(*SHARED_RULE)
+    start.wait()
+    deadline = time.time() + seconds
+    allowed = 0
+    while time.time() < deadline:
+        ok, _ = backend.take("shared:user", rule, time.time())
+        allowed += ok
+    out.put(allowed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    rule = RateLimitRule("bench", ("/",), "user", 10, 60)
+    with tempfile.TemporaryDirectory(prefix="tradesense-ratelimit-") as workdir:
+        path = os.path.join(workdir, "bench.db")
+        make_db(path)
+        db.configure_db({"SQLITE_PATH": path})
+
+        print(f"{args.checks} vérifications sur {args.users} utilisateurs (10 / 60 s)")
+        history = {}
+        timed("legacy", args.checks, lambda i: legacy_check(history, f"u{i % args.users}", time.time()))
+        memory = MemoryBackend()
+        timed("memory", args.checks, lambda i: memory.take(f"bench:u{i % args.users}", rule, time.time())[0])
+        sqlite_backend = SQLiteBackend()
+        timed("sqlite", args.checks, lambda i: sqlite_backend.take(f"bench:u{i % args.users}", rule, time.time())[0])
+        db.close_all()
+
+        ctx = multiprocessing.get_context("spawn")
+        start, out = ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=shared_worker, args=(path, args.seconds, start, out)) for _ in range(args.workers)]
+        for p in procs:
+            p.start()
+        time.sleep(1.0)
+        start.set()
+        allowed = [out.get(timeout=60) for _ in procs]
+        for p in procs:
+            p.join()
+
+    capacity, window = SHARED_RULE[3], SHARED_RULE[4]
+    expected = capacity + capacity / window * args.seconds
+    print(f"bucket partagé ({capacity} jetons, {capacity / window:.0f}/s) par {args.workers} workers "
+          f"pendant {args.seconds:.1f} s :")
+    print(f"  autorisées {sum(allowed)} (par worker {allowed}), plafond attendu ≈ {expected:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark de la bascule journalière du daily_starting_balance.
+
+--challenges challenges ACTIVE dont le jour de trading est celui de la
+veille, dans une base temporaire (schema.sql) :
+  - par ligne  : un UPDATE par challenge (comme un rebasage challenge par
+                 challenge), dans une transaction
+  - ensembliste : trading_day_service.roll_over, un seul UPDATE
+
+Usage:
+    python benchmarks/bench_rollover.py [--challenges 100000]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import db
+from backend.trading_day_service import roll_over, trading_date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOW = "2025-01-01T00:00:00+00:00"
+YESTERDAY = "2000-01-01"
+
+
+def seed(path, count):
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        conn = sqlite3.connect(path)
+        conn.executescript(f.read())
+    conn.execute("INSERT INTO users (id, name, email) VALUES ('bench', 'bench', 'bench@local')")
+    conn.executemany(
+        "INSERT INTO user_challenges (id, user_id, type, status, initial_balance, current_balance, equity, "
+        "max_equity, daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, "
+        "created_at, updated_at, daily_date) VALUES (?, 'bench', 'STARTER', 'ACTIVE', 5000, ?, ?, 5000, 5000, "
+        "500, 250, 500, ?, ?, ?)",
+        [(f"bench-{n}", 5000.0 + n % 100, 5000.0 + n % 100, NOW, NOW, YESTERDAY) for n in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_per_row(path):
+    conn = sqlite3.connect(path)
+    today = trading_date()
+    started = time.perf_counter()
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM user_challenges WHERE status = 'ACTIVE' AND daily_date < ?", (today,))]
+    for cid in ids:
+        conn.execute("UPDATE user_challenges SET daily_starting_balance = equity, daily_date = ? WHERE id = ?",
+                     (today, cid))
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    conn.execute("UPDATE user_challenges SET daily_date = ?", (YESTERDAY,))
+    conn.commit()
+    conn.close()
+    return len(ids), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--challenges", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="tradesense-rollover-") as workdir:
+        path = os.path.join(workdir, "bench.db")
+        seed(path, args.challenges)
+
+        rows, elapsed = run_per_row(path)
+        print(f"challenges ACTIVE : {args.challenges}")
+        print(f"  par ligne    : {elapsed * 1000:8.1f} ms  ({rows} lignes)")
+
+        db.configure_db({"SQLITE_PATH": path})
+        result = roll_over(datetime.now(timezone.utc))
+        print(f"  ensembliste  : {result['updateMs']:8.1f} ms  ({result['rows']} lignes)")
+        again = roll_over(datetime.now(timezone.utc))
+        print(f"  2e passage   : {again['updateMs']:8.1f} ms  ({again['rows']} lignes, idempotent)")
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
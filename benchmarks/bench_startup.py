@@ -0,0 +1,131 @@
+"""
+Benchmark du démarrage à froid de l'app Flask.
+
+Chaque mesure lance un process Python neuf (comme un conteneur qui
+démarre) dans un répertoire temporaire contenant schema.sql, puis :
+  - import de app (create_app et blueprints)
+  - create_app() (init_db, config, blueprints)
+  - première réponse (test_client, route sans appel upstream)
+
+Un passage avec `-X importtime` donne le temps d'import par module ; les
+modules lourds (yfinance, pandas, numpy, bs4, feedparser, aiohttp, ...)
+chargés avant la première réponse sont signalés.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--budget-ms 1000]
+
+Avec --budget-ms, le script sort en erreur si la médiane du temps jusqu'à
+la première réponse dépasse le budget (détection de régression en CI).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("yfinance", "pandas", "numpy", "bs4", "lxml", "feedparser", "aiohttp", "requests")
+
+CHILD_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+resp = app.test_client().get(%(route)r)
+t3 = time.perf_counter()
+print(json.dumps({
+    "status": resp.status_code,
+    "import": t1 - t0,
+    "createApp": t2 - t1,
+    "firstResponse": t3 - t2,
+    "heavy": [m for m in %(heavy)r if m in sys.modules],
+}))
+"""
+
+
+def run_child(workdir, route, importtime=False, reset_db=True):
+    if reset_db:
+        db_path = os.path.join(workdir, "tradesense.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+    env = dict(os.environ, PYTHONPATH=ROOT, MARKET_POLLER_ENABLED="0")
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", CHILD_SCRIPT % {"route": route, "heavy": HEAVY_MODULES}]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    # Dernière ligne JSON : les threads de fond (préchargement, ...) impriment aussi
+    result = json.loads([line for line in proc.stdout.splitlines() if line.startswith("{")][-1])
+    result["wall"] = wall
+    return result, proc.stderr
+
+
+def parse_importtime(stderr):
+    """Lignes `import time: self | cumulative | module` -> liste (module, self_us, cumul_us)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--route", default="/api/admin/price-cache")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tradesense-startup-")
+    try:
+        shutil.copy(os.path.join(ROOT, "schema.sql"), workdir)
+
+        _, stderr = run_child(workdir, args.route, importtime=True)
+        rows = parse_importtime(stderr)
+        print(f"Top {args.top} modules par temps d'import cumulé (ms) :")
+        print(f"{'module':<45}{'self':>10}{'cumulé':>10}")
+        for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[:args.top]:
+            print(f"{name:<45}{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}")
+
+        phases = {"wall": [], "import": [], "createApp": [], "firstResponse": []}
+        for cold in (True, False):
+            samples = {k: [] for k in phases}
+            heavy = []
+            for _ in range(args.runs):
+                result, _ = run_child(workdir, args.route, reset_db=cold)
+                heavy = result["heavy"]
+                for key in samples:
+                    samples[key].append(result[key])
+            label = "base neuve" if cold else "base existante"
+            print(f"\n{label} (médiane sur {args.runs} process, ms) :")
+            for key, values in samples.items():
+                print(f"  {key:<14}{statistics.median(values) * 1000:>10.1f}")
+            print(f"  modules lourds chargés : {', '.join(heavy) or 'aucun'}")
+            if not cold:
+                phases = samples
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.budget_ms is not None:
+        ttfr = statistics.median(phases["wall"]) * 1000
+        if ttfr > args.budget_ms:
+            print(f"\nÉCHEC : première réponse en {ttfr:.0f} ms > budget {args.budget_ms:.0f} ms")
+            sys.exit(1)
+        print(f"\nOK : première réponse en {ttfr:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
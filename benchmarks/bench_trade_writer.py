@@ -0,0 +1,116 @@
+"""
+Benchmark de la persistance des trades : commit par trade vs group commit.
+
+--threads threads soumettent chacun --trades trades sur leur propre
+challenge, sur une base temporaire créée depuis schema.sql :
+  - direct  : une transaction (donc un commit) par trade, dans le thread
+              appelant, comme avant l'écrivain de fond
+  - commit  : TradeWriter, la requête attend le commit de son lot
+  - enqueue : TradeWriter, la requête répond dès la mise en file
+
+Usage:
+    python benchmarks/bench_trade_writer.py [--threads 8] [--trades 300] [--synchronous FULL]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import db, trade_persistence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_challenge(cid):
+    now = "2025-01-01T00:00:00+00:00"
+    return {
+        "id": cid, "userId": f"user-{cid}", "type": "STARTER", "status": "ACTIVE",
+        "initialBalance": 5000.0, "currentBalance": 5000.0, "equity": 5000.0, "maxEquity": 5000.0,
+        "dailyStartingBalance": 5000.0, "profitTarget": 500.0, "maxDailyLossLimit": 250.0,
+        "maxTotalLossLimit": 500.0, "createdAt": now, "updatedAt": now,
+    }
+
+
+def make_trade(cid, i):
+    now = f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}+00:00"
+    return {
+        "id": str(uuid.uuid4()), "challengeId": cid, "symbol": "BTC-USD", "type": "BUY",
+        "entryPrice": 100.0, "exitPrice": 100.1, "size": 1.0, "pnl": 0.1, "status": "CLOSED",
+        "openedAt": now, "closedAt": now,
+    }
+
+
+def run(label, path, threads, trades, synchronous, writer=None):
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        sqlite3.connect(path).executescript(f.read()).close()
+    db.configure_db({"SQLITE_PATH": path, "SQLITE_SYNCHRONOUS": synchronous})
+    trade_persistence._writer = writer
+    if writer is not None:
+        writer.start()
+    latencies = []
+    lock = threading.Lock()
+
+    def submit(n):
+        challenge = make_challenge(f"bench-{n}")
+        samples = []
+        for i in range(trades):
+            challenge = dict(challenge, equity=challenge["equity"] + 0.1)
+            t = time.perf_counter()
+            trade_persistence.persist_trade(challenge, make_trade(challenge["id"], i)).wait()
+            samples.append(time.perf_counter() - t)
+        db.release_thread_connections()
+        with lock:
+            latencies.extend(samples)
+
+    workers = [threading.Thread(target=submit, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    if writer is not None:
+        writer.flush(30)
+    elapsed = time.perf_counter() - started
+    extra = ""
+    if writer is not None:
+        stats = writer.get_stats()
+        trade_persistence.stop_trade_writer()
+        extra = f"{stats['batches']:>9}{stats['avgBatch']:>9.1f}"
+    db.release_thread_connections()
+    db.close_all()
+    conn = sqlite3.connect(path)
+    count = conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+    conn.close()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<9}{count / elapsed:>10.0f}{statistics.median(latencies) * 1000:>10.2f}"
+          f"{p99 * 1000:>10.2f}{count:>8}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--trades", type=int, default=300)
+    parser.add_argument("--synchronous", default="FULL", choices=db.SYNCHRONOUS_LEVELS)
+    parser.add_argument("--batch-ms", type=float, default=trade_persistence.DEFAULT_BATCH_MS)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.trades} trades, synchronous={args.synchronous}")
+    print(f"{'mode':<9}{'trades/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'écrits':>8}{'lots':>9}{'moy/lot':>9}")
+    with tempfile.TemporaryDirectory() as root:
+        run("direct", os.path.join(root, "direct.db"), args.threads, args.trades, args.synchronous)
+        for mode in trade_persistence.DURABILITY_MODES:
+            writer = trade_persistence.TradeWriter(batch_ms=args.batch_ms, durability=mode)
+            run(mode, os.path.join(root, f"{mode}.db"), args.threads, args.trades, args.synchronous, writer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark du redémarrage à chaud (préchargement du cache des challenges).
+
+--challenges challenges ACTIVE dans une base temporaire (schema.sql) :
+  - paresseux : un SELECT par challenge à son premier accès (ancien
+                comportement), pour tous les challenges
+  - base      : reload_challenge_service.load_from_db, une seule requête
+  - snapshot  : fichier binaire relu, empreinte inchangée
+  - snapshot+db : --stale % des challenges modifiés depuis le snapshot,
+                  seuls ceux-là sont relus
+puis warm_up complet (cache rempli, /ready).
+
+Usage:
+    python benchmarks/bench_warm_restart.py [--challenges 100000] [--stale 1]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import db
+from backend.challenge_store import configure_challenge_store, get_challenge
+from backend.reload_challenge_service import load_from_db, load_from_snapshot, warm_up, write_snapshot
+
+NOW = "2025-01-01T00:00:00+00:00"
+
+
+def seed(path, count):
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        conn = sqlite3.connect(path)
+        conn.executescript(f.read())
+    conn.execute("INSERT INTO users (id, name, email) VALUES ('bench', 'bench', 'bench@local')")
+    conn.executemany(
+        "INSERT INTO user_challenges (id, user_id, type, status, initial_balance, current_balance, equity, "
+        "max_equity, daily_starting_balance, profit_target, max_daily_loss_limit, max_total_loss_limit, "
+        "created_at, updated_at, daily_date) VALUES (?, 'bench', 'STARTER', 'ACTIVE', 5000, ?, ?, 5000, 5000, "
+        "500, 250, 500, ?, ?, '2025-01-01')",
+        [(f"bench-{n}", 5000.0 + n % 100, 5000.0 + n % 100, NOW, NOW) for n in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    return result, elapsed
+
+
+def in_snapshot(fn):
+    conn = db.get_read_connection()
+    conn.execute("BEGIN")
+    try:
+        return fn(conn)
+    finally:
+        conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--challenges", type=int, default=100000)
+    parser.add_argument("--stale", type=float, default=1.0, help="%% de challenges modifiés après le snapshot")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="tradesense-warm-") as workdir:
+        path = os.path.join(workdir, "bench.db")
+        snap = path + ".challenges.snap"
+        seed(path, args.challenges)
+        db.configure_db({"SQLITE_PATH": path})
+        configure_challenge_store({"CHALLENGE_CACHE_SIZE": args.challenges})
+        print(f"challenges ACTIVE : {args.challenges}")
+
+        _, elapsed = timed(lambda: [get_challenge(f"bench-{n}") for n in range(args.challenges)])
+        print(f"  paresseux   : {elapsed * 1000:9.1f} ms  ({elapsed / args.challenges * 1e6:.1f} µs par premier accès)")
+
+        loaded, elapsed = timed(lambda: in_snapshot(lambda conn: load_from_db(conn, args.challenges)))
+        print(f"  base        : {elapsed * 1000:9.1f} ms  ({len(loaded)} challenges)")
+
+        result = write_snapshot(snap)
+        print(f"  écriture    : {result['ms']:9.1f} ms  ({result['bytes'] / 1024:.0f} Kio)")
+        (loaded, stale), elapsed = timed(lambda: in_snapshot(
+            lambda conn: load_from_snapshot(conn, snap, args.challenges)))
+        print(f"  snapshot    : {elapsed * 1000:9.1f} ms  ({len(loaded)} challenges, {stale} relus)")
+
+        modified = int(args.challenges * args.stale / 100)
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE user_challenges SET current_balance = current_balance + 1, version = version + 1 "
+                     "WHERE rowid <= ?", (modified,))
+        conn.commit()
+        conn.close()
+        (loaded, stale), elapsed = timed(lambda: in_snapshot(
+            lambda conn: load_from_snapshot(conn, snap, args.challenges)))
+        print(f"  snapshot+db : {elapsed * 1000:9.1f} ms  ({len(loaded)} challenges, {stale} relus)")
+
+        configure_challenge_store({"CHALLENGE_CACHE_SIZE": args.challenges})
+        state = warm_up(snap)
+        print(f"  warm_up     : {state['timeToReadyMs']:9.1f} ms jusqu'à /ready  (source {state['source']}, "
+              f"{state['warmed']} en cache)")
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
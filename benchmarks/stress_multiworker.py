@@ -0,0 +1,147 @@
+"""
+Stress multi-process : N workers tradent le même challenge sur une base
+SQLite commune, comme N workers gunicorn.
+
+Chaque worker est un process Python distinct qui crée sa propre app
+(create_app) et envoie --trades trades via le test client. À la fin, on
+vérifie dans la base :
+  - nombre de trades = nombre de réponses 200
+  - equity = initial_balance + somme des PnL des trades
+  - current_balance = equity
+  - notionnel des positions ouvertes <= solde
+
+Les trades sont exécutés en TRADE_EXECUTION_MODE=instant (clôturés
+aussitôt, PnL non nul) : en mode positions ils resteraient OPEN à PnL 0
+et la vérification de l'equity ne testerait rien.
+
+Usage:
+    python benchmarks/stress_multiworker.py [--workers 8] [--trades 50] [--mode shared]
+
+Avec --mode process (un seul worker supposé), les workers écrasent l'état
+les uns des autres et la vérification échoue : c'est le comportement que
+CHALLENGE_STATE_MODE=shared corrige.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOL = "BTC-USD"
+TOLERANCE = 1e-6
+
+
+def make_app(workdir, mode):
+    os.chdir(workdir)
+    os.environ.update(MARKET_POLLER_ENABLED="0", MARKET_ASYNC_FETCH="0", CHALLENGE_STATE_MODE=mode,
+                      TRADE_EXECUTION_MODE="instant", RATE_LIMIT_ENABLED="0")
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    return create_app()
+
+
+def inject_price():
+    # Prix fixe rafraîchi dans le cache (comme le poller) : aucun appel upstream
+    from backend import price_service
+
+    price_service.store_quote(SYMBOL, {"symbol": SYMBOL, "price": 100.0, "currency": "USD",
+                                       "source": "stress", "timestamp": time.time()})
+
+
+def _create_challenge(workdir, mode, out):
+    client = make_app(workdir, mode).test_client()
+    resp = client.post('/api/challenges/create', json={"userId": "stress", "plan": "ELITE"})
+    out.put(resp.get_json()["challenge"]["id"])
+
+
+def worker(workdir, mode, cid, trades, start, out):
+    app = make_app(workdir, mode)
+    client = app.test_client()
+    start.wait()
+    codes = {}
+    started = time.perf_counter()
+    for i in range(trades):
+        inject_price()
+        resp = client.post('/api/trades/execute', json={
+            "challengeId": cid, "symbol": SYMBOL, "type": "BUY" if i % 2 else "SELL", "size": 1,
+        })
+        codes[resp.status_code] = codes.get(resp.status_code, 0) + 1
+    out.put((os.getpid(), codes, time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--trades", type=int, default=50)
+    parser.add_argument("--mode", choices=("shared", "process"), default="shared")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    workdir = tempfile.mkdtemp(prefix="tradesense-stress-")
+    try:
+        shutil.copy(os.path.join(ROOT, "schema.sql"), workdir)
+        out = ctx.Queue()
+        setup = ctx.Process(target=_create_challenge, args=(workdir, args.mode, out))
+        setup.start()
+        cid = out.get(timeout=60)
+        setup.join()
+
+        start = ctx.Event()
+        procs = [ctx.Process(target=worker, args=(workdir, args.mode, cid, args.trades, start, out))
+                 for _ in range(args.workers)]
+        for p in procs:
+            p.start()
+        time.sleep(2.0)   # imports + create_app dans chaque process
+        started = time.perf_counter()
+        start.set()
+        results = [out.get(timeout=300) for _ in procs]
+        elapsed = time.perf_counter() - started
+        for p in procs:
+            p.join()
+
+        ok = sum(codes.get(200, 0) for _, codes, _ in results)
+        others = {}
+        for _, codes, _ in results:
+            for code, n in codes.items():
+                if code != 200:
+                    others[code] = others.get(code, 0) + n
+
+        conn = sqlite3.connect(os.path.join(workdir, "tradesense.db"))
+        initial, equity, balance, version = conn.execute(
+            "SELECT initial_balance, equity, current_balance, version FROM user_challenges WHERE id = ?", (cid,),
+        ).fetchone()
+        count, pnl = conn.execute("SELECT COUNT(*), COALESCE(SUM(pnl), 0) FROM trades WHERE challenge_id = ?",
+                                  (cid,)).fetchone()
+        open_count, notional = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(entry_price * lots), 0) FROM trades "
+            "WHERE challenge_id = ? AND status = 'OPEN'", (cid,),
+        ).fetchone()
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    expected = initial + pnl
+    print(f"mode={args.mode} workers={args.workers} trades/worker={args.trades}")
+    print(f"  réponses 200 : {ok}  autres : {others or 'aucune'}  ({ok / elapsed:.0f} trades/s)")
+    print(f"  trades en base : {count}  version : {version}")
+    print(f"  equity : {equity:.6f}  attendu (initial + somme PnL) : {expected:.6f}")
+    print(f"  positions ouvertes : {open_count}  notionnel : {notional:.2f}")
+    checks = {
+        "trades == réponses 200": count == ok,
+        "equity == initial + somme PnL": abs(equity - expected) < TOLERANCE,
+        "current_balance == equity": abs(balance - equity) < TOLERANCE,
+        "notionnel ouvert <= solde": notional <= balance + TOLERANCE,
+    }
+    for label, passed in checks.items():
+        print(f"  [{'OK' if passed else 'ÉCHEC'}] {label}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ import {
 } from 'lucide-react';
 import { Language } from '../types';
 import { translations } from '../services/i18n';
+import { MarketService } from '../services/marketService';
 
 interface AIConsultantProps {
   symbol: string;
@@ -62,23 +63,12 @@ const AIConsultant: React.FC<AIConsultantProps> = ({ symbol, language }) => {
     "Quelle taille de position recommandes-tu ?"
   ];
 
-  // Fetch prix du marché
+  // Flux prix du marché (SSE, remplace le polling 3s)
   useEffect(() => {
-    const fetchMarketData = async () => {
-      try {
-        const response = await fetch(`https://tradesense-ai-production-58e6.up.railway.app/api/price/${symbol}`);
-        if (response.ok) {
-          const data = await response.json();
-          setPriceHistory(prev => [...prev, data.price].slice(-100));
-        }
-      } catch (err) {
-        console.error('Market data fetch error:', err);
-      }
-    };
-
-    fetchMarketData();
-    const interval = setInterval(fetchMarketData, 3000);
-    return () => clearInterval(interval);
+    const unsubscribe = MarketService.subscribePrices([symbol], (data) => {
+      setPriceHistory(prev => [...prev, data.price].slice(-100));
+    });
+    return unsubscribe;
   }, [symbol]);
 
   // Fetch analyse du marché
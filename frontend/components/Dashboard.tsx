@@ -1,5 +1,5 @@
 
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect } from 'react';
 import { Challenge, ChallengeStatus, Language, Theme } from '../types';
 import MarketChart from './MarketChart';
 import ChallengeStats from './ChallengeStats';
@@ -16,6 +16,8 @@ import {
   LucideRefreshCw
 } from 'lucide-react';
 
+const ASSETS = ['BTC-USD', 'ETH-USD', 'TSLA', 'AAPL', 'IAM'];
+
 interface DashboardProps {
   challenge: Challenge | null;
   onPaymentSuccess: () => void;
@@ -27,6 +29,7 @@ const Dashboard: React.FC<DashboardProps> = ({ challenge, onPaymentSuccess, onUp
   const [selectedAsset, setSelectedAsset] = useState('BTC-USD');
   const [marketPrice, setMarketPrice] = useState<number>(0);
   const [priceHistory, setPriceHistory] = useState<number[]>([]);
+  const [assetPrices, setAssetPrices] = useState<Record<string, number>>({});
   const [isRefreshing, setIsRefreshing] = useState(false);
   const [payLoading, setPayLoading] = useState(false);
   const [payMethod, setPayMethod] = useState<'CMI' | 'CRYPTO' | null>(null);
@@ -44,12 +47,17 @@ const Dashboard: React.FC<DashboardProps> = ({ challenge, onPaymentSuccess, onUp
     return () => observer.disconnect();
   }, []);
 
-  const pollingInterval = useRef<number | null>(null);
-
   const refreshMarketData = async () => {
     setIsRefreshing(true);
     try {
-      const liveData = await MarketService.fetchRealPrice(selectedAsset);
+      // Une seule requête (/api/prices) pour tous les actifs du sélecteur
+      const prices = await MarketService.fetchRealPrices(ASSETS);
+      setAssetPrices(prev => {
+        const next = { ...prev };
+        for (const [symbol, data] of Object.entries(prices)) next[symbol] = data.price;
+        return next;
+      });
+      const liveData = prices[selectedAsset] || await MarketService.fetchRealPrice(selectedAsset);
       setMarketPrice(liveData.price);
       setPriceHistory(prev => [...prev, liveData.price].slice(-100));
     } catch (err) {
@@ -61,10 +69,13 @@ const Dashboard: React.FC<DashboardProps> = ({ challenge, onPaymentSuccess, onUp
 
   useEffect(() => {
     refreshMarketData();
-    pollingInterval.current = window.setInterval(refreshMarketData, 2000);
-    return () => {
-      if (pollingInterval.current) clearInterval(pollingInterval.current);
-    };
+    // Flux SSE : le serveur pousse chaque nouveau tick (plus de polling 2s)
+    const unsubscribe = MarketService.subscribePrices([selectedAsset], (liveData) => {
+      setMarketPrice(liveData.price);
+      setAssetPrices(prev => ({ ...prev, [liveData.symbol]: liveData.price }));
+      setPriceHistory(prev => [...prev, liveData.price].slice(-100));
+    });
+    return unsubscribe;
   }, [selectedAsset]);
 
   // if (!challenge) return null; // REMOVED to allow Exploration Mode
@@ -251,13 +262,16 @@ const Dashboard: React.FC<DashboardProps> = ({ challenge, onPaymentSuccess, onUp
           <div className="dark:bg-[#121214] bg-white border dark:border-white/5 border-black/5 rounded-[40px] overflow-hidden shadow-2xl relative">
             <div className="p-6 border-b dark:border-white/5 border-black/5 flex flex-wrap items-center justify-between gap-6">
               <div className="flex gap-2 bg-black/20 p-1 rounded-xl">
-                {['BTC-USD', 'ETH-USD', 'TSLA', 'AAPL', 'IAM'].map(s => (
+                {ASSETS.map(s => (
                   <button
                     key={s}
                     onClick={() => setSelectedAsset(s)}
                     className={`px-4 py-2 rounded-lg text-[9px] font-black transition-all ${selectedAsset === s ? 'bg-indigo-600 text-white shadow-lg' : 'text-zinc-500 hover:text-white'}`}
                   >
                     {s}
+                    {assetPrices[s] !== undefined && (
+                      <span className="block font-mono opacity-70">{assetPrices[s].toLocaleString()}</span>
+                    )}
                   </button>
                 ))}
               </div>
@@ -46,6 +46,56 @@ export class MarketService {
     }
   }
 
+  /**
+   * Récupère plusieurs cotations en une seule requête backend (/api/prices)
+   */
+  static async fetchRealPrices(symbols: string[]): Promise<Record<string, MarketPrice>> {
+    const backend = `${import.meta.env.VITE_API_URL || 'https://tradesense-ai-production-58e6.up.railway.app'}/api/prices?symbols=${encodeURIComponent(symbols.join(','))}`;
+    const res = await fetch(backend);
+    if (!res.ok) throw new Error('PRICE_BATCH_FETCH_ERROR');
+    const json = await res.json();
+    const prices: Record<string, MarketPrice> = {};
+    for (const [symbol, quote] of Object.entries<any>(json.quotes || {})) {
+      prices[symbol] = {
+        symbol,
+        price: quote.price,
+        currency: quote.currency || (symbol.includes('-') ? 'USD' : 'MAD'),
+        source: quote.source || 'BackendTruth',
+        timestamp: new Date().toISOString()
+      };
+    }
+    return prices;
+  }
+
+  /**
+   * Abonnement au flux SSE des cotations (/api/price/stream).
+   * EventSource gère la reconnexion et renvoie Last-Event-ID automatiquement.
+   * VITE_STREAM_URL pointe directement sur le serveur SSE asyncio du backend
+   * (PRICE_STREAM_PORT), sans passer par la redirection de l'API.
+   * Retourne une fonction de désabonnement.
+   */
+  static subscribePrices(symbols: string[], onPrice: (price: MarketPrice) => void): () => void {
+    const base = import.meta.env.VITE_STREAM_URL || import.meta.env.VITE_API_URL || 'https://tradesense-ai-production-58e6.up.railway.app';
+    const url = `${base}/api/price/stream?symbols=${encodeURIComponent(symbols.join(','))}`;
+    const source = new EventSource(url);
+    source.addEventListener('quote', (event) => {
+      try {
+        const quote = JSON.parse((event as MessageEvent).data);
+        if (typeof quote.price !== 'number') return;
+        onPrice({
+          symbol: quote.symbol,
+          price: quote.price,
+          currency: quote.currency || (quote.symbol.includes('-') ? 'USD' : 'MAD'),
+          source: quote.source || 'BackendTruth',
+          timestamp: new Date().toISOString()
+        });
+      } catch (err) {
+        console.error("PRICE_STREAM_PARSE_ERROR", err);
+      }
+    });
+    return () => source.close();
+  }
+
   /**
    * Calcul du signal IA basé sur les prix réels (SMA 5/20)
    */
@@ -32,6 +32,8 @@ CREATE TABLE IF NOT EXISTS user_challenges (
     
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER NOT NULL DEFAULT 0, -- Optimistic concurrency (multi-worker)
+    daily_date TEXT, -- Trading day of daily_starting_balance (YYYY-MM-DD, plan time zone)
     
     FOREIGN KEY(user_id) REFERENCES users(id)
 );
@@ -80,3 +82,82 @@ CREATE TABLE IF NOT EXISTS admin_settings (
     value TEXT,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
+
+-- 6. Idempotency Keys
+-- Stored responses of trade submissions (Idempotency-Key header)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY, -- route path + client key
+    fingerprint TEXT NOT NULL, -- hash of the request body
+    status INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    mimetype TEXT NOT NULL,
+    created_at REAL NOT NULL -- unix time, for TTL expiry
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at);
+
+-- 7. Rate Limits
+-- Token buckets shared by all workers (RATE_LIMIT_BACKEND=sqlite)
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY, -- rule:user or rule:ip
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL, -- unix time of the last refill
+    allowed INTEGER NOT NULL DEFAULT 1 -- outcome of the last check
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limits_updated_at ON rate_limits(updated_at);
+
+-- 8. Orders
+-- Limit / stop entries and stop-loss / take-profit exits, triggered on price ticks
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    challenge_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    type TEXT NOT NULL, -- 'LIMIT', 'STOP', 'STOP_LOSS', 'TAKE_PROFIT'
+    side TEXT NOT NULL, -- 'BUY' or 'SELL' (closing side for STOP_LOSS / TAKE_PROFIT)
+    trigger_price REAL NOT NULL,
+    lots REAL NOT NULL,
+    position_id TEXT, -- trade closed by a STOP_LOSS / TAKE_PROFIT
+    status TEXT NOT NULL, -- 'PENDING', 'FILLED', 'CANCELLED', 'REJECTED'
+    trade_id TEXT, -- trade opened or closed on fill
+    fill_price REAL,
+    reason TEXT, -- why the order was cancelled or rejected
+    created_at DATETIME,
+    updated_at DATETIME,
+
+    FOREIGN KEY(challenge_id) REFERENCES user_challenges(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_orders_challenge ON orders(challenge_id);
+
+-- 9. Integrity Checkpoints
+-- Incremental verification of balance = initial + sum(closed PnL)
+CREATE TABLE IF NOT EXISTS integrity_checkpoints (
+    challenge_id TEXT PRIMARY KEY,
+    last_rowid INTEGER NOT NULL DEFAULT 0, -- last trade folded into closed_pnl
+    closed_pnl REAL NOT NULL DEFAULT 0,
+    closed_trades INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'OK', -- 'OK' or 'VIOLATION'
+    expected_balance REAL,
+    actual_balance REAL,
+    actual_equity REAL,
+    detail TEXT, -- 'BALANCE_MISMATCH' or 'EQUITY_MISMATCH'
+    verified_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_integrity_checkpoints_status ON integrity_checkpoints(status);
+
+-- Trades still OPEN when folded, re-read once closed
+CREATE TABLE IF NOT EXISTS integrity_open_trades (
+    trade_rowid INTEGER PRIMARY KEY,
+    challenge_id TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS integrity_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    watermark INTEGER NOT NULL DEFAULT 0, -- every trade rowid <= watermark is folded
+    generation INTEGER NOT NULL DEFAULT 0 -- bumped by each pass (optimistic concurrency)
+);
+
+INSERT OR IGNORE INTO integrity_state (id) VALUES (1);